@@ -0,0 +1,349 @@
+// audio-transport.js - Audio transports for the Python recognizers
+//
+// Mirrors audio_transport.py:
+//  * FrameBatcher writes the v2 stdin protocol - batches of frames that carry a
+//    sequence number, capture timestamp, format and stream id - coalescing small
+//    capture buffers into fewer, larger pipe writes.
+//  * AudioRingWriter fills SharedAudioRing, a 64-byte header followed by a ring
+//    of PCM samples in a memory-mapped file. Electron writes samples with one
+//    positional fs write (two at the wrap point) and then sends each consumer its
+//    new write cursor (8 bytes, little-endian) on stdin. The pipe otherwise only
+//    carries session control messages: an 8-byte record with the top bit set and
+//    the JSON length below it, then the JSON. The header's copy of the cursor is
+//    only for readers' overwrite checks and is published every capacity / 8
+//    bytes, not per chunk.
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const { performance } = require("perf_hooks");
+
+const RING_MAGIC = "MLAR";
+const RING_VERSION = 1;
+const RING_HEADER_SIZE = 64;
+const RING_CURSOR_OFFSET = 24;
+const RING_CURSOR_PUBLISH_DIVISOR = 8; // mirrors SharedAudioRing.CURSOR_PUBLISH_DIVISOR
+const RING_CONTROL_FLAG = 1n << 63n; // mirrors SharedAudioRing.CONTROL_FLAG
+const SAMPLE_FORMAT_INT16 = 1;
+const SAMPLE_FORMAT_FLOAT32 = 2;
+// v2 stream ids: results for each come back tagged "me" and "them"
+const STREAM_MICROPHONE = 0;
+const STREAM_SYSTEM = 1;
+
+const BATCH_MAGIC = "MLA2";
+const BATCH_HEADER_SIZE = 12; // <4sBBHI: magic, version, kind, frame count, payload length
+const FRAME_HEADER_SIZE = 24; // <IQIBBHI: seq, capture us, rate, format, channels, stream, length
+const BATCH_KIND_AUDIO = 0;
+const BATCH_KIND_CONTROL = 1;
+
+// Microseconds on the performance clock (timeOrigin + now). The renderer stamps capture
+// times on the same clock, so stamps from either process compare; the recognizer only
+// relies on differences
+function monotonicMicros() {
+  return Math.round((performance.timeOrigin + performance.now()) * 1000);
+}
+
+function supportsProtocolV2(hello) {
+  return (
+    hello &&
+    hello.type === "hello" &&
+    Array.isArray(hello.protocols) &&
+    hello.protocols.includes(2)
+  );
+}
+
+// Batches frames for the v2 protocol and honours the recognizer's flow-control credits.
+// With plenty of credits every pushed buffer becomes its own frame. When credits run
+// low, consecutive buffers are merged into frames of the recommended duration, and
+// with no credits left audio is held (up to maxHeldMs) until the next flow report
+// instead of being sent only to be dropped by the recognizer.
+class FrameBatcher {
+  constructor(
+    stream,
+    {
+      sampleRate = 16000,
+      sampleFormat = SAMPLE_FORMAT_INT16,
+      channels = 1,
+      targetBatchMs = 60, // flush as soon as this much audio is pending
+      maxBatchDelayMs = 40, // never hold a frame longer than this while credits allow
+      maxHeldMs = 10000, // audio kept while the recognizer has no credits
+      maxFrameBytes = 1000000, // the recognizer rejects larger frames
+    } = {}
+  ) {
+    this.stream = stream;
+    this.sampleRate = sampleRate;
+    this.sampleFormat = sampleFormat;
+    this.channels = channels;
+    this.bytesPerMs =
+      (sampleRate * channels * (sampleFormat === SAMPLE_FORMAT_FLOAT32 ? 4 : 2)) /
+      1000;
+    this.targetBatchBytes = Math.round(targetBatchMs * this.bytesPerMs);
+    this.maxBatchDelayMs = maxBatchDelayMs;
+    this.maxHeldBytes = Math.round(maxHeldMs * this.bytesPerMs);
+    this.maxFrameBytes = maxFrameBytes;
+    this.nextSeq = new Map(); // stream id -> next sequence number
+    this.pending = []; // { streamId, captureMicros, parts, length } or { control: payload }
+    this.pendingBytes = 0;
+    this.flushTimer = null;
+
+    // Flow control state; credits stay null until the recognizer reports
+    this.credits = null;
+    this.framesSent = 0;
+    this.coalesceBytes = 0;
+    this.droppedBytes = 0;
+  }
+
+  // Apply a {"type": "flow"} report from the recognizer
+  updateFlow(flow) {
+    // Frames the recognizer rejected or lost to a resync will never be received
+    const inFlight = Math.max(0, this.framesSent - (flow.received || 0) - (flow.lost || 0));
+    this.credits = Math.max(0, (flow.credits || 0) - inFlight);
+    const lowWater = Math.max(1, Math.floor((flow.queue_capacity || 0) / 4));
+    this.coalesceBytes =
+      this.credits <= lowWater
+        ? Math.round((flow.recommended_frame_ms || 0) * this.bytesPerMs)
+        : 0;
+    if (this.pending.length > 0) {
+      this.flush();
+    }
+  }
+
+  // Queue one PCM buffer for the next batch; captureMicros comes from the renderer when it
+  // stamped the buffer, otherwise the buffer counts as captured on arrival here
+  push(pcm, streamId = 0, captureMicros = monotonicMicros()) {
+    const last = this.pending[this.pending.length - 1];
+    if (
+      last &&
+      !last.control &&
+      last.streamId === streamId &&
+      last.length < this.coalesceBytes &&
+      last.length + pcm.length <= this.maxFrameBytes
+    ) {
+      last.parts.push(pcm);
+      last.length += pcm.length;
+    } else {
+      this.pending.push({ streamId, captureMicros, parts: [pcm], length: pcm.length });
+    }
+    this.pendingBytes += pcm.length;
+
+    // Bound what we hold while the recognizer is out of credits by dropping the oldest
+    // audio; held control messages are never dropped
+    while (this.pendingBytes > this.maxHeldBytes) {
+      const index = this.pending.findIndex((entry) => !entry.control);
+      if (index < 0 || index === this.pending.length - 1) {
+        break;
+      }
+      const [dropped] = this.pending.splice(index, 1);
+      this.pendingBytes -= dropped.length;
+      this.droppedBytes += dropped.length;
+    }
+
+    if (this.pendingBytes >= this.targetBatchBytes) {
+      this.flush();
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(), this.maxBatchDelayMs);
+    }
+  }
+
+  // Write pending frames in order while credits allow, with a single pipe write. Runs of
+  // audio frames go out as one batch each; a held control message goes out right behind
+  // the audio queued before it, and waits with that audio when credits run out.
+  flush() {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+    if (!this.stream.writable) {
+      this.pending = [];
+      this.pendingBytes = 0;
+      return false;
+    }
+
+    let credits = this.credits === null ? Infinity : this.credits;
+    const chunks = [];
+    let parts = [];
+    let frameCount = 0;
+    let payloadLength = 0;
+    const endAudioBatch = () => {
+      if (frameCount > 0) {
+        chunks.push(this.batchHeader(BATCH_KIND_AUDIO, frameCount, payloadLength), ...parts);
+      }
+      parts = [];
+      frameCount = 0;
+      payloadLength = 0;
+    };
+
+    let taken = 0;
+    for (; taken < this.pending.length; taken++) {
+      const entry = this.pending[taken];
+      if (entry.control) {
+        endAudioBatch();
+        chunks.push(this.batchHeader(BATCH_KIND_CONTROL, 0, entry.control.length), entry.control);
+        continue;
+      }
+      if (credits <= 0) {
+        break; // waiting for the next flow report
+      }
+      credits -= 1;
+      const seq = this.nextSeq.get(entry.streamId) || 0;
+      this.nextSeq.set(entry.streamId, (seq + 1) >>> 0);
+      const header = this.frameHeader(seq, entry);
+      parts.push(header, ...entry.parts);
+      payloadLength += header.length + entry.length;
+      frameCount += 1;
+      this.framesSent += 1;
+      this.pendingBytes -= entry.length;
+    }
+    endAudioBatch();
+
+    this.pending.splice(0, taken);
+    if (this.credits !== null) {
+      this.credits = credits;
+    }
+    if (chunks.length === 0) {
+      return false; // nothing to send, or waiting for the next flow report
+    }
+    return this.stream.write(Buffer.concat(chunks));
+  }
+
+  // Send a JSON control message in order behind the audio already pushed; if that audio
+  // is held for credits, the message is held with it
+  control(message) {
+    this.pending.push({ control: Buffer.from(JSON.stringify(message), "utf8") });
+    return this.flush();
+  }
+
+  frameHeader(seq, frame) {
+    const header = Buffer.allocUnsafe(FRAME_HEADER_SIZE);
+    header.writeUInt32LE(seq, 0);
+    header.writeBigUInt64LE(BigInt(frame.captureMicros), 4);
+    header.writeUInt32LE(this.sampleRate, 12);
+    header.writeUInt8(this.sampleFormat, 16);
+    header.writeUInt8(this.channels, 17);
+    header.writeUInt16LE(frame.streamId, 18);
+    header.writeUInt32LE(frame.length, 20);
+    return header;
+  }
+
+  batchHeader(kind, frameCount, payloadLength) {
+    const header = Buffer.allocUnsafe(BATCH_HEADER_SIZE);
+    header.write(BATCH_MAGIC, 0, "ascii");
+    header.writeUInt8(2, 4);
+    header.writeUInt8(kind, 5);
+    header.writeUInt16LE(frameCount, 6);
+    header.writeUInt32LE(payloadLength, 8);
+    return header;
+  }
+
+  close() {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+    this.pending = [];
+    this.pendingBytes = 0;
+  }
+}
+
+function defaultRingPath() {
+  // /dev/shm keeps the ring in RAM on Linux; elsewhere the OS page cache does the same job
+  const dir =
+    process.platform === "linux" && fs.existsSync("/dev/shm")
+      ? "/dev/shm"
+      : os.tmpdir();
+  return path.join(dir, `mla-audio-ring-${process.pid}.bin`);
+}
+
+class AudioRingWriter {
+  constructor({
+    filePath = defaultRingPath(),
+    capacityBytes = 8192 * 128, // ~32s of 16kHz Int16, a whole number of 4096-sample chunks
+    sampleRate = 16000,
+    sampleFormat = SAMPLE_FORMAT_INT16,
+    channels = 1,
+  } = {}) {
+    const width = (sampleFormat === SAMPLE_FORMAT_FLOAT32 ? 4 : 2) * channels;
+    this.filePath = filePath;
+    this.capacity = capacityBytes - (capacityBytes % width);
+    this.cursor = 0;
+    this.publishedCursor = 0;
+    this.publishBytes = Math.floor(this.capacity / RING_CURSOR_PUBLISH_DIVISOR);
+    this.cursorBuffer = Buffer.alloc(8);
+
+    this.fd = fs.openSync(filePath, "w+");
+    fs.ftruncateSync(this.fd, RING_HEADER_SIZE + this.capacity);
+
+    const header = Buffer.alloc(RING_HEADER_SIZE);
+    header.write(RING_MAGIC, 0, "ascii");
+    header.writeUInt16LE(RING_VERSION, 4);
+    header.writeUInt16LE(sampleFormat, 6);
+    header.writeUInt32LE(sampleRate, 8);
+    header.writeUInt16LE(channels, 12);
+    header.writeBigUInt64LE(BigInt(this.capacity), 16);
+    header.writeBigUInt64LE(0n, RING_CURSOR_OFFSET);
+    fs.writeSync(this.fd, header, 0, header.length, 0);
+  }
+
+  // Append samples and publish the new cursor; returns the cursor consumers should be woken with
+  write(buffer) {
+    let data = buffer;
+    if (data.length > this.capacity) {
+      data = data.subarray(data.length - this.capacity);
+    }
+
+    const start = this.cursor % this.capacity;
+    const first = Math.min(data.length, this.capacity - start);
+    fs.writeSync(this.fd, data, 0, first, RING_HEADER_SIZE + start);
+    if (first < data.length) {
+      fs.writeSync(this.fd, data, first, data.length - first, RING_HEADER_SIZE);
+    }
+
+    this.cursor += data.length;
+    // Readers get the cursor from their wake-ups; the header copy may lag by up to publishBytes
+    if (this.cursor - this.publishedCursor >= this.publishBytes) {
+      this.publish();
+    }
+    return this.cursor;
+  }
+
+  // Bring the header's cursor up to date, e.g. before a new reader attaches and starts from it
+  publish() {
+    this.cursorBuffer.writeBigUInt64LE(BigInt(this.cursor), 0);
+    fs.writeSync(this.fd, this.cursorBuffer, 0, 8, RING_CURSOR_OFFSET);
+    this.publishedCursor = this.cursor;
+  }
+
+  // Wake one consumer; each recognizer process gets its own copy of the cursor
+  notify(stream) {
+    const wake = Buffer.allocUnsafe(8);
+    wake.writeBigUInt64LE(BigInt(this.cursor), 0);
+    return stream.write(wake);
+  }
+
+  // Send one consumer a START/STOP/RESET message, ordered after the audio it was woken for
+  control(stream, payload) {
+    const json = Buffer.from(JSON.stringify(payload), "utf8");
+    const record = Buffer.allocUnsafe(8 + json.length);
+    record.writeBigUInt64LE(RING_CONTROL_FLAG | BigInt(json.length), 0);
+    json.copy(record, 8);
+    return stream.write(record);
+  }
+
+  close() {
+    try {
+      fs.closeSync(this.fd);
+      fs.unlinkSync(this.filePath);
+    } catch (error) {
+      // Best effort - the file lives in a temp directory anyway
+    }
+  }
+}
+
+module.exports = {
+  FrameBatcher,
+  AudioRingWriter,
+  supportsProtocolV2,
+  SAMPLE_FORMAT_INT16,
+  SAMPLE_FORMAT_FLOAT32,
+  STREAM_MICROPHONE,
+  STREAM_SYSTEM,
+};
@@ -0,0 +1,95 @@
+"""
+Fixed-capacity sample ring for the Whisper engines' audio buffer
+
+Growing a NumPy array with np.concatenate on every frame copies the whole
+buffer each time. AudioRingBuffer preallocates its storage once, so a write
+costs only the frame it stores. Reads are zero-copy slices: the start of the ring
+is mirrored past its end, which keeps any window up to the capacity contiguous.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRingBuffer:
+    """Float32 samples in arrival order, holding at most `capacity` of them.
+
+    Writing past the capacity drops the oldest samples, as trimming the
+    concatenated buffer used to. The ring has `headroom` slots (by default as
+    many as the capacity) beyond the capacity, so a view from peek() or drain()
+    stays valid while at least that many more samples are written - long
+    enough to transcribe it without holding a lock.
+    """
+
+    def __init__(self, capacity, headroom=None):
+        import numpy as np
+
+        self.capacity = int(capacity)
+        self.slots = self.capacity + int(self.capacity if headroom is None else headroom)
+        # Slots [0, capacity) are mirrored at [slots, slots + capacity)
+        self.storage = np.zeros(self.slots + self.capacity, dtype=np.float32)
+        self.written = 0  # Samples ever written; the next one goes to slot written % slots
+        self.length = 0
+        self.dropped = 0  # Samples pushed out by overflow before anyone read them
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def start(self):
+        """Stream position of the oldest buffered sample, counting every sample ever written"""
+        return self.written - self.length
+
+    def put(self, slot, samples):
+        count = len(samples)
+        self.storage[slot:slot + count] = samples
+        if slot < self.capacity:
+            mirrored = min(count, self.capacity - slot)
+            self.storage[self.slots + slot:self.slots + slot + mirrored] = samples[:mirrored]
+
+    def write(self, samples):
+        """Append samples, dropping the oldest if the ring is over capacity"""
+        count = len(samples)
+        if count > self.capacity:
+            self.dropped += count - self.capacity
+            self.written += count - self.capacity  # Skipped samples still count as stream positions
+            samples = samples[count - self.capacity:]
+            count = self.capacity
+        if count == 0:
+            return
+
+        slot = self.written % self.slots
+        first = min(count, self.slots - slot)
+        self.put(slot, samples[:first])
+        if first < count:
+            self.put(0, samples[first:])
+        self.written += count
+
+        overflow = self.length + count - self.capacity
+        if overflow > 0:
+            self.dropped += overflow
+        self.length = min(self.length + count, self.capacity)
+
+    def peek(self, count=None):
+        """Zero-copy view of the oldest `count` samples (all of them by default)"""
+        count = self.length if count is None else min(count, self.length)
+        start = (self.written - self.length) % self.slots
+        return self.storage[start:start + count]
+
+    def consume(self, count):
+        """Drop the oldest `count` samples"""
+        self.length -= min(count, self.length)
+
+    def consume_until(self, position):
+        """Drop the buffered samples before stream position `position`"""
+        self.consume(max(0, position - self.start))
+
+    def drain(self):
+        """Zero-copy view of everything buffered, which is then cleared"""
+        view = self.peek()
+        self.length = 0
+        return view
+
+    def clear(self):
+        self.length = 0
@@ -0,0 +1,141 @@
+"""
+Sample-rate conversion and channel downmix for the recognizers' ingest path
+
+Capture can stay at the device rate (44.1/48 kHz, stereo); frames are brought
+to the 16 kHz mono the recognizers expect here, on the Python side, instead of
+on the renderer thread. The resampler is a windowed-sinc polyphase FIR that
+keeps its input history and output phase between calls, so a stream cut into
+arbitrary chunks resamples exactly as if it arrived in one piece.
+"""
+
+import logging
+from math import gcd
+
+from audio_transport import SAMPLE_FORMAT_INT16, frame_to_float32
+
+logger = logging.getLogger(__name__)
+
+TARGET_RATE = 16000
+ZERO_CROSSINGS = 16  # Sinc lobes either side of the centre; sets filter length and stopband
+ROLLOFF = 0.94       # Cutoff as a fraction of the output Nyquist frequency
+KAISER_BETA = 8.6
+
+
+class ConvertedFrame(bytearray):
+    """Int16 PCM made by to_int16; it never came from a transport's buffer pool, so it never goes back to one"""
+
+
+class StreamResampler:
+    """Stateful polyphase resampler for a mono float32 stream.
+
+    The ratio out_rate/in_rate is reduced to up/down. Output sample n sits at
+    n * down on the up-sampled grid; its value is the dot product of the K most
+    recent input samples with phase (n * down) % up of the filter bank, done
+    for a whole chunk at once with a strided window view and one einsum.
+    """
+
+    def __init__(self, in_rate, out_rate=TARGET_RATE):
+        import numpy as np
+
+        self.np = np
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        divisor = gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+
+        # Prototype low-pass on the up-sampled grid, cut off below the lower Nyquist frequency
+        cutoff = ROLLOFF * 0.5 / max(self.up, self.down)
+        taps_per_phase = int(np.ceil(2 * ZERO_CROSSINGS * max(self.up, self.down) / self.up))
+        length = taps_per_phase * self.up
+        m = np.arange(length) - (length - 1) / 2.0
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * m) * np.kaiser(length, KAISER_BETA) * self.up
+
+        # bank[p, j] weighs input sample i - j for outputs at phase p; taps reversed to match
+        self.bank = prototype.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32)
+        self.taps = taps_per_phase
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self.samples_in = 0   # Input samples consumed so far
+        self.samples_out = 0  # Output samples produced so far
+
+    def process(self, samples):
+        """Resample the next chunk; returns however many output samples it completes"""
+        np = self.np
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.up == self.down:
+            return samples
+
+        buffer = np.concatenate((self.history, samples))
+        start = self.samples_in - len(self.history)  # Input index of buffer[0]
+        self.samples_in += len(samples)
+
+        # Every output whose newest input sample has now arrived
+        last = (self.samples_in * self.up - 1) // self.down
+        n = np.arange(self.samples_out, last + 1, dtype=np.int64)
+        self.samples_out = last + 1
+        if len(n) == 0:
+            self.history = buffer[-(self.taps - 1):] if self.taps > 1 else buffer[:0]
+            return np.zeros(0, dtype=np.float32)
+
+        position = n * self.down
+        newest = position // self.up - start
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        output = np.einsum('nj,nj->n', windows[newest - self.taps + 1], self.bank[position % self.up])
+
+        self.history = buffer[len(buffer) - (self.taps - 1):] if self.taps > 1 else buffer[:0]
+        return output.astype(np.float32, copy=False)
+
+
+class IngestConverter:
+    """Bring frames of any rate, channel count and sample format to 16 kHz mono.
+
+    Frames without their own FrameInfo (v1 stdin, the shared ring) use the
+    source defaults given here. One resampler is kept per stream id and is
+    rebuilt if that stream's rate changes, so every stream stays seamless.
+    """
+
+    def __init__(self, sample_rate=TARGET_RATE, channels=1, sample_format=SAMPLE_FORMAT_INT16,
+                 target_rate=TARGET_RATE):
+        self.default_rate = sample_rate
+        self.default_channels = channels
+        self.default_format = sample_format
+        self.target_rate = target_rate
+        self.resamplers = {}
+
+    def needs_conversion(self, info=None):
+        """True unless the frame already is 16 kHz mono Int16"""
+        if info is not None:
+            return (info.sample_format != SAMPLE_FORMAT_INT16 or info.sample_rate != self.target_rate
+                    or info.channels != 1)
+        return (self.default_format != SAMPLE_FORMAT_INT16 or self.default_rate != self.target_rate
+                or self.default_channels != 1)
+
+    def to_float32(self, view, info=None, sample_format=None):
+        """Frame as float32 samples in [-1, 1] at the target rate, mono"""
+        import numpy as np
+
+        if info is not None:
+            sample_format, rate, channels, stream_id = info.sample_format, info.sample_rate, info.channels, info.stream_id
+        else:
+            sample_format = sample_format or self.default_format
+            rate, channels, stream_id = self.default_rate, self.default_channels, 0
+
+        samples = frame_to_float32(view, sample_format)
+        if channels > 1:
+            usable = len(samples) - len(samples) % channels
+            samples = samples[:usable].reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+        if rate == self.target_rate:
+            return samples
+        resampler = self.resamplers.get(stream_id)
+        if resampler is None or resampler.in_rate != rate:
+            logger.info(f"Resampling stream {stream_id} from {rate}Hz/{channels}ch to {self.target_rate}Hz mono")
+            resampler = self.resamplers[stream_id] = StreamResampler(rate, self.target_rate)
+        return resampler.process(samples)
+
+    def to_int16(self, view, info=None, sample_format=None):
+        """Frame as Int16 PCM bytes at the target rate, mono, in a ConvertedFrame"""
+        import numpy as np
+
+        samples = self.to_float32(view, info, sample_format)
+        return ConvertedFrame((np.clip(samples, -1.0, 32767 / 32768.0) * 32768.0).astype(np.int16).tobytes())
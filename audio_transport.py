@@ -0,0 +1,683 @@
+"""
+Audio transports shared by vosk_realtime.py and the voice modals Whisper engines
+
+Two ways for PCM to reach a recognizer:
+  * stdin frames  - a `<I` length header followed by the payload (the default)
+  * shared ring   - an mmap'd file holding a ring of samples written by Electron;
+                    stdin only carries 8-byte write-cursor wake-ups
+
+Both sources hand out (buffer, length, info) frames through next_frame() and
+take the buffer back through release(), so callers never care which one they are
+using. `info` is a FrameInfo for v2 stdin frames and None otherwise.
+"""
+
+import sys
+import json
+import mmap
+import time
+import queue
+import struct
+import logging
+import threading
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_FORMAT_INT16 = 1
+SAMPLE_FORMAT_FLOAT32 = 2
+SAMPLE_WIDTHS = {SAMPLE_FORMAT_INT16: 2, SAMPLE_FORMAT_FLOAT32: 4}
+
+
+def frame_to_float32(view, sample_format=SAMPLE_FORMAT_INT16):
+    """Convert a frame view to a float32 NumPy array in [-1, 1] (NumPy is only needed by the Whisper engines)"""
+    import numpy as np
+
+    if sample_format == SAMPLE_FORMAT_FLOAT32:
+        usable = len(view) - (len(view) % 4)
+        return np.frombuffer(view[:usable], dtype=np.float32).copy()
+
+    usable = len(view) - (len(view) % 2)
+    return np.frombuffer(view[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+
+
+# ✅ WIRE PROTOCOL
+# v1: `<I` payload length, then the payload.
+# v2: a batch header - magic, version, kind, frame count, payload length - then
+#     `frame count` frames, each a FRAME_HEADER followed by its PCM. Control
+#     batches carry one UTF-8 JSON object instead of frames. The magic read as a
+#     v1 length is ~843MB, far above any accepted frame, so both versions can be
+#     told apart message by message on the same stream.
+PROTOCOL_VERSIONS = (1, 2)
+BATCH_MAGIC = b'MLA2'
+BATCH_HEADER = struct.Struct('<4sBBHI')
+FRAME_HEADER = struct.Struct('<IQIBBHI')
+BATCH_KIND_AUDIO = 0
+BATCH_KIND_CONTROL = 1
+
+# Per-frame metadata from v2 batches (None for v1 frames and the shared ring)
+FrameInfo = namedtuple('FrameInfo', 'seq capture_us sample_rate sample_format channels stream_id')
+
+# v2 stream ids for meeting capture; v1 frames and the shared ring are always the microphone
+STREAM_MICROPHONE = 0
+STREAM_SYSTEM = 1
+STREAM_LABELS = {STREAM_MICROPHONE: 'me', STREAM_SYSTEM: 'them'}
+
+
+def stream_label(stream_id):
+    """Name results from a stream are tagged with - "me", "them", or stream-N for any other id"""
+    return STREAM_LABELS.get(stream_id, f"stream-{stream_id}")
+
+# A v2 control batch, returned by next_frame() in stream order when deliver_control is set
+ControlMessage = namedtuple('ControlMessage', 'message')
+
+
+def monotonic_us():
+    return time.monotonic_ns() // 1000
+
+
+def protocol_hello(**extra):
+    """The startup message a recognizer prints so the sender can pick a protocol"""
+    message = {"type": "hello", "protocols": list(PROTOCOL_VERSIONS)}
+    message.update(extra)
+    return message
+
+
+# ✅ STDIN TRANSPORT: length-prefixed frames and v2 batches
+class FrameReader:
+    """Read PCM frames from a binary stream in either wire format.
+
+    Frames are read with readinto() straight into preallocated bytearrays taken
+    from a small free list, so a steady stream allocates nothing after warm-up.
+    Reads block until the frame is complete or the stream hits EOF - there is no
+    sleep-polling and a slow frame can no longer desync the header stream.
+
+    A v2 batch is read with one readinto() and its frames are handed out as
+    views into that single buffer, which goes back to the pool once every frame
+    of the batch has been released. Sequence numbers are checked per stream and
+    the capture timestamps feed a clock-offset estimate for latency reporting.
+    With deliver_control set, control batches come back from next_frame() as
+    ControlMessage items in stream order; otherwise they are logged and skipped.
+    """
+
+    name = "stdin"
+    # v1 frames carry no format; v2 frames describe themselves in their FrameInfo
+    sample_format = SAMPLE_FORMAT_INT16
+    sample_rate = 16000
+    channels = 1
+    HEADER = struct.Struct('<I')
+
+    def __init__(self, stream, min_length=2, max_length=1000000, initial_capacity=16384,
+                 deliver_control=False):
+        self.stream = stream
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_batch_length = max_length * 4
+        self.initial_capacity = initial_capacity
+        self.deliver_control = deliver_control
+        self.header = bytearray(BATCH_HEADER.size)
+        self.header_view = memoryview(self.header)
+        self.free_buffers = queue.SimpleQueue()
+        self.pending_frames = deque()
+        self.batch_refs = {}
+        self.release_lock = threading.Lock()
+        self.protocol = 1
+        self.rejected_frames = 0
+        self.discarded_frames = 0  # v2 frames whose sequence number was seen but that were never delivered
+        self.resync_bytes = 0
+        self.batches_received = 0
+        self.sequence_gaps = 0
+        self.next_seq = {}
+        self.clock_offset_us = None
+
+    def read_exact(self, view):
+        """Fill view completely; returns the number of bytes read (short only on EOF)"""
+        filled = 0
+        total = len(view)
+        while filled < total:
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        return filled
+
+    def acquire(self, length):
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = bytearray(max(self.initial_capacity, length))
+        if len(buffer) < length:
+            buffer = bytearray(length)
+        return buffer
+
+    def release(self, buffer):
+        if isinstance(buffer, memoryview):
+            # A frame view out of a v2 batch - recycle the batch once all its frames are done
+            with self.release_lock:
+                ref = self.batch_refs.pop(id(buffer), None)
+                if ref is None:
+                    return
+                ref[1] -= 1
+                if ref[1]:
+                    return
+            self.free_buffers.put(ref[0])
+            return
+        self.free_buffers.put(buffer)
+
+    def read_header(self):
+        """Return the next v1 frame length or BATCH_MAGIC, or None on EOF"""
+        got = self.read_exact(self.header_view[:self.HEADER.size])
+        if got == 0:
+            return None
+        if got < self.HEADER.size:
+            logger.error(f"Incomplete length header at EOF: got {got} bytes")
+            return None
+        return self.header_value()
+
+    def header_value(self):
+        """The v1 frame length or BATCH_MAGIC held in the first four header bytes"""
+        if self.header[:4] == BATCH_MAGIC:
+            return BATCH_MAGIC
+        return self.HEADER.unpack_from(self.header)[0]
+
+    def read_payload(self, length):
+        """Return (buffer, length) holding the payload, or None on EOF"""
+        buffer = self.acquire(length)
+        got = self.read_exact(memoryview(buffer)[:length])
+        if got < length:
+            logger.error(f"Stream ended mid-frame: expected {length}, got {got}")
+            self.release(buffer)
+            return None
+        return buffer, length
+
+    def plausible_header(self, window, batch_only):
+        if window == BATCH_MAGIC:
+            return True
+        if batch_only:
+            return False
+        length = self.HEADER.unpack_from(window)[0]
+        # v1 frames are whole Int16 samples, which rules out half of the false matches
+        return self.min_length <= length <= self.max_length and length % 2 == 0
+
+    def resync(self, batch_only=False):
+        """After a corrupt header, scan forward a byte at a time to the next plausible one; False on EOF.
+
+        A v1 stream has no marker to find, so there the first four bytes that
+        read as an in-range length count; with batch_only only the v2 batch
+        magic does. The header found is left in the header buffer - nothing
+        past it is read.
+        """
+        window = bytearray(self.header[:4])
+        byte = bytearray(1)
+        while True:
+            if not self.read_exact(memoryview(byte)):
+                return False
+            del window[0]
+            window += byte
+            self.resync_bytes += 1
+            if self.plausible_header(window, batch_only):
+                break
+        self.header[:4] = window
+        return True
+
+    def read_batch(self):
+        """Read the rest of a v2 batch; queues its frames and returns False on EOF"""
+        while True:
+            rest = self.header_view[4:BATCH_HEADER.size]
+            if self.read_exact(rest) < len(rest):
+                logger.error("Stream ended inside a v2 batch header")
+                return False
+
+            _, version, kind, frame_count, payload_length = BATCH_HEADER.unpack_from(self.header)
+            if version == 2 and kind in (BATCH_KIND_AUDIO, BATCH_KIND_CONTROL) and \
+                    payload_length <= self.max_batch_length:
+                break
+
+            logger.error(f"Corrupt v2 batch header (version {version}, kind {kind}, "
+                         f"{payload_length} bytes), resyncing")
+            self.header[:4] = b'\0\0\0\0'
+            if not self.resync(batch_only=True):
+                return False
+
+        self.protocol = 2
+        frame = self.read_payload(payload_length)
+        if frame is None:
+            return False
+        buffer = frame[0]
+        self.batches_received += 1
+
+        if kind == BATCH_KIND_CONTROL:
+            try:
+                message = json.loads(bytes(buffer[:payload_length]).decode('utf-8'))
+            except ValueError as e:
+                logger.error(f"Bad control message: {e}")
+                message = None
+            self.release(buffer)
+            if message is not None:
+                self.handle_control(message)
+            return True
+
+        frames = self.parse_batch(buffer, payload_length, frame_count)
+        if not frames:
+            self.release(buffer)
+            return True
+
+        ref = [buffer, len(frames)]
+        with self.release_lock:
+            for view, length, info in frames:
+                self.batch_refs[id(view)] = ref
+                self.pending_frames.append((view, length, info))
+        return True
+
+    def parse_batch(self, buffer, payload_length, frame_count):
+        """Split a v2 audio payload into (view, length, info) frames; [] if it is malformed"""
+        frames = []
+        offset = 0
+        malformed = False
+        now_us = monotonic_us()
+        whole = memoryview(buffer)
+        for _ in range(frame_count):
+            if offset + FRAME_HEADER.size > payload_length:
+                malformed = True
+                break
+            seq, capture_us, sample_rate, sample_format, channels, stream_id, length = \
+                FRAME_HEADER.unpack_from(buffer, offset)
+            offset += FRAME_HEADER.size
+            if offset + length > payload_length or sample_format not in SAMPLE_WIDTHS:
+                malformed = True
+                break
+            info = FrameInfo(seq, capture_us, sample_rate, sample_format, channels, stream_id)
+            self.track_frame(info, now_us)
+            if length < self.min_length or length > self.max_length:
+                self.rejected_frames += 1
+                self.discarded_frames += 1
+                offset += length
+                continue
+
+            frames.append((whole[offset:offset + length], length, info))
+            offset += length
+
+        if malformed or offset != payload_length:
+            logger.error(f"Malformed v2 batch: {frame_count} frames declared in {payload_length} bytes")
+            self.rejected_frames += frame_count - len(frames)
+            self.discarded_frames += len(frames)
+            for view, _, _ in frames:
+                view.release()
+            return []
+        return frames
+
+    def track_frame(self, info, now_us):
+        """Detect sequence gaps per stream and keep the capture-clock offset estimate"""
+        expected = self.next_seq.get(info.stream_id)
+        if expected is not None and info.seq != expected:
+            missing = (info.seq - expected) & 0xFFFFFFFF
+            if missing < 0x80000000:
+                self.sequence_gaps += missing
+                logger.error(f"Sequence gap on stream {info.stream_id}: expected {expected}, got {info.seq}")
+        self.next_seq[info.stream_id] = (info.seq + 1) & 0xFFFFFFFF
+
+        # The smallest arrival-minus-capture seen is the clock offset plus the minimum
+        # transit time, so latencies measured against it are accurate to the pipe floor
+        offset = now_us - info.capture_us
+        if self.clock_offset_us is None or offset < self.clock_offset_us:
+            self.clock_offset_us = offset
+
+    @property
+    def lost_frames(self):
+        """v2 frames the sender wrote that will never be delivered: rejected, or skipped over by a resync.
+
+        Frames whose header was read count as soon as they are discarded; the
+        rest show up as sequence gaps once the next frame of their stream arrives.
+        """
+        return self.discarded_frames + self.sequence_gaps
+
+    def capture_latency_ms(self, info):
+        """Milliseconds from capture of `info`'s frame until now, on the local clock"""
+        if info is None or self.clock_offset_us is None:
+            return None
+        return max(0.0, (monotonic_us() - info.capture_us - self.clock_offset_us) / 1000.0)
+
+    def handle_control(self, message):
+        if self.deliver_control:
+            self.pending_frames.append(ControlMessage(message))
+        else:
+            logger.debug(f"Control message ignored: {message}")
+
+    def next_frame(self):
+        """Return the next valid (buffer, length, info) frame or ControlMessage, or None on EOF"""
+        resynced = False
+        while True:
+            if self.pending_frames:
+                return self.pending_frames.popleft()
+
+            # After a resync the header buffer already holds the next header
+            length = self.header_value() if resynced else self.read_header()
+            resynced = False
+            if length is None:
+                return None
+
+            if length == BATCH_MAGIC:
+                if not self.read_batch():
+                    return None
+                continue
+
+            if self.protocol == 2:
+                # Once the sender speaks v2 every header starts with the magic; anything else is corruption
+                self.rejected_frames += 1
+                logger.error(f"Header without batch magic in a v2 stream ({bytes(self.header[:4]).hex()}), resyncing")
+                if not self.resync(batch_only=True):
+                    return None
+                resynced = True
+                continue
+
+            if length < self.min_length or length > self.max_length:
+                # An out-of-range length is a corrupt header, not a frame to skip: skipping it
+                # could swallow gigabytes of good audio and control messages
+                self.rejected_frames += 1
+                logger.error(f"Corrupt header: {length}-byte frame (allowed {self.min_length}-{self.max_length}), resyncing")
+                if not self.resync():
+                    return None
+                resynced = True
+                continue
+
+            frame = self.read_payload(length)
+            if frame is None:
+                return None
+            return frame[0], frame[1], None
+
+    def close(self):
+        pass
+
+
+# ✅ FLOW CONTROL: credits reported back to the sender
+class FlowControl:
+    """Build rate-limited flow-control messages for the audio sender.
+
+    A report tells the sender how many more frames the recognizer can queue
+    (`credits`), how many frames it has read so far (`received`) and how many
+    it lost to corruption (`lost`) - so the sender can subtract what is still in
+    the pipe - the queue depth, how many frames were dropped, and a recommended frame duration that grows as the queue
+    fills so the sender coalesces instead of overrunning us. Reports go out at
+    most every `report_interval` seconds, or after `min_interval` when credits
+    cross the low-water mark in either direction.
+    """
+
+    def __init__(self, capacity, low_water=None, report_interval=0.5, min_interval=0.05,
+                 min_frame_ms=20, max_frame_ms=250):
+        self.capacity = capacity
+        self.low_water = low_water if low_water is not None else max(1, capacity // 4)
+        self.report_interval = report_interval
+        self.min_interval = min_interval
+        self.min_frame_ms = min_frame_ms
+        self.max_frame_ms = max_frame_ms
+        self.lock = threading.Lock()
+        self.last_report = 0.0
+        self.last_low = False
+        self.reports_sent = 0
+
+    def recommended_frame_ms(self, depth):
+        fill = min(1.0, depth / self.capacity) if self.capacity else 1.0
+        return int(self.min_frame_ms + (self.max_frame_ms - self.min_frame_ms) * fill)
+
+    def update(self, depth, received, dropped, lost=0, force=False):
+        """Return a flow message if one is due, otherwise None"""
+        credits = max(0, self.capacity - depth)
+        low = credits <= self.low_water
+        now = time.monotonic()
+        with self.lock:
+            interval = self.min_interval if (force or low != self.last_low) else self.report_interval
+            if now - self.last_report < interval:
+                return None
+            self.last_report = now
+            self.last_low = low
+            self.reports_sent += 1
+
+        return {
+            "type": "flow",
+            "credits": credits,
+            "received": received,
+            "lost": lost,
+            "queue_depth": depth,
+            "queue_capacity": self.capacity,
+            "dropped": dropped,
+            "recommended_frame_ms": self.recommended_frame_ms(depth)
+        }
+
+
+# ✅ SHARED-MEMORY TRANSPORT: mmap'd ring of samples
+class SharedAudioRing:
+    """Single-writer, many-reader ring of PCM samples in a memory-mapped file.
+
+    Layout (little-endian): a 64-byte header followed by `capacity` bytes of
+    samples. The header holds the magic, version, sample format, sample rate,
+    channel count, capacity and the writer's cursor - the total number of bytes
+    ever written. Readers keep their own cursor, so any number of processes can
+    consume the same audio; the writer never waits for them and a reader that
+    falls more than `capacity` bytes behind skips ahead and counts an overrun.
+
+    Readers learn the cursor from their wake-ups; the copy in the header exists
+    for overwrite checks, so a writer may publish it lazily, at least every
+    `capacity // CURSOR_PUBLISH_DIVISOR` bytes, to save a write per chunk.
+
+    A file (rather than multiprocessing.shared_memory) is used so that Electron
+    can write it with plain positional fs writes; on Linux point it at /dev/shm.
+    """
+
+    MAGIC = b'MLAR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHIHHQQ')
+    HEADER_SIZE = 64
+    CURSOR_OFFSET = 24
+    CURSOR = struct.Struct('<Q')
+    CURSOR_PUBLISH_DIVISOR = 8
+    CONTROL_FLAG = 1 << 63  # A wake record with this bit set is followed by a JSON control message
+
+    def __init__(self, path, file, mapping, sample_format, sample_rate, channels, capacity):
+        self.path = path
+        self.file = file
+        self.mapping = mapping
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.capacity = capacity
+
+    @classmethod
+    def create(cls, path, capacity, sample_rate=16000, sample_format=SAMPLE_FORMAT_INT16, channels=1):
+        """Create (or truncate) a ring file and map it for writing"""
+        width = SAMPLE_WIDTHS[sample_format] * channels
+        capacity -= capacity % width
+        file = open(path, 'w+b')
+        file.truncate(cls.HEADER_SIZE + capacity)
+        mapping = mmap.mmap(file.fileno(), cls.HEADER_SIZE + capacity)
+        cls.HEADER.pack_into(mapping, 0, cls.MAGIC, cls.VERSION, sample_format,
+                             sample_rate, channels, 0, capacity, 0)
+        return cls(path, file, mapping, sample_format, sample_rate, channels, capacity)
+
+    @classmethod
+    def attach(cls, path):
+        """Map an existing ring file read-only"""
+        file = open(path, 'rb')
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, sample_format, sample_rate, channels, _, capacity, _ = cls.HEADER.unpack_from(mapping, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            mapping.close()
+            file.close()
+            raise ValueError(f"{path} is not a version {cls.VERSION} audio ring")
+        if sample_format not in SAMPLE_WIDTHS:
+            mapping.close()
+            file.close()
+            raise ValueError(f"Unknown ring sample format {sample_format}")
+        return cls(path, file, mapping, sample_format, sample_rate, channels, capacity)
+
+    def write_cursor(self):
+        return self.CURSOR.unpack_from(self.mapping, self.CURSOR_OFFSET)[0]
+
+    def write(self, data):
+        """Append samples (writer side) and return the new write cursor"""
+        data = memoryview(data).cast('B')
+        if len(data) > self.capacity:
+            data = data[-self.capacity:]
+        cursor = self.write_cursor()
+        start = self.HEADER_SIZE + cursor % self.capacity
+        first = min(len(data), self.HEADER_SIZE + self.capacity - start)
+        self.mapping[start:start + first] = data[:first]
+        if first < len(data):
+            self.mapping[self.HEADER_SIZE:self.HEADER_SIZE + len(data) - first] = data[first:]
+        cursor += len(data)
+        self.CURSOR.pack_into(self.mapping, self.CURSOR_OFFSET, cursor)
+        return cursor
+
+    def reader(self, control_stream, max_length=1000000, deliver_control=False):
+        return RingFrameReader(self, control_stream, max_length, deliver_control)
+
+    def close(self):
+        try:
+            self.mapping.close()
+        except BufferError:
+            logger.debug("Ring still has exported views, leaving the mapping to the GC")
+        self.file.close()
+
+
+class RingFrameReader:
+    """Frame source over a SharedAudioRing, woken by write cursors on a control stream.
+
+    Each wake-up is the writer's new cursor as `<Q`. A record with CONTROL_FLAG
+    set instead carries the length of a JSON control message (START/STOP/RESET)
+    in its low 32 bits, followed by the message; it was written after the
+    audio before it, so it is delivered once that audio is. The writer never waits, so
+    a view into the mapping could be overwritten while its frame sits in the
+    engine's queue; frames are therefore copied out into pooled bytearrays,
+    which is the only copy between the ring and the decoder. After each copy
+    the writer's cursor is checked again, seqlock-style, and a frame the writer
+    may have lapped while it was being copied is dropped as an overrun. A wake
+    that spans the wrap point yields two frames.
+    """
+
+    name = "shared ring"
+
+    def __init__(self, ring, control_stream, max_length=1000000, deliver_control=False):
+        self.ring = ring
+        self.deliver_control = deliver_control
+        self.sample_format = ring.sample_format
+        self.sample_rate = ring.sample_rate
+        self.channels = ring.channels
+        self.control_stream = control_stream
+        self.max_length = max_length - (max_length % (SAMPLE_WIDTHS[ring.sample_format] * ring.channels))
+        self.wake = bytearray(SharedAudioRing.CURSOR.size)
+        self.wake_view = memoryview(self.wake)
+        self.data = memoryview(ring.mapping)[SharedAudioRing.HEADER_SIZE:SharedAudioRing.HEADER_SIZE + ring.capacity]
+        self.read_cursor = ring.write_cursor()
+        self.target_cursor = self.read_cursor
+        # How far the writer may be past the cursor in the header: its publishing lag plus
+        # the largest write seen, which may be in progress while a frame is copied
+        self.publish_lag = ring.capacity // SharedAudioRing.CURSOR_PUBLISH_DIVISOR
+        self.largest_write = 0
+        self.free_buffers = queue.SimpleQueue()
+        self.overrun_bytes = 0
+
+    def read_exact(self, view):
+        """Fill view from the control stream; False if it closed first"""
+        filled = 0
+        while filled < len(view):
+            count = self.control_stream.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def wait(self):
+        """Block for the next wake-up; returns True, a ControlMessage, or False once the control stream closes"""
+        if not self.read_exact(self.wake_view):
+            return False
+        cursor = SharedAudioRing.CURSOR.unpack_from(self.wake)[0]
+        if cursor & SharedAudioRing.CONTROL_FLAG:
+            return self.read_control(cursor & 0xFFFFFFFF)
+        self.largest_write = max(self.largest_write, cursor - self.target_cursor)
+        self.target_cursor = max(self.target_cursor, cursor)
+        return True
+
+    def read_control(self, length):
+        payload = bytearray(length)
+        if not self.read_exact(memoryview(payload)):
+            return False
+        try:
+            message = json.loads(payload.decode('utf-8'))
+        except ValueError as e:
+            logger.error(f"Bad control message: {e}")
+            return True
+        if not self.deliver_control:
+            logger.debug(f"Control message ignored: {message}")
+            return True
+        return ControlMessage(message)
+
+    def acquire(self, length):
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = bytearray(length)
+        if len(buffer) < length:
+            buffer = bytearray(length)
+        return buffer
+
+    def overrun(self, skipped):
+        self.overrun_bytes += skipped
+        logger.error(f"Ring overrun: skipped {skipped} bytes (total {self.overrun_bytes})")
+
+    def next_frame(self):
+        """Return the next (buffer, length, None) frame or ControlMessage, or None once the control stream closes"""
+        capacity = self.ring.capacity
+        while True:
+            # Wake records are only read once the audio before them is out, which keeps controls in order
+            while self.read_cursor >= self.target_cursor:
+                woken = self.wait()
+                if woken is False:
+                    return None
+                if isinstance(woken, ControlMessage):
+                    return woken
+
+            behind = self.target_cursor - self.read_cursor
+            if behind > capacity:
+                self.overrun(behind - capacity)
+                self.read_cursor = self.target_cursor - capacity
+
+            position = self.read_cursor
+            start = position % capacity
+            length = min(self.target_cursor - position, capacity - start, self.max_length)
+            self.read_cursor += length
+            buffer = self.acquire(length)
+            buffer[:length] = self.data[start:start + length]
+
+            # Writes that could be under way cover up to this far; what they lap is no longer ours
+            writer_reach = max(self.ring.write_cursor() + self.publish_lag, self.target_cursor) + self.largest_write
+            if position + capacity >= writer_reach:
+                return buffer, length, None
+            self.release(buffer)
+            self.overrun(length)
+            self.read_cursor = max(self.read_cursor, writer_reach - capacity)
+            self.target_cursor = max(self.target_cursor, self.read_cursor)
+
+    def release(self, buffer):
+        self.free_buffers.put(buffer)
+
+    def close(self):
+        self.data.release()
+        self.ring.close()
+
+
+def ring_path_from_argv(argv):
+    """Return the value of --shm-ring if present"""
+    if '--shm-ring' in argv:
+        index = argv.index('--shm-ring')
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return None
+
+
+def open_audio_source(argv, stream=None, min_length=2, max_length=1000000, deliver_control=False):
+    """Pick the shared ring when one was requested, otherwise framed stdin (v1 or v2)"""
+    stream = stream if stream is not None else sys.stdin.buffer
+    ring_path = ring_path_from_argv(argv)
+    if ring_path:
+        return SharedAudioRing.attach(ring_path).reader(stream, max_length=max_length,
+                                                        deliver_control=deliver_control)
+    return FrameReader(stream, min_length=min_length, max_length=max_length,
+                       deliver_control=deliver_control)
@@ -0,0 +1,220 @@
+"""
+Frame-energy voice activity gate shared by the recognizers
+
+The gate splits each chunk into short frames, computes their energy in one
+vectorized pass and decides whether the chunk is worth decoding. A hangover
+keeps the gate open for a while after the last voiced frame so word endings
+and short pauses still reach the recognizer. NumPy is required; callers treat
+an ImportError as "no gate" and decode everything as before.
+
+SpeechSegmenter applies the same frame energies to a float32 stream and cuts
+it into padded speech segments, so the Whisper engines can transcribe whole
+segments with faster-whisper's own VAD turned off.
+"""
+
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+GATE_SPEECH = 'speech'    # Voiced, or still inside the hangover - decode it
+GATE_CLOSED = 'closed'    # First silent chunk after speech - let the recognizer see the pause
+GATE_SILENCE = 'silence'  # Pure silence - skip it
+
+FRAME_MS = 10
+THRESHOLD_DBFS = -45.0
+HANGOVER_MS = 300
+
+MIN_SPEECH_MS = 200   # Voiced audio needed to open a segment
+MIN_SILENCE_MS = 300  # Unvoiced audio that closes one
+PAD_MS = 200          # Kept either side of the speech, so onsets and word endings survive
+CUT_SEARCH_MS = 1000  # A segment at its maximum length is cut at the quietest frame this far back
+
+
+def frame_energies(samples, frame_samples):
+    """Mean square per frame of a NumPy sample array; a trailing partial frame counts as a frame of its own"""
+    import numpy as np
+
+    usable = len(samples) - len(samples) % frame_samples
+    frames = samples[:usable].reshape(-1, frame_samples).astype(np.float32)
+    energies = np.einsum('ij,ij->i', frames, frames) / frame_samples
+    if usable < len(samples):
+        tail = samples[usable:].astype(np.float32)
+        energies = np.append(energies, np.dot(tail, tail) / len(tail))
+    return energies
+
+
+class EnergyGate:
+    """Decide per chunk whether Int16 PCM holds speech.
+
+    A frame is voiced when its mean energy is above threshold_dbfs. Chunks
+    with a voiced frame open the gate, which then stays open for hangover_ms
+    of audio after the last voiced frame. Counters track how much audio was
+    gated so callers can report it.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=FRAME_MS, threshold_dbfs=THRESHOLD_DBFS,
+                 hangover_ms=HANGOVER_MS):
+        import numpy as np
+
+        self.np = np
+        self.sample_rate = sample_rate
+        self.frame_samples = max(1, sample_rate * frame_ms // 1000)
+        self.hangover_samples = int(sample_rate * hangover_ms / 1000)
+        # Mean square of Int16 samples at the threshold level
+        self.threshold = (32768.0 * 10 ** (threshold_dbfs / 20.0)) ** 2
+        self.open = False
+        self.hangover_left = 0
+        self.total_samples = 0
+        self.gated_samples = 0
+        self.gated_chunks = 0
+
+    def update(self, view):
+        """Classify one chunk of Int16 PCM; returns GATE_SPEECH, GATE_CLOSED or GATE_SILENCE"""
+        np = self.np
+        samples = np.frombuffer(view[:len(view) - len(view) % 2], dtype=np.int16)
+        count = len(samples)
+        self.total_samples += count
+        if count == 0:
+            return GATE_SPEECH if self.open else GATE_SILENCE
+
+        voiced = np.flatnonzero(frame_energies(samples, self.frame_samples) > self.threshold)
+        if len(voiced):
+            # Hangover counts from the end of the last voiced frame
+            trailing = max(0, count - (int(voiced[-1]) + 1) * self.frame_samples)
+            self.hangover_left = max(0, self.hangover_samples - trailing)
+            self.open = True
+            return GATE_SPEECH
+
+        if self.hangover_left > 0:
+            self.hangover_left = max(0, self.hangover_left - count)
+            return GATE_SPEECH
+
+        self.gated_samples += count
+        self.gated_chunks += 1
+        if self.open:
+            self.open = False
+            return GATE_CLOSED
+        return GATE_SILENCE
+
+    def reset(self):
+        self.open = False
+        self.hangover_left = 0
+
+    @property
+    def gated_ms(self):
+        return self.gated_samples * 1000 // self.sample_rate
+
+    @property
+    def total_ms(self):
+        return self.total_samples * 1000 // self.sample_rate
+
+    def summary(self):
+        gated_pct = (self.gated_samples / self.total_samples * 100.0) if self.total_samples else 0.0
+        return {"gated_ms": self.gated_ms, "total_ms": self.total_ms, "gated_pct": round(gated_pct, 1)}
+
+
+class SpeechSegmenter:
+    """Cut a float32 stream into padded speech segments as it arrives.
+
+    Frames are voiced when their mean energy is above threshold_dbfs.
+    min_speech_ms of consecutive voiced frames opens a segment, which starts
+    pad_ms early; min_silence_ms of unvoiced frames closes it pad_ms after the
+    last voiced frame. A segment reaching max_segment_ms is cut at its
+    quietest recent frame, so long speech still goes out in pieces that end
+    between words. State carries across calls, including a partial frame, so
+    chunk sizes never move a boundary.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=FRAME_MS, threshold_dbfs=THRESHOLD_DBFS,
+                 min_speech_ms=MIN_SPEECH_MS, min_silence_ms=MIN_SILENCE_MS, pad_ms=PAD_MS,
+                 max_segment_ms=None):
+        import numpy as np
+
+        self.np = np
+        self.sample_rate = sample_rate
+        self.frame_samples = max(1, sample_rate * frame_ms // 1000)
+        # Mean square of float32 samples at the threshold level
+        self.threshold = (10 ** (threshold_dbfs / 20.0)) ** 2
+        self.onset_frames = max(1, min_speech_ms // frame_ms)
+        self.release_frames = max(1, min_silence_ms // frame_ms)
+        self.pad_frames = min(pad_ms // frame_ms, self.release_frames)
+        self.max_segment_samples = int(sample_rate * max_segment_ms / 1000) if max_segment_ms else None
+
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.preroll = deque(maxlen=self.pad_frames + self.onset_frames)  # Frames before a segment opens
+        self.trailing = []  # Unvoiced frames inside a segment, held until speech resumes or it closes
+        # (end position, energy) of the latest kept frames; searched for cuts within the last third
+        # of a maximum-length segment at most, so every piece is at least two thirds of the maximum
+        search_ms = min(CUT_SEARCH_MS, max_segment_ms // 3) if max_segment_ms else CUT_SEARCH_MS
+        self.recent = deque(maxlen=max(1, search_ms // frame_ms))
+        self.in_speech = False
+        self.voiced_run = 0
+        self.position = 0       # Samples kept so far; segment ends are given on this scale
+        self.segment_start = 0
+        self.stats = {'segments': 0, 'forced_cuts': 0, 'speech_samples': 0, 'total_samples': 0}
+
+    def process(self, samples):
+        """Classify the next chunk; returns (samples to keep, positions where segments ended)"""
+        np = self.np
+        samples = np.array(samples, dtype=np.float32)  # Frames are held across calls, so never a view
+        self.stats['total_samples'] += len(samples)
+        if len(self.remainder):
+            samples = np.concatenate((self.remainder, samples))
+        usable = len(samples) - len(samples) % self.frame_samples
+        self.remainder = samples[usable:]
+
+        kept = []
+        ends = []
+        frames = samples[:usable].reshape(-1, self.frame_samples)
+        for frame, energy in zip(frames, frame_energies(samples[:usable], self.frame_samples)):
+            voiced = energy > self.threshold
+            if not self.in_speech:
+                self.preroll.append((frame, energy))
+                self.voiced_run = self.voiced_run + 1 if voiced else 0
+                if self.voiced_run >= self.onset_frames:
+                    self.in_speech = True
+                    self.segment_start = self.position
+                    self.recent.clear()
+                    self.keep(self.preroll, kept)
+                    self.preroll.clear()
+                continue
+
+            if not voiced:
+                self.trailing.append((frame, energy))
+                if len(self.trailing) >= self.release_frames:
+                    self.keep(self.trailing[:self.pad_frames], kept)
+                    self.preroll.extend(self.trailing[self.pad_frames:])
+                    self.trailing = []
+                    self.in_speech = False
+                    self.voiced_run = 0
+                    self.stats['segments'] += 1
+                    ends.append(self.position)
+                continue
+
+            self.keep(self.trailing, kept)
+            self.trailing = []
+            self.keep([(frame, energy)], kept)
+            if self.max_segment_samples and self.position - self.segment_start >= self.max_segment_samples:
+                cut = min(self.recent, key=lambda entry: entry[1])[0]
+                self.recent = deque((entry for entry in self.recent if entry[0] > cut), maxlen=self.recent.maxlen)
+                self.segment_start = cut
+                self.stats['forced_cuts'] += 1
+                ends.append(cut)
+
+        if not kept:
+            return np.zeros(0, dtype=np.float32), ends
+        return np.concatenate(kept), ends
+
+    def keep(self, frames, kept):
+        for frame, energy in frames:
+            kept.append(frame)
+            self.position += len(frame)
+            self.recent.append((self.position, energy))
+            self.stats['speech_samples'] += len(frame)
+
+    def summary(self):
+        total = self.stats['total_samples']
+        speech_pct = (self.stats['speech_samples'] / total * 100.0) if total else 0.0
+        return {"segments": self.stats['segments'], "forced_cuts": self.stats['forced_cuts'],
+                "speech_pct": round(speech_pct, 1)}
@@ -0,0 +1,149 @@
+"""
+Per-window decode budgets for the Whisper engines
+
+A window that fails faster-whisper's quality checks is decoded again at each
+further temperature, with best_of samples apiece, and a hallucination loop
+can generate up to the model's 448-token limit every time. A few such
+windows used to hold the pipeline for seconds. DecodeGuard keeps
+faster-whisper's own fallback, which reuses the encoder output between
+temperatures, and bounds it: the temperature list is cut to at most
+`max_fallbacks` retries, every decode is capped at a token count scaled to
+the window's duration through max_new_tokens, and segments stop being taken
+once the window's wall-clock deadline has passed. The deadline is checked
+between segments, so it cannot cut short the segment being decoded; only
+the token cap bounds that. faster-whisper before 0.10 has no
+max_new_tokens, so there a window gets a single temperature and no
+retries. Each decode reports how many fallbacks it used and how many times
+a budget cut it short.
+"""
+
+import time
+import inspect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_FALLBACKS = 1        # Retries at higher temperatures after the first decode
+TOKENS_PER_SECOND = 8    # Fast speech is about 5 tokens a second, plus timestamp tokens
+MIN_TOKENS = 16
+MAX_TOKENS = 224         # Half of Whisper's 448-token context, leaving room for the prompt
+
+# Abort reason -> stats counter
+ABORT_STATS = {'tokens': 'token_aborts', 'retries': 'retry_aborts', 'deadline': 'deadline_aborts'}
+
+
+def token_cap(duration, tokens_per_second=TOKENS_PER_SECOND):
+    """Largest plausible token count for `duration` seconds of speech"""
+    return max(MIN_TOKENS, min(MAX_TOKENS, int(duration * tokens_per_second) + MIN_TOKENS))
+
+
+def temperatures(settings):
+    value = settings.get('temperature', 0.0)
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def generated(segments):
+    """Tokens a decode produced, as far as its kept segments show"""
+    return sum(len(getattr(segment, 'tokens', None) or ()) for segment in segments)
+
+
+def fallbacks_used(segments, schedule):
+    """Retries behind the decode: faster-whisper tags each segment with the temperature that produced it"""
+    used = [getattr(segment, 'temperature', None) for segment in segments]
+    used = [temperature for temperature in used if temperature is not None]
+    if not used:
+        return 0
+    return max(min(range(len(schedule)), key=lambda index: abs(schedule[index] - temperature))
+               for temperature in used)
+
+
+class DecodeGuard:
+    """faster-whisper's temperature fallback under a retry limit, a token cap and a deadline.
+
+    decode() returns (segments, info, report). The report counts the
+    fallbacks used and the aborts: decodes stopped at the token cap, windows
+    that still failed the quality checks when the retry limit cut the
+    temperature list short, and segments left untaken at the deadline.
+    """
+
+    def __init__(self, max_fallbacks=MAX_FALLBACKS, deadline_ms=None, tokens_per_second=TOKENS_PER_SECOND):
+        self.max_fallbacks = max(0, int(max_fallbacks))
+        self.deadline = deadline_ms / 1000.0 if deadline_ms else None
+        self.tokens_per_second = tokens_per_second
+        self.max_new_tokens_support = {}  # Model class -> whether transcribe() takes max_new_tokens
+        self.lock = threading.Lock()
+        self.stats = {'windows': 0, 'fallbacks': 0, 'token_aborts': 0, 'retry_aborts': 0, 'deadline_aborts': 0}
+
+    def accepts_max_new_tokens(self, model):
+        """max_new_tokens arrived in faster-whisper 0.10; older versions decode up to the model limit"""
+        supported = self.max_new_tokens_support.get(type(model))
+        if supported is None:
+            supported = 'max_new_tokens' in inspect.signature(model.transcribe).parameters
+            self.max_new_tokens_support[type(model)] = supported
+        return supported
+
+    def decode(self, model, audio, settings, duration):
+        started = time.time()
+        cap = token_cap(duration, self.tokens_per_second)
+        schedule = temperatures(settings)
+        capped = self.accepts_max_new_tokens(model)
+        # ✅ Without a token cap a runaway segment runs to the model limit at every temperature, and the
+        # deadline is only checked once it is done, so uncapped decodes get no retries
+        allowed = schedule[:self.max_fallbacks + 1 if capped else 1]
+        options = dict(settings, temperature=allowed if len(allowed) > 1 else allowed[0])
+        if capped:
+            options['max_new_tokens'] = cap
+
+        report = {'fallbacks': 0, 'aborts': 0, 'reasons': []}
+        segments, info = model.transcribe(audio, **options)
+        kept = []
+        for segment in segments:
+            kept.append(segment)
+            # Decoding is lazy, so what is not taken now is never decoded; the segment just taken was
+            # decoded in full whatever the clock says
+            if self.deadline is not None and time.time() - started > self.deadline:
+                report['reasons'].append('deadline')
+                break
+        if hasattr(segments, 'close'):
+            segments.close()
+
+        report['fallbacks'] = fallbacks_used(kept, allowed)
+        if generated(kept) >= cap:
+            report['reasons'].append('tokens')
+        # Every allowed temperature was tried and the result still fails the checks
+        if len(allowed) < len(schedule) and report['fallbacks'] == len(allowed) - 1 and self.check(kept, settings)[0]:
+            report['reasons'].append('retries')
+        report['aborts'] = len(report['reasons'])
+        self.account(report)
+        return kept, info, report
+
+    def check(self, segments, settings):
+        """(needs fallback, too repetitive, avg_logprob) with faster-whisper's own thresholds"""
+        if not segments:
+            return False, False, 0.0  # Silence, or speech the no-speech check already dropped
+        ratio_threshold = settings.get('compression_ratio_threshold')
+        logprob_threshold = settings.get('log_prob_threshold')
+        ratio = max(getattr(segment, 'compression_ratio', 0.0) for segment in segments)
+        avg_logprob = min(getattr(segment, 'avg_logprob', 0.0) for segment in segments)
+        repetitive = ratio_threshold is not None and ratio > ratio_threshold
+        unsure = logprob_threshold is not None and avg_logprob < logprob_threshold
+        return repetitive or unsure, repetitive, avg_logprob
+
+    def batch_report(self, segments, cap):
+        """Report for one clip of a batched decode, which runs at the first temperature only under `cap`"""
+        runaway = generated(segments) >= cap
+        report = {'fallbacks': 0, 'aborts': int(runaway), 'reasons': ['tokens'] if runaway else []}
+        self.account(report)
+        return report
+
+    def account(self, report):
+        with self.lock:
+            self.stats['windows'] += 1
+            self.stats['fallbacks'] += report['fallbacks']
+            for reason in report['reasons']:
+                self.stats[ABORT_STATS[reason]] += 1
+
+    def summary(self):
+        with self.lock:
+            return dict(self.stats)
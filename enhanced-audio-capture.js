@@ -8,6 +8,10 @@ if ($DebugTestMode) {
 
 let globalAudioCapture = null;
 
+// Recognizer stream ids (audio-transport.js): results come back tagged "me" and "them"
+const VOSK_STREAM_MICROPHONE = 0;
+const VOSK_STREAM_SYSTEM = 1;
+
 class EnhancedAudioCapture {
   constructor() {
     if ($DebugTestMode) {
@@ -40,6 +44,7 @@ class EnhancedAudioCapture {
       micSource: null,
       systemGain: null,
       micGain: null,
+      systemTap: null,
       destination: null,
       sampleRate: 16000, // ADD THIS
     };
@@ -1604,16 +1609,16 @@ class EnhancedAudioCapture {
         const systemGain = audioContext.createGain();
         const micGain = audioContext.createGain();
 
-        // Better mixing levels
-        systemGain.gain.value = 0.7; // System audio at 70%
+        // System audio is no longer mixed in; it is recognized on its own stream
+        systemGain.gain.value = 1.0;
         micGain.gain.value = 1.5; // Microphone at 150%
 
         const destination = audioContext.createMediaStreamDestination();
 
         systemSource.connect(systemGain);
         micSource.connect(micGain);
-        systemGain.connect(destination);
         micGain.connect(destination);
+        this.mixer.systemTap = this.startSystemTap(audioContext, systemGain);
 
         // Store references
         this.systemStream = systemStream;
@@ -1647,6 +1652,30 @@ class EnhancedAudioCapture {
     }
   }
 
+  // Send system audio to the recognizer as its own stream, so "me" and "them" decode apart
+  startSystemTap(audioContext, node) {
+    const tap = audioContext.createScriptProcessor(4096, 1, 1);
+    tap.onaudioprocess = (event) => {
+      if (!window.electronAPI?.sendAudioToVosk) {
+        return;
+      }
+      // Same clock the microphone path stamps with
+      const captureMicros = Math.round(
+        (performance.timeOrigin + performance.now()) * 1000
+      );
+      const input = event.inputBuffer.getChannelData(0);
+      const pcm = new Int16Array(input.length);
+      for (let i = 0; i < input.length; i++) {
+        const sample = Math.max(-1, Math.min(1, input[i]));
+        pcm[i] = sample < 0 ? sample * 32768 : sample * 32767;
+      }
+      window.electronAPI.sendAudioToVosk(pcm.buffer, VOSK_STREAM_SYSTEM, captureMicros);
+    };
+    node.connect(tap);
+    tap.connect(audioContext.destination); // Outputs silence; a processor only runs while connected
+    return tap;
+  }
+
   // Main capture method - tries all approaches
   async captureSystemAudio() {
     if ($DebugTestMode) {
@@ -1864,6 +1893,11 @@ class EnhancedAudioCapture {
 
     try {
       // ✅ NEW: Clean up mixer components
+      if (this.mixer.systemTap) {
+        this.mixer.systemTap.onaudioprocess = null;
+        this.mixer.systemTap.disconnect();
+        this.mixer.systemTap = null;
+      }
       if (this.mixer.systemSource) {
         this.mixer.systemSource.disconnect();
         this.mixer.systemSource = null;
@@ -2103,6 +2137,10 @@ async function captureSystemAudioFixed() {
     }
 
     if (result && result.stream) {
+      // The stream handed back is system audio alone only when there is no microphone
+      window.currentAudioStreamId =
+        result.type === "system" ? VOSK_STREAM_SYSTEM : VOSK_STREAM_MICROPHONE;
+
       if ($DebugTestMode) {
         console.log("🎵 [221] ✅ Enhanced audio capture successful");
         console.log("🎵 [222] Stream type:", result.type);
@@ -15,7 +15,7 @@ let audioWorker = null;
 let voskReady = false;
 let lastTranscript = "";
 let lastTranscriptTime = 0;
-let currentPartialTranscriptId = null;
+const currentPartialTranscriptIds = {}; // Result stream ("me", "them") -> its open partial entry
 
 /**
  * LanguageTool Integration State
@@ -823,19 +823,30 @@ window.addEventListener("load", async () => {
 
         if (data.text && data.text.trim().length > 0) {
           // ✅ CRITICAL: Make sure this calls handleTranscript
+          // Each stream has its own utterance in progress
+          const stream = data.stream || "me";
           if (data.type === "partial") {
-            if (!currentPartialTranscriptId) {
-              currentPartialTranscriptId = Date.now().toString();
-              handleTranscript(data.text, true, currentPartialTranscriptId);
+            if (!currentPartialTranscriptIds[stream]) {
+              currentPartialTranscriptIds[stream] = `${stream}-${Date.now()}`;
+              handleTranscript(data.text, true, currentPartialTranscriptIds[stream]);
             } else {
-              updateTranscript(currentPartialTranscriptId, data.text);
+              updateTranscript(currentPartialTranscriptIds[stream], data.text);
             }
           } else if (data.type === "final") {
             if ($DebugTestMode) {
               console.log("🎵 ✅ FINAL TRANSCRIPT:", data.text); // ✅ ADD THIS
             }
-            currentPartialTranscriptId = null; // Reset partial ID
-            handleTranscript(data.text, false); // ✅ This sends to transcript window
+            if (data.revision && typeof data.utterance === "number") {
+              // Whisper's text for an utterance already shown - replace it in place. The
+              // next utterance's partial may be on screen by now, so its entry stays open
+              updateTranscript(`vosk-utterance-${data.utterance}`, data.text, true);
+            } else if (typeof data.utterance !== "number") {
+              delete currentPartialTranscriptIds[stream]; // Reset partial ID
+              handleTranscript(data.text, false); // ✅ This sends to transcript window
+            } else {
+              delete currentPartialTranscriptIds[stream]; // Reset partial ID
+              handleTranscript(data.text, false, `vosk-utterance-${data.utterance}`);
+            }
           }
         }
       });
@@ -1475,6 +1486,10 @@ async function setupSimpleAudioProcessing(inputStream) {
 
     processor.onaudioprocess = function (audioProcessingEvent) {
       try {
+        // Stamped on arrival from the audio thread, on the clock the main process batches with
+        const captureMicros = Math.round(
+          (performance.timeOrigin + performance.now()) * 1000
+        );
         const inputBuffer = audioProcessingEvent.inputBuffer;
         const inputData = inputBuffer.getChannelData(0); // Float32Array
 
@@ -1506,7 +1521,13 @@ async function setupSimpleAudioProcessing(inputStream) {
         // ✅ CRITICAL FIX: Send as ArrayBuffer, not Array
         if (window.electronAPI?.sendAudioToVosk) {
           // Send the ArrayBuffer directly
-          window.electronAPI.sendAudioToVosk(pcmData.buffer);
+          // Stream 1 when the captured source is system audio alone; with a microphone
+          // present, enhanced-audio-capture.js sends system audio as stream 1 itself
+          window.electronAPI.sendAudioToVosk(
+            pcmData.buffer,
+            window.currentAudioStreamId || 0,
+            captureMicros
+          );
         }
 
         // Enhanced logging
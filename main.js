@@ -196,6 +196,12 @@ ipcMain.handle("get-file-preview", async (event, fileName, conversationId) => {
 
 // 🔧 NEW: Import LanguageTool manager
 const LanguageToolManager = require("./languagetool-manager");
+const {
+  AudioRingWriter,
+  FrameBatcher,
+  supportsProtocolV2,
+  STREAM_MICROPHONE,
+} = require("./audio-transport");
 
 app.commandLine.appendSwitch("ignore-certificate-errors");
 app.commandLine.appendSwitch(
@@ -291,6 +297,22 @@ let saveStateTimeout = null;
 let voskProcess = null;
 let voskReady = false;
 
+// Optional shared-memory transport: PCM goes through an mmap'd ring and stdin only carries wake-ups
+const USE_SHARED_AUDIO_RING = process.env.MLA_SHARED_AUDIO_RING === "1";
+// Optional hybrid mode: Vosk partials and finals at once, each final later revised by this Whisper model
+const VOSK_WHISPER_FINALS = process.env.MLA_WHISPER_FINALS || "";
+// Optional energy gate in front of Vosk. Its threshold is fixed, so it stays off unless asked for;
+// MLA_VOSK_VAD_DB moves the threshold for noisy rooms or quiet microphones
+const USE_VOSK_VAD = process.env.MLA_VOSK_VAD === "1";
+const VOSK_VAD_THRESHOLD_DB = process.env.MLA_VOSK_VAD_DB || "";
+let audioRing = null;
+
+// v2 framing (sequence numbers, capture timestamps, batched writes), enabled once Vosk says hello
+let voskBatcher = null;
+
+// Persistent mode: the Vosk process keeps its model loaded and sessions are START/STOP control messages
+let voskPersistent = false;
+
 // Compromise NLP instance ready flag
 let nlpReady = false;
 
@@ -1973,7 +1995,9 @@ function setupIpcHandlers() {
   logToFile("🎵 REGISTERING send-audio-to-vosk listener");
 
   // Then REPLACE the existing listener with this enhanced version:
-  safeRegisterListener("send-audio-to-vosk", (event, audioBuffer) => {
+  // streamId tags the source: STREAM_MICROPHONE ("me") or STREAM_SYSTEM ("them")
+  // captureMicros is the renderer's capture stamp, so latency reports include the IPC hop
+  safeRegisterListener("send-audio-to-vosk", (event, audioBuffer, streamId, captureMicros) => {
     try {
       // ✅ CRITICAL FIX: Handle ArrayBuffer correctly
       if (!audioBuffer || !(audioBuffer instanceof ArrayBuffer)) {
@@ -1987,13 +2011,7 @@ function setupIpcHandlers() {
       }
 
       // ✅ CRITICAL: Check process health before writing
-      if (
-        !voskProcess ||
-        !voskProcess.childProcess ||
-        !voskProcess.childProcess.stdin ||
-        voskProcess.childProcess.killed ||
-        !voskProcess.childProcess.stdin.writable
-      ) {
+      if (!isVoskProcessHealthy()) {
         logToFile("❌ MAIN: Vosk process not healthy");
         return;
       }
@@ -2010,12 +2028,12 @@ function setupIpcHandlers() {
         return;
       }
 
-      // ✅ SUCCESS: Send to Python with length header
-      const lengthBuffer = Buffer.allocUnsafe(4);
-      lengthBuffer.writeUInt32LE(buffer.length, 0);
-
-      voskProcess.childProcess.stdin.write(lengthBuffer);
-      voskProcess.childProcess.stdin.write(buffer);
+      // ✅ SUCCESS: Send to Python (length-prefixed frame or shared ring)
+      writeAudioToVosk(
+        buffer,
+        Number.isInteger(streamId) ? streamId : STREAM_MICROPHONE,
+        Number.isFinite(captureMicros) ? captureMicros : undefined
+      );
 
       // ✅ Success logging (remove the "Invalid audio data type" error)
       logToFile(`✅ MAIN: Sent ${buffer.length} bytes to Vosk`);
@@ -2454,9 +2472,6 @@ function setupIpcHandlers() {
       );
       const buffer = Buffer.from(arrayBuffer);
 
-      const lengthBuffer = Buffer.allocUnsafe(4);
-      lengthBuffer.writeUInt32LE(buffer.length, 0);
-
       if ($DebugTestMode) {
         logToFile(
           `Sending ${buffer.length} bytes (${audioData.length} samples) to Vosk process`
@@ -2468,8 +2483,7 @@ function setupIpcHandlers() {
         voskProcess.childProcess &&
         voskProcess.childProcess.stdin
       ) {
-        voskProcess.childProcess.stdin.write(lengthBuffer);
-        voskProcess.childProcess.stdin.write(buffer);
+        writeAudioToVosk(buffer);
       } else {
         throw new Error("Vosk process not available");
       }
@@ -2519,6 +2533,11 @@ function setupIpcHandlers() {
       if (!voskReady) {
         await initializeVosk();
       }
+      // Reuse the running process when it can start a session without reloading the model
+      if (voskPersistent && isVoskProcessHealthy()) {
+        sendVoskControl({ cmd: "start" });
+        return { success: true, reused: true };
+      }
       voskProcess = startVoskProcess();
       return { success: true };
     } catch (error) {
@@ -2529,7 +2548,10 @@ function setupIpcHandlers() {
   // Cleanup Vosk handler
   safeRegisterHandler("cleanup-vosk", async () => {
     try {
-      if (voskProcess) {
+      if (voskPersistent && isVoskProcessHealthy()) {
+        // Flush the session's final result but keep the model loaded for the next one
+        sendVoskControl({ cmd: "stop" });
+      } else if (voskProcess) {
         voskProcess.terminate();
         voskProcess = null;
       }
@@ -4090,11 +4112,62 @@ except Exception as e:
 let lastVoskFinal = "";
 let lastVoskTime = 0;
 
+function isVoskProcessHealthy() {
+  return !!(
+    voskProcess &&
+    voskProcess.childProcess &&
+    voskProcess.childProcess.stdin &&
+    !voskProcess.childProcess.killed &&
+    voskProcess.childProcess.stdin.writable
+  );
+}
+
+// Write one Int16 PCM chunk to the running Vosk process
+function writeAudioToVosk(buffer, streamId = STREAM_MICROPHONE, captureMicros = undefined) {
+  const stdin = voskProcess.childProcess.stdin;
+
+  // Only v2 frames carry a stream id; the ring and v1 frames are the microphone alone
+  if (streamId !== STREAM_MICROPHONE && !voskBatcher) {
+    return;
+  }
+
+  if (audioRing) {
+    audioRing.write(buffer);
+    audioRing.notify(stdin);
+    return;
+  }
+
+  if (voskBatcher) {
+    voskBatcher.push(buffer, streamId, captureMicros);
+    return;
+  }
+
+  const lengthBuffer = Buffer.allocUnsafe(4);
+  lengthBuffer.writeUInt32LE(buffer.length, 0);
+  stdin.write(lengthBuffer);
+  stdin.write(buffer);
+}
+
+// Send a session control message to the running Vosk process, in order with its audio
+function sendVoskControl(payload) {
+  if (voskBatcher) {
+    voskBatcher.control(payload);
+  } else if (audioRing) {
+    audioRing.control(voskProcess.childProcess.stdin, payload);
+  }
+}
+
 function startVoskProcess() {
   if ($DebugTestMode) {
     logToFile("startVoskProcess called");
   }
 
+  if (voskBatcher) {
+    voskBatcher.close();
+    voskBatcher = null;
+  }
+  voskPersistent = false;
+
   if (voskProcess) {
     if ($DebugTestMode) {
       logToFile("Terminating existing Vosk process");
@@ -4117,13 +4190,154 @@ function startVoskProcess() {
     logToFile("Starting Vosk with model:", modelPath);
   }
 
+  const voskArgs = [modelPath, "--persistent"];
+  if (USE_VOSK_VAD) {
+    voskArgs.push("--vad");
+    if (VOSK_VAD_THRESHOLD_DB) {
+      voskArgs.push("--vad-threshold-db", VOSK_VAD_THRESHOLD_DB);
+    }
+  }
+  if (VOSK_WHISPER_FINALS) {
+    voskArgs.push("--whisper-finals", VOSK_WHISPER_FINALS);
+  }
+  if (USE_SHARED_AUDIO_RING) {
+    try {
+      if (!audioRing) {
+        audioRing = new AudioRingWriter();
+      }
+      audioRing.publish(); // The new process starts reading at the header's cursor
+      voskArgs.push("--shm-ring", audioRing.filePath);
+    } catch (error) {
+      if ($DebugTestMode) {
+        logToFile("Shared audio ring unavailable, using stdin frames:", error);
+      }
+      audioRing = null;
+    }
+  }
+
   try {
-    voskProcess = new PythonShell("vosk_realtime.py", {
+    // Results are delivered one at a time in arrival order: text correction is async, and a
+    // short Whisper revision must never overtake the Vosk final it replaces
+    let resultChain = Promise.resolve();
+    const filteredUtterances = new Set(); // Finals dropped as duplicates, whose revisions go too
+    const deliverVoskResult = async (result) => {
+      // Add duplicate check at Vosk level using module variables
+      // (Whisper revisions replace a final already shown, so they are never duplicates)
+      if (result.type === "final" && !result.revision) {
+        if (
+          lastVoskFinal === result.text &&
+          Date.now() - lastVoskTime < 1000
+        ) {
+          if ($DebugTestMode) {
+            logToFile("Duplicate Vosk result ignored:", result.text);
+          }
+          if (typeof result.utterance === "number") {
+            filteredUtterances.add(result.utterance);
+          }
+          return; // Skip duplicate
+        }
+        lastVoskFinal = result.text;
+        lastVoskTime = Date.now();
+      }
+
+      // A revision of a final that was filtered out has nothing on screen to replace
+      if (result.revision && filteredUtterances.delete(result.utterance)) {
+        if ($DebugTestMode) {
+          logToFile("Revision of an ignored Vosk final dropped:", result.text);
+        }
+        return;
+      }
+
+      if ($DebugTestMode) {
+        logToFile("Parsed Vosk result:", result);
+      }
+
+      if (result.type === "final" || result.type === "partial") {
+        // Start with basic text
+        let originalText = String(result.text || "");
+        let correctedText = originalText;
+
+        // Apply text correction if available
+        if (nlpReady && originalText.trim()) {
+          try {
+            correctedText = await correctText(originalText);
+          } catch (correctionError) {
+            if ($DebugTestMode) {
+              logToFile("Error in text correction:", correctionError);
+            }
+            correctedText = originalText; // Fallback to original
+          }
+        }
+
+        // Create completely clean, serializable object
+        const cleanResult = {
+          type: String(result.type),
+          text: String(correctedText),
+          originalText:
+            originalText !== correctedText ? String(originalText) : undefined,
+          confidence:
+            typeof result.confidence === "number" ? result.confidence : 0,
+          utterance:
+            typeof result.utterance === "number" ? result.utterance : undefined,
+          revision: result.revision === true ? true : undefined,
+          stream: typeof result.stream === "string" ? result.stream : undefined,
+          timestamp: Date.now(),
+        };
+
+        // Remove undefined values
+        Object.keys(cleanResult).forEach((key) => {
+          if (cleanResult[key] === undefined) {
+            delete cleanResult[key];
+          }
+        });
+
+        if ($DebugTestMode) {
+          logToFile(
+            `Sending ${cleanResult.type} transcription:`,
+            cleanResult.text
+          );
+          logToFile("Clean result object:", cleanResult);
+        }
+
+        // Send with error handling
+        const success = safeSendToWindow(
+          controlWindow,
+          "vosk-transcription",
+          cleanResult
+        );
+        if (!success && $DebugTestMode) {
+          logToFile("Failed to send Vosk transcription to control window");
+        }
+      } else if (result.type === "error") {
+        // Create clean error object
+        const cleanError = {
+          type: "error",
+          error: String(result.error || "Unknown Vosk error"),
+          timestamp: Date.now(),
+        };
+
+        if ($DebugTestMode) {
+          logToFile("Vosk error:", cleanError.error);
+        }
+
+        const success = safeSendToWindow(
+          controlWindow,
+          "vosk-transcription",
+          cleanError
+        );
+        if (!success && $DebugTestMode) {
+          logToFile("Failed to send Vosk error to control window");
+        }
+      }
+    };
+
+    const thisProcess = new PythonShell("vosk_realtime.py", {
       mode: "text",
       pythonOptions: ["-u"],
       scriptPath: __dirname,
-      args: [modelPath],
+      args: voskArgs,
     });
+    voskProcess = thisProcess;
 
     voskProcess.on("message", async (message) => {
       if ($DebugTestMode) {
@@ -4140,98 +4354,60 @@ function startVoskProcess() {
       try {
         const result = JSON.parse(message);
 
-        // Add duplicate check at Vosk level using module variables
-        if (result.type === "final") {
+        // Protocol negotiation: switch to batched v2 frames when the script supports them
+        if (result.type === "hello") {
           if (
-            lastVoskFinal === result.text &&
-            Date.now() - lastVoskTime < 1000
+            supportsProtocolV2(result) &&
+            !audioRing &&
+            voskProcess &&
+            voskProcess.childProcess &&
+            voskProcess.childProcess.stdin
           ) {
-            if ($DebugTestMode) {
-              logToFile("Duplicate Vosk result ignored:", result.text);
-            }
-            return; // Skip duplicate
-          }
-          lastVoskFinal = result.text;
-          lastVoskTime = Date.now();
-        }
-
-        if ($DebugTestMode) {
-          logToFile("Parsed Vosk result:", result);
-        }
-
-        if (result.type === "final" || result.type === "partial") {
-          // Start with basic text
-          let originalText = String(result.text || "");
-          let correctedText = originalText;
-
-          // Apply text correction if available
-          if (nlpReady && originalText.trim()) {
-            try {
-              correctedText = await correctText(originalText);
-            } catch (correctionError) {
-              if ($DebugTestMode) {
-                logToFile("Error in text correction:", correctionError);
-              }
-              correctedText = originalText; // Fallback to original
-            }
+            voskBatcher = new FrameBatcher(voskProcess.childProcess.stdin, {
+              sampleRate: result.sample_rate || 16000,
+            });
           }
-
-          // Create completely clean, serializable object
-          const cleanResult = {
-            type: String(result.type),
-            text: String(correctedText),
-            originalText:
-              originalText !== correctedText ? String(originalText) : undefined,
-            confidence:
-              typeof result.confidence === "number" ? result.confidence : 0,
-            timestamp: Date.now(),
-          };
-
-          // Remove undefined values
-          Object.keys(cleanResult).forEach((key) => {
-            if (cleanResult[key] === undefined) {
-              delete cleanResult[key];
-            }
-          });
-
+          // Control messages travel in v2 batches, or as control records next to the ring's wake-ups
+          voskPersistent = !!result.persistent && (!!voskBatcher || !!audioRing);
           if ($DebugTestMode) {
             logToFile(
-              `Sending ${cleanResult.type} transcription:`,
-              cleanResult.text
+              `Vosk protocols: ${JSON.stringify(result.protocols)}, using v${
+                voskBatcher ? 2 : 1
+              }${voskPersistent ? ", persistent" : ""}`
             );
-            logToFile("Clean result object:", cleanResult);
-          }
-
-          // Send with error handling
-          const success = safeSendToWindow(
-            controlWindow,
-            "vosk-transcription",
-            cleanResult
-          );
-          if (!success && $DebugTestMode) {
-            logToFile("Failed to send Vosk transcription to control window");
           }
-        } else if (result.type === "error") {
-          // Create clean error object
-          const cleanError = {
-            type: "error",
-            error: String(result.error || "Unknown Vosk error"),
-            timestamp: Date.now(),
-          };
+          return;
+        }
 
+        if (result.type === "session") {
           if ($DebugTestMode) {
-            logToFile("Vosk error:", cleanError.error);
+            logToFile(
+              `Vosk session ${result.session} ${result.event} in ${result.ready_ms}ms`
+            );
           }
+          return;
+        }
 
-          const success = safeSendToWindow(
-            controlWindow,
-            "vosk-transcription",
-            cleanError
-          );
-          if (!success && $DebugTestMode) {
-            logToFile("Failed to send Vosk error to control window");
+        // Flow control: credits and recommended frame size for the batched sender
+        if (result.type === "flow") {
+          if (voskBatcher) {
+            voskBatcher.updateFlow(result);
           }
+          if ($DebugTestMode && result.dropped > 0) {
+            logToFile(
+              `Vosk flow: ${result.credits} credits, queue ${result.queue_depth}/${result.queue_capacity}, ${result.dropped} dropped`
+            );
+          }
+          return;
         }
+
+        resultChain = resultChain
+          .then(() => deliverVoskResult(result))
+          .catch((deliveryError) => {
+            if ($DebugTestMode) {
+              logToFile("Failed to deliver Vosk result:", deliveryError);
+            }
+          });
       } catch (parseError) {
         if ($DebugTestMode) {
           logToFile("Failed to parse Vosk output:", parseError);
@@ -4266,6 +4442,15 @@ function startVoskProcess() {
       if ($DebugTestMode) {
         logToFile("Vosk process closed");
       }
+      // A replacement process may already be running; only clear state that belongs to this one
+      if (voskProcess !== thisProcess) {
+        return;
+      }
+      if (voskBatcher) {
+        voskBatcher.close();
+        voskBatcher = null;
+      }
+      voskPersistent = false;
       voskProcess = null;
     });
 
@@ -4449,6 +4634,10 @@ app.on("will-quit", () => {
   if (voskProcess) {
     voskProcess.terminate();
   }
+  if (audioRing) {
+    audioRing.close();
+    audioRing = null;
+  }
 
   // 🔧 NEW: Clean up LanguageTool
   if (languageToolManager) {
@@ -508,8 +508,10 @@ contextBridge.exposeInMainWorld("electronAPI", {
   },
 
   // Add this to the electronAPI object in preload.js
-  sendAudioToVosk: (audioData) => {
-    ipcRenderer.send("send-audio-to-vosk", audioData);
+  // streamId: 0 for the microphone ("me"), 1 for system audio ("them");
+  // captureMicros: performance.timeOrigin + performance.now() in µs when the buffer was captured
+  sendAudioToVosk: (audioData, streamId = 0, captureMicros) => {
+    ipcRenderer.send("send-audio-to-vosk", audioData, streamId, captureMicros);
   },
 
   enumerateAudioSources: async () => {
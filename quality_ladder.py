@@ -0,0 +1,149 @@
+"""
+Real-time-factor driven quality ladder for the Whisper engines
+
+Each engine starts at its own operating point. After every transcription the
+ladder records the real-time factor (processing time over audio duration).
+When the smoothed factor, a single window's latency or a truncated buffer
+shows the engine falling behind, it steps down a rung; after a run of
+comfortably fast windows it steps back up. The rungs drop the temperature
+fallbacks and best_of first, then narrow the beam, then word timestamps, and
+last switch to a smaller model if the engine preloaded one.
+"""
+
+import threading
+
+TARGET_RTF = 0.8       # Smoothed real-time factor above which the ladder steps down
+RECOVER_RTF = 0.4      # Below this, with half the latency budget to spare, a window counts as fast
+RECOVER_WINDOWS = 5    # Consecutive fast windows before stepping back up
+MAX_RECOVER_WINDOWS = 80
+SMOOTHING = 0.3        # Weight of the newest window in the smoothed factor
+
+FALLBACK_MODEL = 'fallback_model'  # Rung key: transcribe with the preloaded smaller model
+
+
+def plain(value):
+    """A one-temperature list means the same as the temperature itself"""
+    if isinstance(value, (list, tuple)) and len(value) == 1:
+        return value[0]
+    return value
+
+
+def build_rungs(settings, fallback_model=False, keep=()):
+    """Cumulative setting overrides, cheapest last; rungs that would change nothing are skipped"""
+    rungs = [{}]
+    overrides = {}
+
+    def step(**changes):
+        changes = {key: value for key, value in changes.items()
+                   if key not in keep and plain(overrides.get(key, settings.get(key))) != value}
+        if changes:
+            overrides.update(changes)
+            rungs.append(dict(overrides))
+
+    temperature = plain(settings.get('temperature', 0.0))
+    if isinstance(temperature, (list, tuple)):
+        temperature = temperature[0] if temperature else 0.0
+    step(temperature=temperature, best_of=1)
+
+    beam_size = settings.get('beam_size', 1)
+    while beam_size > 1:
+        beam_size = max(1, beam_size // 2)
+        step(beam_size=beam_size)
+
+    step(word_timestamps=False)
+    if fallback_model:
+        rungs.append(dict(overrides, **{FALLBACK_MODEL: True}))
+    return rungs
+
+
+def describe(rung):
+    return ", ".join(f"{key}={value}" for key, value in rung.items()) or "full quality"
+
+
+class QualityLadder:
+    """Pick the transcription settings for each window from how the last ones kept up.
+
+    current() returns the rung to use and its settings; record() takes the
+    rung's measurement and returns a message when the ladder moved. Only
+    measurements taken at the current rung count, so windows still running
+    on an old rung (the Best engine's pool) never move it twice.
+    """
+
+    def __init__(self, settings, budget_ms, fallback_model=False, keep=()):
+        self.rungs = build_rungs(settings, fallback_model, keep)
+        self.budget = budget_ms / 1000.0
+        self.level = 0
+        self.rtf = None
+        self.fast_windows = 0
+        self.recover_windows = RECOVER_WINDOWS
+        self.windows_since_step_up = None
+        self.last_dropped = 0
+        self.lock = threading.Lock()
+        self.stats = {'windows': 0, 'steps_down': 0, 'steps_up': 0, 'lowest': 0, 'truncations': 0}
+
+    def current(self, settings):
+        """(level, settings for this window)"""
+        with self.lock:
+            level = self.level
+        rung = self.rungs[level]
+        return level, dict(settings, **{key: value for key, value in rung.items() if key != FALLBACK_MODEL})
+
+    def uses_fallback(self, level):
+        return self.rungs[level].get(FALLBACK_MODEL, False)
+
+    def record(self, level, audio_seconds, elapsed, dropped=0):
+        """Account one transcription; `dropped` is the ring's running count of overflowed samples"""
+        if audio_seconds <= 0:
+            return None
+        rtf = elapsed / audio_seconds
+        with self.lock:
+            self.stats['windows'] += 1
+            truncated = dropped > self.last_dropped
+            self.last_dropped = max(self.last_dropped, dropped)
+            if truncated:
+                self.stats['truncations'] += 1
+            if level != self.level:
+                return None
+
+            self.rtf = rtf if self.rtf is None else SMOOTHING * rtf + (1 - SMOOTHING) * self.rtf
+            if self.windows_since_step_up is not None:
+                self.windows_since_step_up += 1
+
+            if truncated or elapsed > self.budget or self.rtf > TARGET_RTF:
+                self.fast_windows = 0
+                if self.level + 1 >= len(self.rungs):
+                    return None
+                # Falling straight back after a step up: wait longer before trying that rung again
+                if self.windows_since_step_up is not None and self.windows_since_step_up <= self.recover_windows:
+                    self.recover_windows = min(MAX_RECOVER_WINDOWS, self.recover_windows * 2)
+                self.windows_since_step_up = None
+                reason = ("buffer truncated" if truncated else
+                          f"{elapsed * 1000:.0f}ms over budget" if elapsed > self.budget else
+                          f"real-time factor {self.rtf:.2f}")
+                return self.move(+1, reason)
+
+            if self.rtf < RECOVER_RTF and elapsed < self.budget / 2:
+                self.fast_windows += 1
+                if self.fast_windows >= self.recover_windows and self.level > 0:
+                    self.windows_since_step_up = 0
+                    return self.move(-1, f"real-time factor {self.rtf:.2f}")
+            else:
+                self.fast_windows = 0
+            return None
+
+    def move(self, direction, reason):
+        """Change rung (called with the lock held); the next window starts a fresh measurement"""
+        self.level += direction
+        self.rtf = None
+        self.fast_windows = 0
+        self.stats['steps_down' if direction > 0 else 'steps_up'] += 1
+        self.stats['lowest'] = max(self.stats['lowest'], self.level)
+        verb = "down" if direction > 0 else "up"
+        return f"Quality ladder {verb} to rung {self.level}/{len(self.rungs) - 1} ({reason}): {describe(self.rungs[self.level])}"
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['level'] = self.level
+            stats['rungs'] = len(self.rungs)
+        return stats
@@ -6,15 +6,27 @@ Assumes model is already downloaded via download_model.py
 
 import sys
 import json
-import struct
 import numpy as np
 from faster_whisper import WhisperModel
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import queue
 import time
 import os
 import gc
 import signal
+from collections import deque
+
+# Shared audio transports live next to vosk_realtime.py in the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_transport import open_audio_source
+from audio_resample import IngestConverter
+from audio_buffer import AudioRingBuffer
+from audio_vad import SpeechSegmenter
+from quality_ladder import QualityLadder
+from whisper_catchup import BACKLOG_SEGMENTS, batching_supported, transcribe_clips
+from whisper_tuning import load_tuned_model
+from decode_guard import DecodeGuard, MAX_FALLBACKS, token_cap
 
 def safe_print(message, file=sys.stdout):
     """Safely print messages"""
@@ -36,16 +48,36 @@ def safe_print_error(message):
     safe_print(message, file=sys.stderr)
 
 class WhisperRealtimeBest:
-    def __init__(self, model_size="large-v3", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="large-v3", device="cpu", compute_type="int8", max_in_flight=1,
+                 fallback_model=None, latency_budget_ms=None, max_fallbacks=MAX_FALLBACKS, decode_deadline_ms=None):
         """Initialize with the BEST Whisper model"""
         
         # Initialize all instance variables
         self.model = None
+        
+        # Bounded transcription pool: at most max_in_flight windows transcribe at once, and as many
+        # again may wait for a worker. Past that, audio keeps collecting in the ring and goes out as
+        # one longer window once a worker frees up, so sustained speech never piles up threads.
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_waiting_windows = self.max_in_flight
+        self.transcribe_pool = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                  thread_name_prefix="BestTranscriber")
+        self.windows_outstanding = 0  # Submitted windows not finished yet (guarded by buffer_lock)
+        self.windows_running = 0
+        self.next_window_seq = 0
+        # Results are printed in audio order; one finishing ahead of an older window waits here
+        self.emit_lock = threading.Lock()
+        self.next_emit_seq = 0
+        self.reorder_buffer = {}
+        self.pool_stats = {'windows': 0, 'peak_queue_depth': 0, 'held_for_order': 0, 'batches': 0}
+        # A backlog of finished segments is caught up in one batched call when faster-whisper can batch
+        self.batching = batching_supported()
         self.sample_rate = 16000
         self.chunk_duration = 3.0  # Longer chunks for better quality
         self.min_audio_length = 1.0  # Minimum 1 second
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer = AudioRingBuffer(self.sample_rate * 20)  # 20 seconds max, allocated once
         self.buffer_lock = threading.Lock()
+        self.buffer_ready = threading.Condition(self.buffer_lock)  # Notified on every write
         self.last_process_time = time.time()
         self.audio_queue = queue.Queue(maxsize=20)
         self.is_running = True
@@ -66,17 +98,31 @@ class WhisperRealtimeBest:
             "compression_ratio_threshold": 2.4,
             "log_prob_threshold": -1.0,
             "no_speech_threshold": 0.6,
-            "vad_filter": True,
-            "vad_parameters": dict(
-                min_silence_duration_ms=300,
-                threshold=0.5,
-                min_speech_duration_ms=200,
-                max_speech_duration_s=30
-            ),
+            "vad_filter": False,  # Windows are already speech segments, cut below
             "word_timestamps": False,  # Faster without word timestamps
             "initial_prompt": "This is a natural conversation with clear speech."
         }
         
+        # One VAD pass per incoming frame: only padded speech reaches the ring, and each window
+        # ends where a segment does - in a pause, or for long speech at its quietest point
+        self.segmenter = SpeechSegmenter(self.sample_rate, min_speech_ms=200, min_silence_ms=300,
+                                         max_segment_ms=int(self.chunk_duration * 1000))
+        self.segment_ends = deque()  # Ring positions where finished segments end (guarded by buffer_lock)
+        
+        self.model_size = model_size
+        self.tuning = None  # cpu_threads/num_workers the models run with, from whisper_tuning
+        
+        # Settings step down a ladder when transcription falls behind real time and back up once it
+        # catches up; by default a window should take no longer to transcribe than chunk_duration
+        self.fallback_model = None
+        self.fallback_model_size = fallback_model
+        self.ladder = QualityLadder(self.transcribe_settings, latency_budget_ms or self.chunk_duration * 1000,
+                                    fallback_model=bool(fallback_model))
+        
+        # Temperature fallbacks and runaway generations run under a per-window budget; by default a
+        # window gets as long as the latency budget before further fallbacks are skipped
+        self.decode_guard = DecodeGuard(max_fallbacks, decode_deadline_ms or self.ladder.budget * 1000)
+        
         safe_print_error("🚀 Starting BEST Quality Whisper Real-time Transcription")
         safe_print_error(f"Python version: {sys.version}")
         safe_print_error(f"Process ID: {os.getpid()}")
@@ -109,19 +155,23 @@ class WhisperRealtimeBest:
             
             start_time = time.time()
             
-            # Create model instance - should be fast if pre-downloaded
-            self.model = WhisperModel(
+            # Create model instance - should be fast if pre-downloaded. The thread split is
+            # calibrated for the pool's concurrent windows on first start and cached afterwards
+            self.model, self.tuning = load_tuned_model(
                 model_size,
                 device=device,
                 compute_type=compute_type,
-                cpu_threads=4,  # More threads for better performance
-                num_workers=1,
+                concurrency=self.max_in_flight,
+                default=(max(1, 4 // self.max_in_flight), self.max_in_flight),
+                settings=self.transcribe_settings,
+                log=safe_print_error,
                 download_root=None,
                 local_files_only=True  # Don't download - should already exist
             )
             
             load_time = time.time() - start_time
             safe_print_error(f"✅ BEST model loaded in {load_time:.1f} seconds")
+            safe_print_error(f"🧵 cpu_threads={self.tuning['cpu_threads']}, num_workers={self.tuning['num_workers']} ({self.tuning['source']})")
             
             # Quick model test with longer audio
             safe_print_error("🧪 Testing BEST model with sample audio...")
@@ -142,6 +192,21 @@ class WhisperRealtimeBest:
             safe_print_error(f"🎯 Language detection: {info.language}")
             safe_print_error(f"🎯 Language probability: {info.language_probability:.3f}")
             
+            if self.fallback_model_size:
+                # Preloaded, so the ladder's last rung switches models without a pause
+                self.fallback_model = WhisperModel(
+                    self.fallback_model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=self.tuning['cpu_threads'],
+                    num_workers=self.tuning['num_workers'],
+                    download_root=None,
+                    local_files_only=True
+                )
+                safe_print_error(f"✅ Fallback model {self.fallback_model_size} loaded for the quality ladder")
+            
+            safe_print_error("⏩ Batched catch-up " + ("enabled" if self.batching else "unavailable (needs faster-whisper 1.1+)"))
+            
             self.model_ready = True
             safe_print_error("🎉 BEST QUALITY WHISPER MODEL READY!")
             
@@ -180,6 +245,9 @@ class WhisperRealtimeBest:
         """Signal that BEST Whisper is ready"""
         safe_print_error("🎉 BEST WHISPER INITIALIZATION COMPLETE")
         
+        # Which thread split the model runs with, ahead of the plain ready lines
+        safe_print({"type": "ready", "model": self.model_size, **self.tuning})
+        
         # Send ready signal multiple times
         for i in range(10):
             safe_print("WHISPER_READY")
@@ -189,6 +257,73 @@ class WhisperRealtimeBest:
         safe_print_error("🚀 BEST QUALITY WHISPER IS READY FOR AUDIO!")
         self.startup_complete = True
     
+    def _wait_for_window(self):
+        """Sleep until a speech segment is due and take it as a list of clips; None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            time_since_last_audio = time.time() - self.last_audio_time
+            end = self._due_segment_end(time_since_last_audio)
+            if end is not None:
+                queue_depth = self.windows_outstanding - self.windows_running
+                if queue_depth >= self.max_waiting_windows:
+                    # Every worker busy and the queue full: keep buffering until a window finishes
+                    self.buffer_ready.wait()
+                    continue
+                self.windows_outstanding += 1
+                self.pool_stats['windows'] += 1
+                self.pool_stats['peak_queue_depth'] = max(self.pool_stats['peak_queue_depth'], queue_depth + 1)
+                # The pool thread may outlive any view, so it gets copies of the clips
+                if self.batching and len(self.segment_ends) >= BACKLOG_SEGMENTS:
+                    clips = [clip.copy() for clip in self._take_clips(end)]
+                    self.pool_stats['batches'] += len(clips) > 1
+                    return clips
+                return [self._take_segments(end).copy()]
+            
+            if self.segment_ends:
+                # Only the silence timeout can make a short segment due before more audio arrives
+                self.buffer_ready.wait(self.silence_duration - time_since_last_audio)
+            else:
+                self.buffer_ready.wait()
+        return None
+    
+    def _due_segment_end(self, time_since_last_audio):
+        """Ring position the next window ends at, or None while no segment is ready (called with buffer_lock held)"""
+        if not self.segment_ends:
+            return None
+        # Every finished segment goes out together; one shorter than min_audio_length waits to join
+        # the next, unless the speaker has stopped
+        end = self.segment_ends[-1]
+        if (end - self.audio_buffer.start >= self.min_audio_length * self.sample_rate or
+                time_since_last_audio >= self.silence_duration):
+            return end
+        return None
+    
+    def _take_segments(self, end):
+        """Zero-copy view of the buffered audio up to ring position `end`, which is then dropped"""
+        window = self.audio_buffer.peek(max(0, end - self.audio_buffer.start))
+        self.audio_buffer.consume_until(end)
+        while self.segment_ends and self.segment_ends[0] <= end:
+            self.segment_ends.popleft()
+        return window
+    
+    def _take_clips(self, end):
+        """Zero-copy views of the buffered segments up to ring position `end`, one per segment, which are then dropped"""
+        start = self.audio_buffer.start
+        window = self.audio_buffer.peek(max(0, end - start))
+        # Segments shorter than min_audio_length join the one after them, or the last one before
+        min_samples = self.min_audio_length * self.sample_rate
+        cuts = []
+        for position in self.segment_ends:
+            if position > end:
+                break
+            if position - (cuts[-1] if cuts else start) >= min_samples:
+                cuts.append(position)
+        if cuts and end - cuts[-1] < min_samples:
+            cuts.pop()
+        cuts.append(end)
+        clips = [window[max(0, a - start):max(0, b - start)] for a, b in zip([start] + cuts[:-1], cuts)]
+        self._take_segments(end)
+        return [clip for clip in clips if len(clip)]
+    
     def _process_audio_loop(self):
         """Background processing with BEST quality settings"""
         safe_print_error("🔄 BEST quality audio processing loop started")
@@ -197,37 +332,15 @@ class WhisperRealtimeBest:
         
         while self.is_running:
             try:
-                current_time = time.time()
-                
-                with self.buffer_lock:
-                    if len(self.audio_buffer) == 0:
-                        time.sleep(0.05)
-                        continue
-                    
-                    buffer_duration = len(self.audio_buffer) / self.sample_rate
-                    time_since_last_audio = current_time - self.last_audio_time
-                    
-                    # Use longer chunks for better quality
-                    should_process = (
-                        buffer_duration >= self.chunk_duration or
-                        (buffer_duration >= self.min_audio_length and 
-                         time_since_last_audio >= self.silence_duration)
-                    )
-                    
-                    if should_process:
-                        audio_to_process = self.audio_buffer.copy()
-                        self.audio_buffer = np.array([], dtype=np.float32)
-                        
-                        if len(audio_to_process) > 0:
-                            # Process in separate thread for responsiveness
-                            threading.Thread(
-                                target=self._transcribe_chunk_best,
-                                args=(audio_to_process,),
-                                daemon=True
-                            ).start()
-                            consecutive_errors = 0
+                with self.buffer_ready:
+                    audio_to_process = self._wait_for_window()
                 
-                time.sleep(0.05)
+                # Transcribed on the pool, so add_audio_chunk never waits on the model
+                if audio_to_process is not None:
+                    seq = self.next_window_seq
+                    self.next_window_seq += 1
+                    self.transcribe_pool.submit(self._run_window, seq, audio_to_process)
+                    consecutive_errors = 0
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -241,24 +354,58 @@ class WhisperRealtimeBest:
         
         safe_print_error("🔄 BEST quality processing loop ended")
     
+    def _run_window(self, seq, clips):
+        """Transcribe one window (or a backlog batch) on the pool, then hand its results to the in-order emitter"""
+        with self.buffer_lock:
+            self.windows_running += 1
+            queue_depth = self.windows_outstanding - self.windows_running
+        results = []
+        try:
+            if len(clips) > 1:
+                results = self._transcribe_batch_best(clips)
+            else:
+                results = [self._transcribe_chunk_best(clips[0])]
+            results = [result for result in results if result is not None]
+            for result in results:
+                result["seq"] = seq
+                result["queue_depth"] = queue_depth
+        finally:
+            with self.buffer_ready:
+                self.windows_running -= 1
+                self.windows_outstanding -= 1
+                self.buffer_ready.notify()  # A window held back for a free worker may go now
+            self._emit_in_order(seq, results)
+    
+    def _emit_in_order(self, seq, results):
+        """Print results in window order; an empty list marks a window that produced nothing"""
+        with self.emit_lock:
+            self.reorder_buffer[seq] = results
+            if seq != self.next_emit_seq:
+                self.pool_stats['held_for_order'] += 1
+            while self.next_emit_seq in self.reorder_buffer:
+                ready = self.reorder_buffer.pop(self.next_emit_seq)
+                self.next_emit_seq += 1
+                for result in ready:
+                    safe_print(result)
+    
     def _transcribe_chunk_best(self, audio_data):
-        """Transcribe with BEST quality settings"""
+        """Transcribe with BEST quality settings; returns the result to print, or None"""
         try:
             if audio_data is None or len(audio_data) == 0:
-                return
+                return None
             
             if not self.model_ready:
-                return
+                return None
             
             # Enhanced audio validation
             max_amplitude = np.max(np.abs(audio_data))
             if max_amplitude < self.silence_threshold:
-                return
+                return None
             
             # Ensure good chunk size for best quality
             min_samples = int(self.sample_rate * 0.5)  # 500ms minimum
             if len(audio_data) < min_samples:
-                return
+                return None
             
             duration = len(audio_data) / self.sample_rate
             safe_print_error(f"🎯 Transcribing {duration:.1f}s with BEST quality...")
@@ -266,10 +413,12 @@ class WhisperRealtimeBest:
             start_time = time.time()
             
             # Use BEST quality settings
-            segments, info = self.model.transcribe(
-                audio_data,
-                **self.transcribe_settings
-            )
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            model_used = self.fallback_model_size if model is self.fallback_model else self.model_size  # ✅ Local: windows transcribe concurrently
+            segments, info, decode = self.decode_guard.decode(model, audio_data, settings, duration)
+            if decode['aborts']:
+                safe_print_error(f"✂️ Decode budget hit after {decode['fallbacks']} fallbacks: {', '.join(decode['reasons'])}")
             
             # Collect all text with confidence scoring
             full_text = ""
@@ -292,6 +441,7 @@ class WhisperRealtimeBest:
             
             full_text = full_text.strip()
             transcribe_time = time.time() - start_time
+            self._record_quality(level, duration, transcribe_time)
             
             if full_text:
                 # Calculate average confidence
@@ -307,24 +457,90 @@ class WhisperRealtimeBest:
                     "start": 0.0,
                     "end": float(duration),
                     "transcribe_time": round(transcribe_time, 2),
-                    "model": "large-v3",
+                    "model": model_used,
                     "quality": "best",
+                    "quality_level": level,
+                    "fallbacks": decode['fallbacks'],
+                    "aborts": decode['aborts'],
                     "language": info.language if hasattr(info, 'language') else "en",
                     "language_probability": round(info.language_probability, 3) if hasattr(info, 'language_probability') else 0.9
                 }
                 
-                safe_print(result)
                 safe_print_error(f"✅ BEST: '{full_text}' (conf:{avg_confidence:.2f}, {transcribe_time:.1f}s)")
-            else:
-                safe_print_error(f"🔇 No speech detected in {duration:.1f}s audio")
+                return result
+            safe_print_error(f"🔇 No speech detected in {duration:.1f}s audio")
+            return None
         
         except Exception as e:
             safe_print_error(f"❌ BEST transcription error: {e}")
-            error_result = {
+            return {
                 "type": "error",
                 "error": f"BEST transcription error: {str(e)}"
             }
-            safe_print(error_result)
+    
+    def _transcribe_batch_best(self, clips):
+        """Catch up on a backlog of segments in one batched call; returns their results in order"""
+        try:
+            if not self.model_ready:
+                return []
+            
+            durations = [len(clip) / self.sample_rate for clip in clips]
+            safe_print_error(f"⏩ Catching up: {len(clips)} segments, {sum(durations):.1f}s in one batch...")
+            
+            start_time = time.time()
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            # The batched pipeline decodes at the first temperature only; the token cap still applies
+            cap = token_cap(max(durations), self.decode_guard.tokens_per_second)
+            texts, clip_segments, info = transcribe_clips(model, clips, dict(settings, max_new_tokens=cap), self.sample_rate)
+            transcribe_time = time.time() - start_time
+            self._record_quality(level, sum(durations), transcribe_time)
+            
+            results = []
+            for text, segments, duration in zip(texts, clip_segments, durations):
+                decode = self.decode_guard.batch_report(segments, cap)
+                if not text:
+                    continue
+                # Same confidence normalisation as a single window
+                logprobs = [segment.avg_logprob for segment in segments if hasattr(segment, 'avg_logprob')]
+                avg_confidence = max(0.0, min(1.0, (sum(logprobs) / len(logprobs) + 5) / 10)) if logprobs else 0.85
+                results.append({
+                    "type": "final",
+                    "text": text,
+                    "confidence": round(avg_confidence, 3),
+                    "start": 0.0,
+                    "end": float(duration),
+                    "transcribe_time": round(transcribe_time, 2),
+                    "model": model_used,
+                    "quality": "best",
+                    "quality_level": level,
+                    "batched": len(clips),
+                    "fallbacks": decode['fallbacks'],
+                    "aborts": decode['aborts'],
+                    "language": info.language if hasattr(info, 'language') else "en",
+                    "language_probability": round(info.language_probability, 3) if hasattr(info, 'language_probability') else 0.9
+                })
+            
+            safe_print_error(f"✅ BEST batch: {len(results)}/{len(clips)} segments with speech ({transcribe_time:.1f}s)")
+            return results
+        
+        except ValueError as e:
+            # Clips the batched pipeline cannot take go through one at a time as before
+            safe_print_error(f"⚠️ Batch not possible ({e}), transcribing segments one by one")
+            return [self._transcribe_chunk_best(clip) for clip in clips]
+        except Exception as e:
+            safe_print_error(f"❌ BEST batch transcription error: {e}")
+            return [{
+                "type": "error",
+                "error": f"BEST batch transcription error: {str(e)}"
+            }]
+    
+    def _record_quality(self, level, audio_seconds, elapsed):
+        """Feed one transcription's timing to the quality ladder"""
+        change = self.ladder.record(level, audio_seconds, elapsed, self.audio_buffer.dropped)
+        if change:
+            safe_print_error(f"🎚️ {change}")
     
     def add_audio_chunk(self, audio_data):
         """Add audio chunk for BEST quality processing"""
@@ -353,18 +569,15 @@ class WhisperRealtimeBest:
             if not np.isfinite(audio_array).all():
                 return
             
-            max_amplitude = np.max(np.abs(audio_array))
+            speech, segment_ends = self.segmenter.process(audio_array)
             
             with self.buffer_lock:
-                self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+                self.audio_buffer.write(speech)  # Oldest audio drops out past the capacity
+                self.segment_ends.extend(segment_ends)
+                self.buffer_ready.notify()
                 
-                if max_amplitude > self.silence_threshold:
+                if self.segmenter.in_speech:
                     self.last_audio_time = time.time()
-                
-                # Prevent buffer overflow - longer buffer for better quality
-                max_buffer_samples = self.sample_rate * 20  # 20 seconds max
-                if len(self.audio_buffer) > max_buffer_samples:
-                    self.audio_buffer = self.audio_buffer[-max_buffer_samples:]
         
         except Exception as e:
             safe_print_error(f"❌ Error adding audio chunk: {e}")
@@ -373,14 +586,29 @@ class WhisperRealtimeBest:
         """Clean up resources"""
         safe_print_error("🧹 Cleaning up BEST Whisper resources...")
         self.is_running = False
+        with self.buffer_ready:
+            self.buffer_ready.notify_all()  # Wake the processing loop so it sees the stop
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=3.0)
         
+        # Windows already submitted still finish and print, in order
+        self.transcribe_pool.shutdown(wait=True)
+        stats = self.pool_stats
+        safe_print_error(f"📊 BEST pool: {stats['windows']} windows on {self.max_in_flight} workers, "
+                         f"peak queue depth {stats['peak_queue_depth']}, {stats['held_for_order']} held for order, "
+                         f"{stats['batches']} caught up in batches")
+        
         with self.buffer_lock:
-            self.audio_buffer = np.array([], dtype=np.float32)
+            self.audio_buffer.clear()
+            self.segment_ends.clear()
+        safe_print_error(f"📊 VAD segments: {self.segmenter.summary()}")
+        
+        safe_print_error(f"📊 Quality ladder: {self.ladder.summary()}")
+        safe_print_error(f"📊 Decode budget: {self.decode_guard.summary()}")
         
         self.model = None
+        self.fallback_model = None
         gc.collect()
         safe_print_error("✅ BEST Whisper cleanup complete")
 
@@ -389,33 +617,48 @@ def main():
     safe_print_error("🚀 BEST Quality Whisper Real-time Transcription")
     
     whisper = None
+    audio_source = None
     try:
+        # --max-in-flight N transcribes up to N windows at once (default 1)
+        options = sys.argv[1:]
+        max_in_flight = int(options[options.index('--max-in-flight') + 1]) if '--max-in-flight' in options else 1
+        # --latency-budget-ms N caps the time one window may take before the quality ladder steps down;
+        # --fallback-model NAME preloads a smaller model as the ladder's last rung
+        latency_budget_ms = float(options[options.index('--latency-budget-ms') + 1]) if '--latency-budget-ms' in options else None
+        fallback_model = options[options.index('--fallback-model') + 1] if '--fallback-model' in options else None
+        # --max-fallbacks N limits temperature retries per window; --decode-deadline-ms N stops retrying
+        # once another decode would run past N ms (default: the latency budget)
+        max_fallbacks = int(options[options.index('--max-fallbacks') + 1]) if '--max-fallbacks' in options else MAX_FALLBACKS
+        decode_deadline_ms = float(options[options.index('--decode-deadline-ms') + 1]) if '--decode-deadline-ms' in options else None
+        
         # Use the BEST model
-        whisper = WhisperRealtimeBest(model_size="large-v3")
+        whisper = WhisperRealtimeBest(model_size="large-v3", max_in_flight=max_in_flight,
+                                      fallback_model=fallback_model, latency_budget_ms=latency_budget_ms,
+                                      max_fallbacks=max_fallbacks, decode_deadline_ms=decode_deadline_ms)
         
         safe_print_error("🎧 Ready for audio input (BEST QUALITY)")
         
+        # Length-prefixed stdin frames, or the shared audio ring when started with --shm-ring
+        audio_source = open_audio_source(sys.argv[1:], sys.stdin.buffer,
+                                         max_length=2 * 1024 * 1024)  # 2MB max
+        safe_print_error(f"🎧 Audio source: {audio_source.name}")
+        # Frames at other rates or channel counts are brought to 16kHz mono here, statefully per stream
+        converter = IngestConverter(audio_source.sample_rate, audio_source.channels, audio_source.sample_format)
+        
         while True:
             try:
-                # Read length
-                length_data = sys.stdin.buffer.read(4)
-                if len(length_data) != 4:
+                frame = audio_source.next_frame()
+                if frame is None:
                     safe_print_error("📡 End of input stream")
                     break
                 
-                length = struct.unpack('<I', length_data)[0]
-                
-                if length == 0 or length > 2 * 1024 * 1024:  # 2MB max
-                    continue
-                
-                # Read audio data
-                audio_data = sys.stdin.buffer.read(length)
-                if len(audio_data) != length:
-                    continue
-                
-                # Process with BEST quality
-                if whisper and whisper.startup_complete:
-                    whisper.add_audio_chunk(audio_data)
+                buffer, length, info = frame
+                try:
+                    # Process with BEST quality
+                    if whisper and whisper.startup_complete:
+                        whisper.add_audio_chunk(converter.to_float32(memoryview(buffer)[:length], info))
+                finally:
+                    audio_source.release(buffer)
             
             except Exception as e:
                 safe_print_error(f"❌ Error reading audio: {e}")
@@ -429,6 +672,8 @@ def main():
         safe_print_error(f"❌ BEST Whisper fatal error: {e}")
     
     finally:
+        if audio_source:
+            audio_source.close()
         if whisper:
             whisper.cleanup()
         safe_print_error("🏁 BEST Quality Whisper ended")
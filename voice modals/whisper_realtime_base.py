@@ -6,7 +6,6 @@ Fast and reliable for most use cases
 
 import sys
 import json
-import struct
 import numpy as np
 from faster_whisper import WhisperModel
 import threading
@@ -15,6 +14,17 @@ import time
 import os
 import gc
 import signal
+from collections import deque
+
+# Shared audio transports live next to vosk_realtime.py in the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_transport import open_audio_source
+from audio_resample import IngestConverter
+from audio_buffer import AudioRingBuffer
+from audio_vad import SpeechSegmenter
+from quality_ladder import QualityLadder
+from whisper_catchup import BACKLOG_SEGMENTS, batching_supported, transcribe_clips
+from whisper_tuning import load_tuned_model
 
 def safe_print(message, file=sys.stdout):
     """Safely print messages"""
@@ -36,7 +46,8 @@ def safe_print_error(message):
     safe_print(message, file=sys.stderr)
 
 class WhisperRealtimeBase:
-    def __init__(self, model_size="base", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="base", device="cpu", compute_type="int8",
+                 fallback_model=None, latency_budget_ms=None):
         """Initialize with the base Whisper model"""
         
         # Initialize all instance variables
@@ -44,8 +55,9 @@ class WhisperRealtimeBase:
         self.sample_rate = 16000
         self.chunk_duration = 2.0  # Shorter chunks for faster response
         self.min_audio_length = 0.8  # Minimum 800ms
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer = AudioRingBuffer(self.sample_rate * 10)  # 10 seconds max, allocated once
         self.buffer_lock = threading.Lock()
+        self.buffer_ready = threading.Condition(self.buffer_lock)  # Notified on every write
         self.last_process_time = time.time()
         self.audio_queue = queue.Queue(maxsize=15)
         self.is_running = True
@@ -66,17 +78,31 @@ class WhisperRealtimeBase:
             "compression_ratio_threshold": 2.4,
             "log_prob_threshold": -1.0,
             "no_speech_threshold": 0.6,
-            "vad_filter": True,
-            "vad_parameters": dict(
-                min_silence_duration_ms=250,
-                threshold=0.5,
-                min_speech_duration_ms=150,
-                max_speech_duration_s=15
-            ),
+            "vad_filter": False,  # Windows are already speech segments, cut below
             "word_timestamps": False,
             "initial_prompt": "This is a conversation."
         }
         
+        # One VAD pass per incoming frame: only padded speech reaches the ring, and each window
+        # ends where a segment does - in a pause, or for long speech at its quietest point
+        self.segmenter = SpeechSegmenter(self.sample_rate, min_speech_ms=150, min_silence_ms=250,
+                                         max_segment_ms=int(self.chunk_duration * 1000))
+        self.segment_ends = deque()  # Ring positions where finished segments end (guarded by buffer_lock)
+        # A backlog of finished segments is caught up in one batched call when faster-whisper can batch
+        self.batching = batching_supported()
+        self.batches = 0
+        
+        self.model_size = model_size
+        self.tuning = None  # cpu_threads/num_workers the models run with, from whisper_tuning
+        
+        # Settings step down a ladder when transcription falls behind real time and back up once it
+        # catches up; by default a window should take no longer to transcribe than chunk_duration
+        self.fallback_model = None
+        self.fallback_model_size = fallback_model
+        self.model_used = model_size  # ✅ Name reported in results; the fallback's when the ladder picks it
+        self.ladder = QualityLadder(self.transcribe_settings, latency_budget_ms or self.chunk_duration * 1000,
+                                    fallback_model=bool(fallback_model))
+        
         safe_print_error("🚀 Starting Base Model Whisper Real-time Transcription")
         safe_print_error(f"Python version: {sys.version}")
         safe_print_error(f"Process ID: {os.getpid()}")
@@ -110,18 +136,20 @@ class WhisperRealtimeBase:
             start_time = time.time()
             
             # Create model instance - should be very fast
-            self.model = WhisperModel(
+            self.model, self.tuning = load_tuned_model(
                 model_size,
                 device=device,
                 compute_type=compute_type,
-                cpu_threads=2,  # Fewer threads for base model
-                num_workers=1,
+                default=(2, 1),  # Used on GPU or with MLA_WHISPER_TUNING=off; otherwise calibrated once and cached
+                settings=self.transcribe_settings,
+                log=safe_print_error,
                 download_root=None,
                 local_files_only=True
             )
             
             load_time = time.time() - start_time
             safe_print_error(f"✅ Base model loaded in {load_time:.1f} seconds")
+            safe_print_error(f"🧵 cpu_threads={self.tuning['cpu_threads']}, num_workers={self.tuning['num_workers']} ({self.tuning['source']})")
             
             # Quick model test
             safe_print_error("🧪 Testing base model...")
@@ -142,6 +170,21 @@ class WhisperRealtimeBase:
             safe_print_error(f"✅ Base model test completed in {test_time:.1f}s")
             safe_print_error(f"🎯 Language detection: {info.language}")
             
+            if self.fallback_model_size:
+                # Preloaded, so the ladder's last rung switches models without a pause
+                self.fallback_model = WhisperModel(
+                    self.fallback_model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=self.tuning['cpu_threads'],
+                    num_workers=self.tuning['num_workers'],
+                    download_root=None,
+                    local_files_only=True
+                )
+                safe_print_error(f"✅ Fallback model {self.fallback_model_size} loaded for the quality ladder")
+            
+            safe_print_error("⏩ Batched catch-up " + ("enabled" if self.batching else "unavailable (needs faster-whisper 1.1+)"))
+            
             self.model_ready = True
             safe_print_error("🎉 BASE MODEL WHISPER READY!")
             
@@ -178,6 +221,9 @@ class WhisperRealtimeBase:
         """Signal that base Whisper is ready"""
         safe_print_error("🎉 BASE WHISPER INITIALIZATION COMPLETE")
         
+        # Which thread split the model runs with, ahead of the plain ready lines
+        safe_print({"type": "ready", "model": self.model_size, **self.tuning})
+        
         # Send ready signal
         for i in range(5):  # Fewer signals needed
             safe_print("WHISPER_READY")
@@ -186,6 +232,63 @@ class WhisperRealtimeBase:
         safe_print_error("🚀 BASE MODEL WHISPER IS READY FOR AUDIO!")
         self.startup_complete = True
     
+    def _wait_for_window(self):
+        """Sleep until a speech segment is due and take it as a list of clips; None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            time_since_last_audio = time.time() - self.last_audio_time
+            end = self._due_segment_end(time_since_last_audio)
+            if end is not None:
+                if self.batching and len(self.segment_ends) >= BACKLOG_SEGMENTS:
+                    # A batch takes longer than the ring's headroom may last, so it gets copies
+                    return [clip.copy() for clip in self._take_clips(end)]
+                return [self._take_segments(end)]  # Zero-copy view of the window
+            
+            if self.segment_ends:
+                # Only the silence timeout can make a short segment due before more audio arrives
+                self.buffer_ready.wait(self.silence_duration - time_since_last_audio)
+            else:
+                self.buffer_ready.wait()
+        return None
+    
+    def _due_segment_end(self, time_since_last_audio):
+        """Ring position the next window ends at, or None while no segment is ready (called with buffer_lock held)"""
+        if not self.segment_ends:
+            return None
+        # Every finished segment goes out together; one shorter than min_audio_length waits to join
+        # the next, unless the speaker has stopped
+        end = self.segment_ends[-1]
+        if (end - self.audio_buffer.start >= self.min_audio_length * self.sample_rate or
+                time_since_last_audio >= self.silence_duration):
+            return end
+        return None
+    
+    def _take_segments(self, end):
+        """Zero-copy view of the buffered audio up to ring position `end`, which is then dropped"""
+        window = self.audio_buffer.peek(max(0, end - self.audio_buffer.start))
+        self.audio_buffer.consume_until(end)
+        while self.segment_ends and self.segment_ends[0] <= end:
+            self.segment_ends.popleft()
+        return window
+    
+    def _take_clips(self, end):
+        """Zero-copy views of the buffered segments up to ring position `end`, one per segment, which are then dropped"""
+        start = self.audio_buffer.start
+        window = self.audio_buffer.peek(max(0, end - start))
+        # Segments shorter than min_audio_length join the one after them, or the last one before
+        min_samples = self.min_audio_length * self.sample_rate
+        cuts = []
+        for position in self.segment_ends:
+            if position > end:
+                break
+            if position - (cuts[-1] if cuts else start) >= min_samples:
+                cuts.append(position)
+        if cuts and end - cuts[-1] < min_samples:
+            cuts.pop()
+        cuts.append(end)
+        clips = [window[max(0, a - start):max(0, b - start)] for a, b in zip([start] + cuts[:-1], cuts)]
+        self._take_segments(end)
+        return [clip for clip in clips if len(clip)]
+    
     def _process_audio_loop(self):
         """Background processing optimized for base model"""
         safe_print_error("🔄 Base model audio processing loop started")
@@ -194,33 +297,18 @@ class WhisperRealtimeBase:
         
         while self.is_running:
             try:
-                current_time = time.time()
-                
-                with self.buffer_lock:
-                    if len(self.audio_buffer) == 0:
-                        time.sleep(0.05)
-                        continue
-                    
-                    buffer_duration = len(self.audio_buffer) / self.sample_rate
-                    time_since_last_audio = current_time - self.last_audio_time
-                    
-                    # Faster processing for base model
-                    should_process = (
-                        buffer_duration >= self.chunk_duration or
-                        (buffer_duration >= self.min_audio_length and 
-                         time_since_last_audio >= self.silence_duration)
-                    )
-                    
-                    if should_process:
-                        audio_to_process = self.audio_buffer.copy()
-                        self.audio_buffer = np.array([], dtype=np.float32)
-                        
-                        if len(audio_to_process) > 0:
-                            # Process immediately for speed
-                            self._transcribe_chunk_base(audio_to_process)
-                            consecutive_errors = 0
+                with self.buffer_ready:
+                    clips = self._wait_for_window()
                 
-                time.sleep(0.05)
+                # Transcribed outside the lock, so add_audio_chunk never waits on the model
+                if clips and len(clips) > 1:
+                    # Behind by several segments: catch up in one batch
+                    self._transcribe_batch_base(clips)
+                    consecutive_errors = 0
+                elif clips and len(clips[0]) > 0:
+                    # Process immediately for speed
+                    self._transcribe_chunk_base(clips[0])
+                    consecutive_errors = 0
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -258,9 +346,12 @@ class WhisperRealtimeBase:
             start_time = time.time()
             
             # Use fast settings for base model
-            segments, info = self.model.transcribe(
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            segments, info = model.transcribe(
                 audio_data,
-                **self.transcribe_settings
+                **settings
             )
             
             # Collect text
@@ -279,6 +370,7 @@ class WhisperRealtimeBase:
             
             full_text = full_text.strip()
             transcribe_time = time.time() - start_time
+            self._record_quality(level, duration, transcribe_time)
             
             if full_text:
                 result = {
@@ -288,8 +380,9 @@ class WhisperRealtimeBase:
                     "start": 0.0,
                     "end": float(duration),
                     "transcribe_time": round(transcribe_time, 2),
-                    "model": "base",
+                    "model": self.model_used,
                     "quality": "fast_reliable",
+                    "quality_level": level,
                     "language": info.language if hasattr(info, 'language') else "en"
                 }
                 
@@ -304,6 +397,58 @@ class WhisperRealtimeBase:
             }
             safe_print(error_result)
     
+    def _transcribe_batch_base(self, clips):
+        """Catch up on a backlog of segments in one batched call, printing a result per segment"""
+        try:
+            if not self.model_ready:
+                return
+            
+            self.batches += 1
+            durations = [len(clip) / self.sample_rate for clip in clips]
+            start_time = time.time()
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            texts, _, info = transcribe_clips(model, clips, settings, self.sample_rate)
+            transcribe_time = time.time() - start_time
+            self._record_quality(level, sum(durations), transcribe_time)
+            
+            for text, duration in zip(texts, durations):
+                if text:
+                    safe_print({
+                        "type": "final",
+                        "text": text,
+                        "confidence": 0.8,  # Estimated for base model
+                        "start": 0.0,
+                        "end": float(duration),
+                        "transcribe_time": round(transcribe_time, 2),
+                        "model": self.model_used,
+                        "quality": "fast_reliable",
+                        "quality_level": level,
+                        "batched": len(clips),
+                        "language": info.language if hasattr(info, 'language') else "en"
+                    })
+            safe_print_error(f"⏩ BASE: caught up {len(clips)} segments, {sum(durations):.1f}s in one batch ({transcribe_time:.1f}s)")
+        
+        except ValueError as e:
+            # Clips the batched pipeline cannot take go through one at a time as before
+            safe_print_error(f"⚠️ Batch not possible ({e}), transcribing segments one by one")
+            for clip in clips:
+                self._transcribe_chunk_base(clip)
+        except Exception as e:
+            safe_print_error(f"❌ Base batch transcription error: {e}")
+            error_result = {
+                "type": "error",
+                "error": f"Base batch transcription error: {str(e)}"
+            }
+            safe_print(error_result)
+    
+    def _record_quality(self, level, audio_seconds, elapsed):
+        """Feed one transcription's timing to the quality ladder"""
+        change = self.ladder.record(level, audio_seconds, elapsed, self.audio_buffer.dropped)
+        if change:
+            safe_print_error(f"🎚️ {change}")
+    
     def add_audio_chunk(self, audio_data):
         """Add audio chunk for base model processing"""
         try:
@@ -330,18 +475,15 @@ class WhisperRealtimeBase:
             if not np.isfinite(audio_array).all():
                 return
             
-            max_amplitude = np.max(np.abs(audio_array))
+            speech, segment_ends = self.segmenter.process(audio_array)
             
             with self.buffer_lock:
-                self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+                self.audio_buffer.write(speech)  # Oldest audio drops out past the capacity
+                self.segment_ends.extend(segment_ends)
+                self.buffer_ready.notify()
                 
-                if max_amplitude > self.silence_threshold:
+                if self.segmenter.in_speech:
                     self.last_audio_time = time.time()
-                
-                # Smaller buffer for base model
-                max_buffer_samples = self.sample_rate * 10  # 10 seconds max
-                if len(self.audio_buffer) > max_buffer_samples:
-                    self.audio_buffer = self.audio_buffer[-max_buffer_samples:]
         
         except Exception as e:
             safe_print_error(f"❌ Error adding audio chunk: {e}")
@@ -350,14 +492,21 @@ class WhisperRealtimeBase:
         """Clean up resources"""
         safe_print_error("🧹 Cleaning up base Whisper resources...")
         self.is_running = False
+        with self.buffer_ready:
+            self.buffer_ready.notify_all()  # Wake the processing loop so it sees the stop
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2.0)
         
         with self.buffer_lock:
-            self.audio_buffer = np.array([], dtype=np.float32)
+            self.audio_buffer.clear()
+            self.segment_ends.clear()
+        safe_print_error(f"📊 VAD segments: {self.segmenter.summary()}, {self.batches} backlogs caught up in batches")
+        
+        safe_print_error(f"📊 Quality ladder: {self.ladder.summary()}")
         
         self.model = None
+        self.fallback_model = None
         gc.collect()
         safe_print_error("✅ Base Whisper cleanup complete")
 
@@ -366,33 +515,40 @@ def main():
     safe_print_error("🚀 Base Model Whisper Real-time Transcription")
     
     whisper = None
+    audio_source = None
     try:
+        # --latency-budget-ms N caps the time one window may take before the quality ladder steps down;
+        # --fallback-model NAME preloads a smaller model as the ladder's last rung
+        options = sys.argv[1:]
+        latency_budget_ms = float(options[options.index('--latency-budget-ms') + 1]) if '--latency-budget-ms' in options else None
+        fallback_model = options[options.index('--fallback-model') + 1] if '--fallback-model' in options else None
+        
         # Use the base model
-        whisper = WhisperRealtimeBase(model_size="base")
+        whisper = WhisperRealtimeBase(model_size="base", fallback_model=fallback_model, latency_budget_ms=latency_budget_ms)
         
         safe_print_error("🎧 Ready for audio input (BASE MODEL)")
         
+        # Length-prefixed stdin frames, or the shared audio ring when started with --shm-ring
+        audio_source = open_audio_source(sys.argv[1:], sys.stdin.buffer,
+                                         max_length=1024 * 1024)  # 1MB max
+        safe_print_error(f"🎧 Audio source: {audio_source.name}")
+        # Frames at other rates or channel counts are brought to 16kHz mono here, statefully per stream
+        converter = IngestConverter(audio_source.sample_rate, audio_source.channels, audio_source.sample_format)
+        
         while True:
             try:
-                # Read length
-                length_data = sys.stdin.buffer.read(4)
-                if len(length_data) != 4:
+                frame = audio_source.next_frame()
+                if frame is None:
                     safe_print_error("📡 End of input stream")
                     break
                 
-                length = struct.unpack('<I', length_data)[0]
-                
-                if length == 0 or length > 1024 * 1024:  # 1MB max
-                    continue
-                
-                # Read audio data
-                audio_data = sys.stdin.buffer.read(length)
-                if len(audio_data) != length:
-                    continue
-                
-                # Process with base model
-                if whisper and whisper.startup_complete:
-                    whisper.add_audio_chunk(audio_data)
+                buffer, length, info = frame
+                try:
+                    # Process with base model
+                    if whisper and whisper.startup_complete:
+                        whisper.add_audio_chunk(converter.to_float32(memoryview(buffer)[:length], info))
+                finally:
+                    audio_source.release(buffer)
             
             except Exception as e:
                 safe_print_error(f"❌ Error reading audio: {e}")
@@ -406,6 +562,8 @@ def main():
         safe_print_error(f"❌ Base Whisper fatal error: {e}")
     
     finally:
+        if audio_source:
+            audio_source.close()
         if whisper:
             whisper.cleanup()
         safe_print_error("🏁 Base Model Whisper ended")
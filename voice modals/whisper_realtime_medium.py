@@ -6,7 +6,6 @@ Returns complete sentences for word-by-word display animation
 
 import sys
 import json
-import struct
 import numpy as np
 from faster_whisper import WhisperModel
 import threading
@@ -17,6 +16,17 @@ import gc
 import signal
 import re
 
+# Shared audio transports live next to vosk_realtime.py in the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_transport import open_audio_source
+from audio_resample import IngestConverter
+from audio_buffer import AudioRingBuffer
+from whisper_streaming import LocalAgreement, MAX_WINDOW_SECONDS
+from quality_ladder import QualityLadder
+from whisper_tuning import load_tuned_model
+
+SENTENCE_END = re.compile(r'[.!?]$')
+
 def safe_print(message, file=sys.stdout):
     """Safely print messages"""
     try:
@@ -37,7 +47,8 @@ def safe_print_error(message):
     safe_print(message, file=sys.stderr)
 
 class WhisperRealtimeMedium:
-    def __init__(self, model_size="medium", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="medium", device="cpu", compute_type="int8", local_agreement=False,
+                 fallback_model=None, latency_budget_ms=None):
         """Initialize with medium model for better accuracy"""
         
         # Initialize all instance variables
@@ -46,8 +57,9 @@ class WhisperRealtimeMedium:
         self.chunk_duration = 0.3    # Process every 300ms!
         self.min_audio_length = 0.2  # Trigger after 200ms
         self.silence_duration = 0.3  # Detect sentences in 300ms
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer = AudioRingBuffer(self.sample_rate * 15)  # 15 seconds max, allocated once
         self.buffer_lock = threading.Lock()
+        self.buffer_ready = threading.Condition(self.buffer_lock)  # Notified on every write
         self.last_process_time = time.time()
         self.audio_queue = queue.Queue(maxsize=15)
         self.is_running = True
@@ -81,8 +93,30 @@ class WhisperRealtimeMedium:
             "initial_prompt": None
         }
         
+        # LocalAgreement streaming: instead of transcribing each 300ms chunk on its own, re-decode
+        # the uncommitted window every chunk_duration and publish the words two hypotheses agree on
+        self.agreement = LocalAgreement() if local_agreement else None
+        self.decoded_upto = 0  # Stream position the last streaming decode reached
+        self.sentence_words = []  # Committed words of the sentence in progress
+        if self.agreement:
+            self.transcribe_settings["word_timestamps"] = True  # The window is trimmed at word ends
+        
+        self.model_size = model_size
+        self.tuning = None  # cpu_threads/num_workers the models run with, from whisper_tuning
+        
+        # Settings step down a ladder when transcription falls behind real time and back up once it
+        # catches up; by default a window should take no longer to transcribe than chunk_duration
+        self.fallback_model = None
+        self.fallback_model_size = fallback_model
+        self.model_used = model_size  # ✅ Name reported in results; the fallback's when the ladder picks it
+        self.ladder = QualityLadder(self.transcribe_settings, latency_budget_ms or self.chunk_duration * 1000,
+                                    fallback_model=bool(fallback_model),
+                                    keep=("word_timestamps",) if self.agreement else ())
+        
         safe_print_error("🚀 Starting Medium Model Whisper Transcription")
         safe_print_error(f"Target model: {model_size} (MEDIUM QUALITY MODE)")
+        if self.agreement:
+            safe_print_error("🔁 LocalAgreement streaming enabled")
         
         # Setup signal handlers
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -111,18 +145,20 @@ class WhisperRealtimeMedium:
             start_time = time.time()
             
             # Create model instance
-            self.model = WhisperModel(
+            self.model, self.tuning = load_tuned_model(
                 model_size,
                 device=device,
                 compute_type=compute_type,
-                cpu_threads=4,  # More threads for medium model
-                num_workers=1,
+                default=(4, 1),  # Used on GPU or with MLA_WHISPER_TUNING=off; otherwise calibrated once and cached
+                settings=self.transcribe_settings,
+                log=safe_print_error,
                 download_root=None,
                 local_files_only=True
             )
             
             load_time = time.time() - start_time
             safe_print_error(f"✅ Medium model loaded in {load_time:.1f} seconds")
+            safe_print_error(f"🧵 cpu_threads={self.tuning['cpu_threads']}, num_workers={self.tuning['num_workers']} ({self.tuning['source']})")
             
             # Quick test
             safe_print_error("🧪 Testing medium model transcription...")
@@ -137,6 +173,19 @@ class WhisperRealtimeMedium:
             list(segments)  # Consume results
             safe_print_error("✅ Medium model test completed")
             
+            if self.fallback_model_size:
+                # Preloaded, so the ladder's last rung switches models without a pause
+                self.fallback_model = WhisperModel(
+                    self.fallback_model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=self.tuning['cpu_threads'],
+                    num_workers=self.tuning['num_workers'],
+                    download_root=None,
+                    local_files_only=True
+                )
+                safe_print_error(f"✅ Fallback model {self.fallback_model_size} loaded for the quality ladder")
+            
             self.model_ready = True
             safe_print_error("🎉 MEDIUM MODEL WHISPER READY!")
             
@@ -163,6 +212,9 @@ class WhisperRealtimeMedium:
         """Signal that Whisper is ready"""
         safe_print_error("🎉 MEDIUM MODEL INITIALIZATION COMPLETE")
         
+        # Which thread split the model runs with, ahead of the plain ready lines
+        safe_print({"type": "ready", "model": self.model_size, **self.tuning})
+        
         # Send ready signal
         for i in range(3):
             safe_print("WHISPER_READY")
@@ -171,6 +223,50 @@ class WhisperRealtimeMedium:
         safe_print_error("🚀 READY FOR MEDIUM QUALITY TRANSCRIPTION!")
         self.startup_complete = True
     
+    def _wait_for_window(self):
+        """Sleep until the buffer is due and drain it; None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            buffer_duration = len(self.audio_buffer) / self.sample_rate
+            time_since_last_audio = time.time() - self.last_audio_time
+            
+            # Process when we have enough audio or after silence
+            should_process = (
+                buffer_duration >= self.chunk_duration or
+                (buffer_duration >= self.min_audio_length and 
+                 time_since_last_audio >= self.silence_duration)
+            )
+            if should_process:
+                return self.audio_buffer.drain()  # Zero-copy view of the window
+            
+            if buffer_duration >= self.min_audio_length:
+                # Only the silence timeout can make it due before more audio arrives
+                self.buffer_ready.wait(self.silence_duration - time_since_last_audio)
+            else:
+                self.buffer_ready.wait()
+        return None
+    
+    def _wait_for_stream_window(self):
+        """Sleep until the streaming window is due; (start, view, paused), or None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            buffer_duration = len(self.audio_buffer) / self.sample_rate
+            new_audio = (self.audio_buffer.written - self.decoded_upto) / self.sample_rate
+            time_since_last_audio = time.time() - self.last_audio_time
+            paused = time_since_last_audio >= self.silence_duration
+            pending = self.agreement.pending or bool(self.sentence_words)
+            
+            # Re-decode once per chunk_duration of new audio; a pause settles whatever is still open
+            if (buffer_duration >= self.min_audio_length and new_audio >= self.chunk_duration) or (paused and pending):
+                self.decoded_upto = self.audio_buffer.written
+                # Zero-copy view from the last committed word on; trimmed once the decode commits
+                return self.audio_buffer.start, self.audio_buffer.peek(), paused
+            
+            if pending:
+                # Only the silence timeout can make it due before more audio arrives
+                self.buffer_ready.wait(self.silence_duration - time_since_last_audio)
+            else:
+                self.buffer_ready.wait()
+        return None
+    
     def _process_audio_loop(self):
         """Background processing optimized for medium model"""
         safe_print_error("🔄 Medium model processing loop started")
@@ -179,32 +275,21 @@ class WhisperRealtimeMedium:
         
         while self.is_running:
             try:
-                current_time = time.time()
+                if self.agreement:
+                    with self.buffer_ready:
+                        window = self._wait_for_stream_window()
+                    if window is not None:
+                        self._transcribe_stream_window(*window)
+                        consecutive_errors = 0
+                    continue
                 
-                with self.buffer_lock:
-                    if len(self.audio_buffer) == 0:
-                        time.sleep(0.01)  # 3x faster polling
-                        continue
-                    
-                    buffer_duration = len(self.audio_buffer) / self.sample_rate
-                    time_since_last_audio = current_time - self.last_audio_time
-                    
-                    # Process when we have enough audio or after silence
-                    should_process = (
-                        buffer_duration >= self.chunk_duration or
-                        (buffer_duration >= self.min_audio_length and 
-                         time_since_last_audio >= self.silence_duration)
-                    )
-                    
-                    if should_process:
-                        audio_to_process = self.audio_buffer.copy()
-                        self.audio_buffer = np.array([], dtype=np.float32)
-                        
-                        if len(audio_to_process) > 0:
-                            self._transcribe_chunk_complete(audio_to_process)
-                            consecutive_errors = 0
+                with self.buffer_ready:
+                    audio_to_process = self._wait_for_window()
                 
-                time.sleep(0.01)  # 3x faster polling
+                # Transcribed outside the lock, so add_audio_chunk never waits on the model
+                if audio_to_process is not None and len(audio_to_process) > 0:
+                    self._transcribe_chunk_complete(audio_to_process)
+                    consecutive_errors = 0
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -240,50 +325,21 @@ class WhisperRealtimeMedium:
             start_time = time.time()
             
             # Transcribe with medium model settings
-            segments, info = self.model.transcribe(
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            segments, info = model.transcribe(
                 audio_data,
-                **self.transcribe_settings
+                **settings
             )
             
             # Process segments into complete sentences
-            full_text = ""
-            word_data = []
-            
-            for segment in segments:
-                if hasattr(segment, 'text') and segment.text:
-                    segment_text = segment.text.strip()
-                    if segment_text:
-                        full_text += segment_text + " "
-                        
-                        # Extract word-level data if available
-                        if hasattr(segment, 'words') and segment.words:
-                            for word_info in segment.words:
-                                if hasattr(word_info, 'word') and word_info.word:
-                                    word_data.append({
-                                        'word': word_info.word.strip(),
-                                        'start': getattr(word_info, 'start', 0.0),
-                                        'end': getattr(word_info, 'end', 0.0),
-                                        'confidence': getattr(word_info, 'probability', 0.8)
-                                    })
-            
-            full_text = full_text.strip()
+            full_text, word_data = self._collect_words(segments)
+            self._record_quality(level, len(audio_data) / self.sample_rate, time.time() - start_time)
             
             if full_text:
                 # Create complete sentence result
-                result = {
-                    "type": "complete_sentence",
-                    "text": full_text,
-                    "sentence_id": str(self.sentence_id),
-                    "words": word_data,
-                    "word_count": len(word_data),
-                    "confidence": sum(w['confidence'] for w in word_data) / len(word_data) if word_data else 0.8,
-                    "model": "medium",
-                    "quality": "high_accuracy",
-                    "language": info.language if hasattr(info, 'language') else 'en',
-                    "language_probability": getattr(info, 'language_probability', 0.9)
-                }
-                
-                safe_print(result)
+                safe_print(self._sentence_result(full_text, word_data, info, quality_level=level))
                 
                 # Increment sentence ID for next
                 self.sentence_id = int(time.time() * 1000)
@@ -299,6 +355,129 @@ class WhisperRealtimeMedium:
             }
             safe_print(error_result)
     
+    def _collect_words(self, segments):
+        """Text and word-level data of a transcription"""
+        full_text = ""
+        word_data = []
+        
+        for segment in segments:
+            if hasattr(segment, 'text') and segment.text:
+                segment_text = segment.text.strip()
+                if segment_text:
+                    full_text += segment_text + " "
+                    
+                    # Extract word-level data if available
+                    if hasattr(segment, 'words') and segment.words:
+                        for word_info in segment.words:
+                            if hasattr(word_info, 'word') and word_info.word:
+                                word_data.append({
+                                    'word': word_info.word.strip(),
+                                    'start': getattr(word_info, 'start', 0.0),
+                                    'end': getattr(word_info, 'end', 0.0),
+                                    'confidence': getattr(word_info, 'probability', 0.8)
+                                })
+        
+        return full_text.strip(), word_data
+    
+    def _sentence_result(self, full_text, word_data, info, quality_level=None):
+        """complete_sentence result for the current sentence_id"""
+        return {
+            "type": "complete_sentence",
+            "text": full_text,
+            "sentence_id": str(self.sentence_id),
+            "words": word_data,
+            "word_count": len(word_data),
+            "confidence": sum(w['confidence'] for w in word_data) / len(word_data) if word_data else 0.8,
+            "model": self.model_used,
+            "quality": "high_accuracy",
+            "quality_level": quality_level,
+            "language": info.language if hasattr(info, 'language') else 'en',
+            "language_probability": getattr(info, 'language_probability', 0.9)
+        }
+    
+    def _transcribe_stream_window(self, start, audio_data, paused):
+        """Re-decode the uncommitted window and publish what consecutive hypotheses agree on"""
+        try:
+            if not self.model_ready:
+                return
+            
+            window_start = start / self.sample_rate
+            window_seconds = len(audio_data) / self.sample_rate
+            start_time = time.time()
+            info = None
+            speech = len(audio_data) > 0 and np.max(np.abs(audio_data)) >= self.silence_threshold
+            
+            committed = []
+            words = []
+            if speech and len(audio_data) >= int(self.sample_rate * 0.5):
+                # Committed text that was trimmed off the window goes back in as context
+                level, settings = self.ladder.current(self.transcribe_settings)
+                settings["initial_prompt"] = self.agreement.prompt()
+                model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+                self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+                segments, info = model.transcribe(audio_data, **settings)
+                _, words = self._collect_words(segments)
+                self._record_quality(level, window_seconds, time.time() - start_time)
+                for word in words:
+                    word['start'] = round(word['start'] + window_start, 3)
+                    word['end'] = round(word['end'] + window_start, 3)
+                committed = self.agreement.insert(words)
+            
+            # A pause ends the sentence; a window that never agrees is not allowed to grow forever
+            settle = paused or window_seconds >= MAX_WINDOW_SECONDS
+            if settle:
+                committed = committed + self.agreement.flush()
+            
+            with self.buffer_lock:
+                if settle or not speech:
+                    self.audio_buffer.consume_until(start + len(audio_data))
+                elif committed:
+                    self.audio_buffer.consume_until(int(self.agreement.committed_end * self.sample_rate))
+            
+            self.sentence_words.extend(committed)
+            if self.sentence_words and (settle or SENTENCE_END.search(self.sentence_words[-1]['word'])):
+                self._finish_stream_sentence(info)
+            elif words:
+                tentative_text = " ".join(w['word'] for w in self.agreement.tentative)
+                committed_text = " ".join(w['word'] for w in self.sentence_words)
+                safe_print({
+                    "type": "sentence_progress",
+                    "text": f"{committed_text} {tentative_text}".strip(),
+                    "committed_text": committed_text,
+                    "tentative_text": tentative_text,
+                    "sentence_id": str(self.sentence_id),
+                    "word_count": len(self.sentence_words),
+                    "is_complete": False,
+                    "model": self.model_used
+                })
+            
+            if words:
+                transcribe_time = time.time() - start_time
+                safe_print_error(f"🔁 MEDIUM: {window_seconds:.1f}s window, {len(committed)} committed, "
+                                 f"{len(self.agreement.tentative)} tentative ({transcribe_time:.2f}s)")
+        
+        except Exception as e:
+            safe_print_error(f"❌ Medium model streaming error: {e}")
+            error_result = {
+                "type": "error",
+                "error": f"Medium model streaming error: {str(e)}"
+            }
+            safe_print(error_result)
+    
+    def _finish_stream_sentence(self, info=None):
+        """Publish the committed words of the sentence in progress as a complete_sentence"""
+        full_text = " ".join(w['word'] for w in self.sentence_words)
+        safe_print(self._sentence_result(full_text, self.sentence_words, info))
+        safe_print_error(f"✅ MEDIUM: '{full_text}' ({len(self.sentence_words)} words)")
+        self.sentence_words = []
+        self.sentence_id = int(time.time() * 1000)
+    
+    def _record_quality(self, level, audio_seconds, elapsed):
+        """Feed one transcription's timing to the quality ladder"""
+        change = self.ladder.record(level, audio_seconds, elapsed, self.audio_buffer.dropped)
+        if change:
+            safe_print_error(f"🎚️ {change}")
+    
     def add_audio_chunk(self, audio_data):
         """Add audio chunk for processing"""
         try:
@@ -328,15 +507,11 @@ class WhisperRealtimeMedium:
             max_amplitude = np.max(np.abs(audio_array))
             
             with self.buffer_lock:
-                self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+                self.audio_buffer.write(audio_array)  # Oldest audio drops out past the capacity
+                self.buffer_ready.notify()
                 
                 if max_amplitude > self.silence_threshold:
                     self.last_audio_time = time.time()
-                
-                # Larger buffer for medium model (better context)
-                max_buffer_samples = self.sample_rate * 15  # 15 seconds max
-                if len(self.audio_buffer) > max_buffer_samples:
-                    self.audio_buffer = self.audio_buffer[-max_buffer_samples:]
         
         except Exception as e:
             safe_print_error(f"❌ Error adding audio chunk: {e}")
@@ -345,14 +520,26 @@ class WhisperRealtimeMedium:
         """Clean up resources"""
         safe_print_error("🧹 Cleaning up medium model Whisper resources...")
         self.is_running = False
+        with self.buffer_ready:
+            self.buffer_ready.notify_all()  # Wake the processing loop so it sees the stop
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2.0)
         
         with self.buffer_lock:
-            self.audio_buffer = np.array([], dtype=np.float32)
+            self.audio_buffer.clear()
+        
+        # Whatever was still tentative at the end of the stream is published as it stands
+        if self.agreement:
+            self.sentence_words.extend(self.agreement.flush())
+            if self.sentence_words:
+                self._finish_stream_sentence()
+            safe_print_error(f"📊 LocalAgreement: {self.agreement.summary()}")
+        
+        safe_print_error(f"📊 Quality ladder: {self.ladder.summary()}")
         
         self.model = None
+        self.fallback_model = None
         gc.collect()
         safe_print_error("✅ Medium model cleanup complete")
 
@@ -361,33 +548,43 @@ def main():
     safe_print_error("🚀 Medium Model Whisper Real-time Transcription")
     
     whisper = None
+    audio_source = None
     try:
+        # --local-agreement streams a re-decoded window instead of independent 300ms chunks
+        options = sys.argv[1:]
+        local_agreement = '--local-agreement' in options
+        # --latency-budget-ms N caps the time one window may take before the quality ladder steps down;
+        # --fallback-model NAME preloads a smaller model as the ladder's last rung
+        latency_budget_ms = float(options[options.index('--latency-budget-ms') + 1]) if '--latency-budget-ms' in options else None
+        fallback_model = options[options.index('--fallback-model') + 1] if '--fallback-model' in options else None
+        
         # Initialize medium model processor
-        whisper = WhisperRealtimeMedium(model_size="medium")
+        whisper = WhisperRealtimeMedium(model_size="medium", local_agreement=local_agreement,
+                                        fallback_model=fallback_model, latency_budget_ms=latency_budget_ms)
         
         safe_print_error("🎧 Ready for medium quality audio input")
         
+        # Length-prefixed stdin frames, or the shared audio ring when started with --shm-ring
+        audio_source = open_audio_source(sys.argv[1:], sys.stdin.buffer,
+                                         max_length=1024 * 1024)  # 1MB max
+        safe_print_error(f"🎧 Audio source: {audio_source.name}")
+        # Frames at other rates or channel counts are brought to 16kHz mono here, statefully per stream
+        converter = IngestConverter(audio_source.sample_rate, audio_source.channels, audio_source.sample_format)
+        
         while True:
             try:
-                # Read length
-                length_data = sys.stdin.buffer.read(4)
-                if len(length_data) != 4:
+                frame = audio_source.next_frame()
+                if frame is None:
                     safe_print_error("📡 End of input stream")
                     break
                 
-                length = struct.unpack('<I', length_data)[0]
-                
-                if length == 0 or length > 1024 * 1024:  # 1MB max
-                    continue
-                
-                # Read audio data
-                audio_data = sys.stdin.buffer.read(length)
-                if len(audio_data) != length:
-                    continue
-                
-                # Process with medium model
-                if whisper and whisper.startup_complete:
-                    whisper.add_audio_chunk(audio_data)
+                buffer, length, info = frame
+                try:
+                    # Process with medium model
+                    if whisper and whisper.startup_complete:
+                        whisper.add_audio_chunk(converter.to_float32(memoryview(buffer)[:length], info))
+                finally:
+                    audio_source.release(buffer)
             
             except Exception as e:
                 safe_print_error(f"❌ Error reading audio: {e}")
@@ -401,6 +598,8 @@ def main():
         safe_print_error(f"❌ Medium model Whisper fatal error: {e}")
     
     finally:
+        if audio_source:
+            audio_source.close()
         if whisper:
             whisper.cleanup()
         safe_print_error("🏁 Medium Model Whisper ended")
@@ -6,7 +6,6 @@ Optimized for SPEED and real-time performance!
 
 import sys
 import json
-import struct
 import numpy as np
 from faster_whisper import WhisperModel
 import threading
@@ -17,6 +16,14 @@ import gc
 import signal
 import re
 
+# Shared audio transports live next to vosk_realtime.py in the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_transport import open_audio_source
+from audio_resample import IngestConverter
+from audio_buffer import AudioRingBuffer
+from quality_ladder import QualityLadder
+from whisper_tuning import load_tuned_model
+
 def safe_print(message, file=sys.stdout):
     """Safely print messages"""
     try:
@@ -37,7 +44,8 @@ def safe_print_error(message):
     safe_print(message, file=sys.stderr)
 
 class WhisperRealtimeSmall:
-    def __init__(self, model_size="small", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="small", device="cpu", compute_type="int8",
+                 fallback_model=None, latency_budget_ms=None):
         """Initialize with SMALL model for SPEED"""
         
         # Initialize all instance variables
@@ -49,8 +57,10 @@ class WhisperRealtimeSmall:
         self.min_audio_length = 0.2  # 🚀 LIGHTNING: 0.2s minimum
         self.silence_duration = 0.3  # 🚀 RAPID: 0.3s silence detection
         
-        self.audio_buffer = np.array([], dtype=np.float32)
+        # 2 seconds max, allocated once; 10s of headroom keeps a window valid while the model works on it
+        self.audio_buffer = AudioRingBuffer(self.sample_rate * 2, headroom=self.sample_rate * 10)
         self.buffer_lock = threading.Lock()
+        self.buffer_ready = threading.Condition(self.buffer_lock)  # Notified on every write
         self.last_process_time = time.time()
         self.audio_queue = queue.Queue(maxsize=3)  # 🚀 TINY queue for speed
         self.is_running = True
@@ -84,6 +94,17 @@ class WhisperRealtimeSmall:
             "initial_prompt": None
         }
         
+        self.model_size = model_size
+        self.tuning = None  # cpu_threads/num_workers the models run with, from whisper_tuning
+        
+        # Settings step down a ladder when transcription falls behind real time and back up once it
+        # catches up; by default a window should take no longer to transcribe than chunk_duration
+        self.fallback_model = None
+        self.fallback_model_size = fallback_model
+        self.model_used = model_size  # ✅ Name reported in results; the fallback's when the ladder picks it
+        self.ladder = QualityLadder(self.transcribe_settings, latency_budget_ms or self.chunk_duration * 1000,
+                                    fallback_model=bool(fallback_model))
+        
         safe_print_error("🚀 Starting SMALL Model Whisper - OPTIMIZED FOR SPEED!")
         safe_print_error(f"🏃‍♂️ Target model: {model_size} (SMALL = FAST MODE)")
         
@@ -114,18 +135,20 @@ class WhisperRealtimeSmall:
             start_time = time.time()
             
             # Create model instance with speed optimizations
-            self.model = WhisperModel(
+            self.model, self.tuning = load_tuned_model(
                 model_size,
                 device=device,
                 compute_type=compute_type,
-                cpu_threads=2,  # 🚀 FASTER: Fewer threads for small model
-                num_workers=1,
+                default=(2, 1),  # Used on GPU or with MLA_WHISPER_TUNING=off; otherwise calibrated once and cached
+                settings=self.transcribe_settings,
+                log=safe_print_error,
                 download_root=None,
                 local_files_only=True
             )
             
             load_time = time.time() - start_time
             safe_print_error(f"⚡ SMALL model loaded in {load_time:.1f} seconds")
+            safe_print_error(f"🧵 cpu_threads={self.tuning['cpu_threads']}, num_workers={self.tuning['num_workers']} ({self.tuning['source']})")
             
             # Quick test
             safe_print_error("🧪 Testing SMALL model speed...")
@@ -140,6 +163,19 @@ class WhisperRealtimeSmall:
             list(segments)  # Consume results
             safe_print_error("⚡ SMALL model test completed - READY FOR SPEED!")
             
+            if self.fallback_model_size:
+                # Preloaded, so the ladder's last rung switches models without a pause
+                self.fallback_model = WhisperModel(
+                    self.fallback_model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=self.tuning['cpu_threads'],
+                    num_workers=self.tuning['num_workers'],
+                    download_root=None,
+                    local_files_only=True
+                )
+                safe_print_error(f"✅ Fallback model {self.fallback_model_size} loaded for the quality ladder")
+            
             self.model_ready = True
             safe_print_error("🎉 SMALL MODEL WHISPER READY - MAXIMUM SPEED MODE!")
             
@@ -166,6 +202,9 @@ class WhisperRealtimeSmall:
         """Signal that SMALL Whisper is ready"""
         safe_print_error("🎉 SMALL MODEL INITIALIZATION COMPLETE")
         
+        # Which thread split the model runs with, ahead of the plain ready lines
+        safe_print({"type": "ready", "model": self.model_size, **self.tuning})
+        
         # Send ready signal multiple times for reliability
         for i in range(3):
             safe_print("WHISPER_READY")
@@ -174,45 +213,51 @@ class WhisperRealtimeSmall:
         safe_print_error("🚀 READY FOR LIGHTNING-FAST TRANSCRIPTION!")
         self.startup_complete = True
     
+    def _wait_for_window(self):
+        """Sleep until the buffer is due and drain it; None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            current_time = time.time()
+            buffer_duration = len(self.audio_buffer) / self.sample_rate
+            time_since_last_audio = current_time - self.last_audio_time
+            time_since_last_process = current_time - self.last_process_time
+            
+            # 🚀 SUPER AGGRESSIVE processing for SMALL model
+            should_process = (
+                buffer_duration >= self.chunk_duration or
+                (buffer_duration >= self.min_audio_length and 
+                 time_since_last_audio >= self.silence_duration) or
+                (buffer_duration >= 0.3 and time_since_last_process >= 0.8) or  # 🚀 Force every 0.8s
+                (buffer_duration >= 0.6)  # 🚀 Never let buffer get too big
+            )
+            if should_process:
+                self.last_process_time = current_time
+                return self.audio_buffer.drain()  # Zero-copy view of the window
+            
+            # Sleep until the earliest timeout that could make it due, or until more audio arrives
+            deadlines = []
+            if buffer_duration >= self.min_audio_length:
+                deadlines.append(self.silence_duration - time_since_last_audio)
+            if buffer_duration >= 0.3:
+                deadlines.append(0.8 - time_since_last_process)
+            self.buffer_ready.wait(min(deadlines) if deadlines else None)
+        return None
+    
     def _process_audio_loop(self):
         """🚀 LIGHTNING-FAST processing loop optimized for SMALL model"""
         safe_print_error("🔄 SMALL model SPEED processing loop started")
         consecutive_errors = 0
         max_consecutive_errors = 3
-        last_process_time = time.time()
+        self.last_process_time = time.time()
         
         while self.is_running:
             try:
-                current_time = time.time()
+                with self.buffer_ready:
+                    audio_to_process = self._wait_for_window()
                 
-                with self.buffer_lock:
-                    if len(self.audio_buffer) == 0:
-                        time.sleep(0.005)   # 🚀 ULTRA-SHORT sleep for speed
-                        continue
-                    
-                    buffer_duration = len(self.audio_buffer) / self.sample_rate
-                    time_since_last_audio = current_time - self.last_audio_time
-                    time_since_last_process = current_time - last_process_time
-                    
-                    # 🚀 SUPER AGGRESSIVE processing for SMALL model
-                    should_process = (
-                        buffer_duration >= self.chunk_duration or
-                        (buffer_duration >= self.min_audio_length and 
-                         time_since_last_audio >= self.silence_duration) or
-                        (buffer_duration >= 0.3 and time_since_last_process >= 0.8) or  # 🚀 Force every 0.8s
-                        (buffer_duration >= 0.6)  # 🚀 Never let buffer get too big
-                    )
-                    
-                    if should_process:
-                        audio_to_process = self.audio_buffer.copy()
-                        self.audio_buffer = np.array([], dtype=np.float32)  # 🚀 Clear everything
-                        last_process_time = current_time
-                        
-                        if len(audio_to_process) > 0:
-                            self._transcribe_chunk_complete(audio_to_process)
-                            consecutive_errors = 0
-                
-                time.sleep(0.005)  # 🚀 ULTRA-SHORT sleep
+                # 🚀 Transcribed outside the lock, so add_audio_chunk never waits on the model
+                if audio_to_process is not None and len(audio_to_process) > 0:
+                    self._transcribe_chunk_complete(audio_to_process)
+                    consecutive_errors = 0
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -248,9 +293,12 @@ class WhisperRealtimeSmall:
             start_time = time.time()
             
             # 🚀 TRANSCRIBE with SMALL model SPEED settings
-            segments, info = self.model.transcribe(
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            segments, info = model.transcribe(
                 audio_data,
-                **self.transcribe_settings
+                **settings
             )
             
             # Process segments into complete sentences
@@ -264,6 +312,7 @@ class WhisperRealtimeSmall:
                         full_text += segment_text + " "
             
             full_text = full_text.strip()
+            self._record_quality(level, len(audio_data) / self.sample_rate, time.time() - start_time)
             
             if full_text:
                 # Create complete sentence result
@@ -274,8 +323,9 @@ class WhisperRealtimeSmall:
                     "words": word_data,
                     "word_count": len(full_text.split()),
                     "confidence": 0.9,  # 🚀 Fixed confidence for speed
-                    "model": "small",
+                    "model": self.model_used,
                     "quality": "fast_accuracy",
+                    "quality_level": level,
                     "language": info.language if hasattr(info, 'language') else 'en',
                     "language_probability": getattr(info, 'language_probability', 0.9)
                 }
@@ -296,6 +346,12 @@ class WhisperRealtimeSmall:
             }
             safe_print(error_result)
     
+    def _record_quality(self, level, audio_seconds, elapsed):
+        """Feed one transcription's timing to the quality ladder"""
+        change = self.ladder.record(level, audio_seconds, elapsed, self.audio_buffer.dropped)
+        if change:
+            safe_print_error(f"🎚️ {change}")
+    
     def add_audio_chunk(self, audio_data):
         """🚀 SPEED-optimized audio chunk processing"""
         try:
@@ -325,16 +381,15 @@ class WhisperRealtimeSmall:
             max_amplitude = np.max(np.abs(audio_array))
             
             with self.buffer_lock:
-                self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+                self.audio_buffer.write(audio_array)  # Oldest audio drops out past the capacity
+                self.buffer_ready.notify()
                 
                 if max_amplitude > self.silence_threshold:
                     self.last_audio_time = time.time()
                 
-                # 🚀 MUCH smaller buffer for SMALL model - SPEED!
-                max_buffer_samples = self.sample_rate * 2  # 🚀 Only 2 seconds max!
-                if len(self.audio_buffer) > max_buffer_samples:
-                    # 🚀 Keep only most recent audio for speed
-                    self.audio_buffer = self.audio_buffer[-max_buffer_samples//2:]
+                # 🚀 Once the 2 seconds are full, keep only the most recent second for speed
+                if len(self.audio_buffer) >= self.audio_buffer.capacity:
+                    self.audio_buffer.consume(len(self.audio_buffer) - self.audio_buffer.capacity // 2)
         
         except Exception as e:
             safe_print_error(f"❌ Error adding audio chunk: {e}")
@@ -343,14 +398,19 @@ class WhisperRealtimeSmall:
         """Clean up SMALL model resources"""
         safe_print_error("🧹 Cleaning up SMALL model Whisper resources...")
         self.is_running = False
+        with self.buffer_ready:
+            self.buffer_ready.notify_all()  # Wake the processing loop so it sees the stop
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=1.0)  # 🚀 Faster timeout
         
         with self.buffer_lock:
-            self.audio_buffer = np.array([], dtype=np.float32)
+            self.audio_buffer.clear()
+        
+        safe_print_error(f"📊 Quality ladder: {self.ladder.summary()}")
         
         self.model = None
+        self.fallback_model = None
         gc.collect()
         safe_print_error("⚡ SMALL model cleanup complete")
 
@@ -359,34 +419,40 @@ def main():
     safe_print_error("🚀 SMALL Model Whisper Real-time Transcription - SPEED MODE!")
     
     whisper = None
+    audio_source = None
     try:
+        # --latency-budget-ms N caps the time one window may take before the quality ladder steps down;
+        # --fallback-model NAME preloads a smaller model as the ladder's last rung
+        options = sys.argv[1:]
+        latency_budget_ms = float(options[options.index('--latency-budget-ms') + 1]) if '--latency-budget-ms' in options else None
+        fallback_model = options[options.index('--fallback-model') + 1] if '--fallback-model' in options else None
+        
         # Initialize SMALL model processor
-        whisper = WhisperRealtimeSmall(model_size="small")
+        whisper = WhisperRealtimeSmall(model_size="small", fallback_model=fallback_model, latency_budget_ms=latency_budget_ms)
         
         safe_print_error("🎧 Ready for LIGHTNING-FAST audio input")
         
+        # Length-prefixed stdin frames, or the shared audio ring when started with --shm-ring
+        audio_source = open_audio_source(sys.argv[1:], sys.stdin.buffer,
+                                         max_length=256 * 1024)  # 🚀 256KB max for speed
+        safe_print_error(f"🎧 Audio source: {audio_source.name}")
+        # Frames at other rates or channel counts are brought to 16kHz mono here, statefully per stream
+        converter = IngestConverter(audio_source.sample_rate, audio_source.channels, audio_source.sample_format)
+        
         while True:
             try:
-                # Read length
-                length_data = sys.stdin.buffer.read(4)
-                if len(length_data) != 4:
+                frame = audio_source.next_frame()
+                if frame is None:
                     safe_print_error("📡 End of input stream")
                     break
                 
-                length = struct.unpack('<I', length_data)[0]
-                
-                # 🚀 Smaller max for faster processing
-                if length == 0 or length > 256 * 1024:  # 🚀 256KB max for speed
-                    continue
-                
-                # Read audio data
-                audio_data = sys.stdin.buffer.read(length)
-                if len(audio_data) != length:
-                    continue
-                
-                # Process with SMALL model for SPEED
-                if whisper and whisper.startup_complete:
-                    whisper.add_audio_chunk(audio_data)
+                buffer, length, info = frame
+                try:
+                    # Process with SMALL model for SPEED
+                    if whisper and whisper.startup_complete:
+                        whisper.add_audio_chunk(converter.to_float32(memoryview(buffer)[:length], info))
+                finally:
+                    audio_source.release(buffer)
             
             except Exception as e:
                 safe_print_error(f"❌ Error reading audio: {e}")
@@ -400,6 +466,8 @@ def main():
         safe_print_error(f"❌ SMALL model Whisper fatal error: {e}")
     
     finally:
+        if audio_source:
+            audio_source.close()
         if whisper:
             whisper.cleanup()
         safe_print_error("🏁 SMALL Model Whisper ended")
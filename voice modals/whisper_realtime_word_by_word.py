@@ -6,7 +6,6 @@ Modified for word-by-word output with sentence grouping
 
 import sys
 import json
-import struct
 import numpy as np
 from faster_whisper import WhisperModel
 import threading
@@ -15,8 +14,18 @@ import time
 import os
 import gc
 import signal
+from collections import deque
 import re
 
+# Shared audio transports live next to vosk_realtime.py in the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_transport import open_audio_source
+from audio_resample import IngestConverter
+from audio_buffer import AudioRingBuffer
+from audio_vad import SpeechSegmenter
+from quality_ladder import QualityLadder
+from whisper_tuning import load_tuned_model
+
 def safe_print(message, file=sys.stdout):
     """Safely print messages"""
     try:
@@ -37,7 +46,8 @@ def safe_print_error(message):
     safe_print(message, file=sys.stderr)
 
 class WhisperRealtimeWordByWord:
-    def __init__(self, model_size="base", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="base", device="cpu", compute_type="int8",
+                 fallback_model=None, latency_budget_ms=None):
         """Initialize with word-by-word processing"""
         
         # Initialize all instance variables
@@ -45,8 +55,9 @@ class WhisperRealtimeWordByWord:
         self.sample_rate = 16000
         self.chunk_duration = 1.0  # Shorter chunks for faster word detection
         self.min_audio_length = 0.5  # Even shorter minimum
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer = AudioRingBuffer(self.sample_rate * 8)  # 8 seconds max, allocated once
         self.buffer_lock = threading.Lock()
+        self.buffer_ready = threading.Condition(self.buffer_lock)  # Notified on every write
         self.last_process_time = time.time()
         self.audio_queue = queue.Queue(maxsize=15)
         self.is_running = True
@@ -76,17 +87,29 @@ class WhisperRealtimeWordByWord:
             "compression_ratio_threshold": 2.4,
             "log_prob_threshold": -1.0,
             "no_speech_threshold": 0.6,
-            "vad_filter": True,
-            "vad_parameters": dict(
-                min_silence_duration_ms=200,  # Shorter for word detection
-                threshold=0.4,
-                min_speech_duration_ms=100,
-                max_speech_duration_s=10
-            ),
+            "vad_filter": False,  # Windows are already speech segments, cut below
             "word_timestamps": True,  # Enable word timestamps
             "initial_prompt": "This is a conversation with clear speech."
         }
         
+        # One VAD pass per incoming frame: only padded speech reaches the ring, and each window
+        # ends where a segment does - in a pause, or for long speech at its quietest point
+        self.segmenter = SpeechSegmenter(self.sample_rate, min_speech_ms=100, min_silence_ms=200,
+                                         max_segment_ms=int(self.chunk_duration * 1000))
+        self.segment_ends = deque()  # Ring positions where finished segments end (guarded by buffer_lock)
+        
+        self.model_size = model_size
+        self.tuning = None  # cpu_threads/num_workers the models run with, from whisper_tuning
+        
+        # Settings step down a ladder when transcription falls behind real time and back up once it
+        # catches up; by default a window should take no longer to transcribe than chunk_duration
+        self.fallback_model = None
+        self.fallback_model_size = fallback_model
+        self.model_used = model_size  # ✅ Name reported in results; the fallback's when the ladder picks it
+        self.ladder = QualityLadder(self.transcribe_settings, latency_budget_ms or self.chunk_duration * 1000,
+                                    fallback_model=bool(fallback_model),
+                                    keep=("word_timestamps",))
+        
         safe_print_error("🚀 Starting Word-by-Word Whisper Transcription")
         safe_print_error(f"Target model: {model_size} (WORD-BY-WORD MODE)")
         
@@ -117,18 +140,20 @@ class WhisperRealtimeWordByWord:
             start_time = time.time()
             
             # Create model instance with word timestamp support
-            self.model = WhisperModel(
+            self.model, self.tuning = load_tuned_model(
                 model_size,
                 device=device,
                 compute_type=compute_type,
-                cpu_threads=2,
-                num_workers=1,
+                default=(2, 1),  # Used on GPU or with MLA_WHISPER_TUNING=off; otherwise calibrated once and cached
+                settings=self.transcribe_settings,
+                log=safe_print_error,
                 download_root=None,
                 local_files_only=True
             )
             
             load_time = time.time() - start_time
             safe_print_error(f"✅ Model loaded in {load_time:.1f} seconds")
+            safe_print_error(f"🧵 cpu_threads={self.tuning['cpu_threads']}, num_workers={self.tuning['num_workers']} ({self.tuning['source']})")
             
             # Quick test with word timestamps
             safe_print_error("🧪 Testing word-level transcription...")
@@ -143,6 +168,19 @@ class WhisperRealtimeWordByWord:
             list(segments)  # Consume results
             safe_print_error("✅ Word-level transcription test completed")
             
+            if self.fallback_model_size:
+                # Preloaded, so the ladder's last rung switches models without a pause
+                self.fallback_model = WhisperModel(
+                    self.fallback_model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=self.tuning['cpu_threads'],
+                    num_workers=self.tuning['num_workers'],
+                    download_root=None,
+                    local_files_only=True
+                )
+                safe_print_error(f"✅ Fallback model {self.fallback_model_size} loaded for the quality ladder")
+            
             self.model_ready = True
             safe_print_error("🎉 WORD-BY-WORD WHISPER READY!")
             
@@ -169,6 +207,9 @@ class WhisperRealtimeWordByWord:
         """Signal that Whisper is ready"""
         safe_print_error("🎉 WORD-BY-WORD INITIALIZATION COMPLETE")
         
+        # Which thread split the model runs with, ahead of the plain ready lines
+        safe_print({"type": "ready", "model": self.model_size, **self.tuning})
+        
         # Send ready signal
         for i in range(3):
             safe_print("WHISPER_READY")
@@ -177,6 +218,41 @@ class WhisperRealtimeWordByWord:
         safe_print_error("🚀 READY FOR WORD-BY-WORD TRANSCRIPTION!")
         self.startup_complete = True
     
+    def _wait_for_window(self):
+        """Sleep until a speech segment is due and take it; None once stopped (called with buffer_ready held)"""
+        while self.is_running:
+            time_since_last_audio = time.time() - self.last_audio_time
+            end = self._due_segment_end(time_since_last_audio)
+            if end is not None:
+                return self._take_segments(end)  # Zero-copy view of the window
+            
+            if self.segment_ends:
+                # Only the silence timeout can make a short segment due before more audio arrives
+                self.buffer_ready.wait(self.silence_duration - time_since_last_audio)
+            else:
+                self.buffer_ready.wait()
+        return None
+    
+    def _due_segment_end(self, time_since_last_audio):
+        """Ring position the next window ends at, or None while no segment is ready (called with buffer_lock held)"""
+        if not self.segment_ends:
+            return None
+        # Every finished segment goes out together; one shorter than min_audio_length waits to join
+        # the next, unless the speaker has stopped
+        end = self.segment_ends[-1]
+        if (end - self.audio_buffer.start >= self.min_audio_length * self.sample_rate or
+                time_since_last_audio >= self.silence_duration):
+            return end
+        return None
+    
+    def _take_segments(self, end):
+        """Zero-copy view of the buffered audio up to ring position `end`, which is then dropped"""
+        window = self.audio_buffer.peek(max(0, end - self.audio_buffer.start))
+        self.audio_buffer.consume_until(end)
+        while self.segment_ends and self.segment_ends[0] <= end:
+            self.segment_ends.popleft()
+        return window
+    
     def _process_audio_loop(self):
         """Background processing optimized for word detection"""
         safe_print_error("🔄 Word-by-word processing loop started")
@@ -185,32 +261,13 @@ class WhisperRealtimeWordByWord:
         
         while self.is_running:
             try:
-                current_time = time.time()
+                with self.buffer_ready:
+                    audio_to_process = self._wait_for_window()
                 
-                with self.buffer_lock:
-                    if len(self.audio_buffer) == 0:
-                        time.sleep(0.03)  # Faster polling for word detection
-                        continue
-                    
-                    buffer_duration = len(self.audio_buffer) / self.sample_rate
-                    time_since_last_audio = current_time - self.last_audio_time
-                    
-                    # More aggressive processing for word-level detection
-                    should_process = (
-                        buffer_duration >= self.chunk_duration or
-                        (buffer_duration >= self.min_audio_length and 
-                         time_since_last_audio >= self.silence_duration)
-                    )
-                    
-                    if should_process:
-                        audio_to_process = self.audio_buffer.copy()
-                        self.audio_buffer = np.array([], dtype=np.float32)
-                        
-                        if len(audio_to_process) > 0:
-                            self._transcribe_chunk_word_by_word(audio_to_process)
-                            consecutive_errors = 0
-                
-                time.sleep(0.03)  # Faster polling
+                # Transcribed outside the lock, so add_audio_chunk never waits on the model
+                if audio_to_process is not None and len(audio_to_process) > 0:
+                    self._transcribe_chunk_word_by_word(audio_to_process)
+                    consecutive_errors = 0
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -246,9 +303,12 @@ class WhisperRealtimeWordByWord:
             start_time = time.time()
             
             # Transcribe with word timestamps
-            segments, info = self.model.transcribe(
+            level, settings = self.ladder.current(self.transcribe_settings)
+            model = self.fallback_model if self.ladder.uses_fallback(level) else self.model
+            self.model_used = self.fallback_model_size if model is self.fallback_model else self.model_size
+            segments, info = model.transcribe(
                 audio_data,
-                **self.transcribe_settings
+                **settings
             )
             
             # Process word by word
@@ -282,6 +342,7 @@ class WhisperRealtimeWordByWord:
                                 'confidence': 0.8
                             })
                         full_text = text + " "
+            self._record_quality(level, len(audio_data) / self.sample_rate, time.time() - start_time)
             
             if new_words:
                 self._process_new_words(new_words, full_text.strip())
@@ -337,7 +398,7 @@ class WhisperRealtimeWordByWord:
                     "sentence_id": str(self.sentence_id),
                     "word_count": len(self.current_sentence_words),
                     "confidence": self._calculate_sentence_confidence(),
-                    "model": "base",
+                    "model": self.model_used,
                     "quality": "word_by_word"
                 }
                 safe_print(final_result)
@@ -386,6 +447,12 @@ class WhisperRealtimeWordByWord:
             return sum(confidences) / len(confidences)
         return 0.8
     
+    def _record_quality(self, level, audio_seconds, elapsed):
+        """Feed one transcription's timing to the quality ladder"""
+        change = self.ladder.record(level, audio_seconds, elapsed, self.audio_buffer.dropped)
+        if change:
+            safe_print_error(f"🎚️ {change}")
+    
     def add_audio_chunk(self, audio_data):
         """Add audio chunk for word-by-word processing"""
         try:
@@ -412,18 +479,15 @@ class WhisperRealtimeWordByWord:
             if not np.isfinite(audio_array).all():
                 return
             
-            max_amplitude = np.max(np.abs(audio_array))
+            speech, segment_ends = self.segmenter.process(audio_array)
             
             with self.buffer_lock:
-                self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+                self.audio_buffer.write(speech)  # Oldest audio drops out past the capacity
+                self.segment_ends.extend(segment_ends)
+                self.buffer_ready.notify()
                 
-                if max_amplitude > self.silence_threshold:
+                if self.segmenter.in_speech:
                     self.last_audio_time = time.time()
-                
-                # Smaller buffer for responsiveness
-                max_buffer_samples = self.sample_rate * 8  # 8 seconds max
-                if len(self.audio_buffer) > max_buffer_samples:
-                    self.audio_buffer = self.audio_buffer[-max_buffer_samples:]
         
         except Exception as e:
             safe_print_error(f"❌ Error adding audio chunk: {e}")
@@ -432,12 +496,16 @@ class WhisperRealtimeWordByWord:
         """Clean up resources"""
         safe_print_error("🧹 Cleaning up word-by-word Whisper resources...")
         self.is_running = False
+        with self.buffer_ready:
+            self.buffer_ready.notify_all()  # Wake the processing loop so it sees the stop
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2.0)
         
         with self.buffer_lock:
-            self.audio_buffer = np.array([], dtype=np.float32)
+            self.audio_buffer.clear()
+            self.segment_ends.clear()
+        safe_print_error(f"📊 VAD segments: {self.segmenter.summary()}")
         
         # Send final sentence if incomplete
         if self.current_sentence_words:
@@ -448,12 +516,15 @@ class WhisperRealtimeWordByWord:
                 "sentence_id": str(self.sentence_id),
                 "word_count": len(self.current_sentence_words),
                 "confidence": self._calculate_sentence_confidence(),
-                "model": "base",
+                "model": self.model_used,
                 "quality": "word_by_word_final"
             }
             safe_print(final_result)
         
+        safe_print_error(f"📊 Quality ladder: {self.ladder.summary()}")
+        
         self.model = None
+        self.fallback_model = None
         gc.collect()
         safe_print_error("✅ Word-by-word cleanup complete")
 
@@ -462,33 +533,40 @@ def main():
     safe_print_error("🚀 Word-by-Word Whisper Real-time Transcription")
     
     whisper = None
+    audio_source = None
     try:
+        # --latency-budget-ms N caps the time one window may take before the quality ladder steps down;
+        # --fallback-model NAME preloads a smaller model as the ladder's last rung
+        options = sys.argv[1:]
+        latency_budget_ms = float(options[options.index('--latency-budget-ms') + 1]) if '--latency-budget-ms' in options else None
+        fallback_model = options[options.index('--fallback-model') + 1] if '--fallback-model' in options else None
+        
         # Initialize word-by-word processor
-        whisper = WhisperRealtimeWordByWord(model_size="base")
+        whisper = WhisperRealtimeWordByWord(model_size="base", fallback_model=fallback_model, latency_budget_ms=latency_budget_ms)
         
         safe_print_error("🎧 Ready for word-by-word audio input")
         
+        # Length-prefixed stdin frames, or the shared audio ring when started with --shm-ring
+        audio_source = open_audio_source(sys.argv[1:], sys.stdin.buffer,
+                                         max_length=1024 * 1024)  # 1MB max
+        safe_print_error(f"🎧 Audio source: {audio_source.name}")
+        # Frames at other rates or channel counts are brought to 16kHz mono here, statefully per stream
+        converter = IngestConverter(audio_source.sample_rate, audio_source.channels, audio_source.sample_format)
+        
         while True:
             try:
-                # Read length
-                length_data = sys.stdin.buffer.read(4)
-                if len(length_data) != 4:
+                frame = audio_source.next_frame()
+                if frame is None:
                     safe_print_error("📡 End of input stream")
                     break
                 
-                length = struct.unpack('<I', length_data)[0]
-                
-                if length == 0 or length > 1024 * 1024:  # 1MB max
-                    continue
-                
-                # Read audio data
-                audio_data = sys.stdin.buffer.read(length)
-                if len(audio_data) != length:
-                    continue
-                
-                # Process with word-by-word detection
-                if whisper and whisper.startup_complete:
-                    whisper.add_audio_chunk(audio_data)
+                buffer, length, info = frame
+                try:
+                    # Process with word-by-word detection
+                    if whisper and whisper.startup_complete:
+                        whisper.add_audio_chunk(converter.to_float32(memoryview(buffer)[:length], info))
+                finally:
+                    audio_source.release(buffer)
             
             except Exception as e:
                 safe_print_error(f"❌ Error reading audio: {e}")
@@ -502,6 +580,8 @@ def main():
         safe_print_error(f"❌ Word-by-word Whisper fatal error: {e}")
     
     finally:
+        if audio_source:
+            audio_source.close()
         if whisper:
             whisper.cleanup()
         safe_print_error("🏁 Word-by-Word Whisper ended")
@@ -0,0 +1,167 @@
+import os
+import sys
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from vosk import KaldiRecognizer
+
+import wosk_transcriber
+from wosk_transcriber import MappedWav, SubtitleWriter, decode_frames, offset_words, load_worker_model
+
+# Batch transcription of a directory or glob of WAV recordings, resumable through a manifest.
+#
+# The manifest (<out>/manifest.json) records every file's status, size, mtime and
+# output paths. It is rewritten atomically after each file, so an interrupted run
+# picks up where it stopped: finished files are skipped. How far a file cut off
+# mid-way got lives only in the <output>.progress file its worker appends to after
+# every JSON line; the next run continues from the sample the last finalized result
+# ended at.
+
+MANIFEST_NAME = 'manifest.json'
+
+def find_recordings(source):
+    if os.path.isdir(source):
+        found = []
+        for root, _, files in os.walk(source):
+            found.extend(os.path.join(root, name) for name in files if name.lower().endswith('.wav'))
+        return os.path.abspath(source), sorted(os.path.abspath(path) for path in found)
+    found = sorted(os.path.abspath(path) for path in glob.glob(source, recursive=True))
+    base = os.path.commonpath([os.path.dirname(path) for path in found]) if found else os.getcwd()
+    return base, found
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"files": {}}
+
+def save_manifest(path, manifest):
+    # Write-then-rename, so a crash never leaves a half-written manifest behind
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_progress(progress_path):
+    """(frame to resume from, output bytes written) from the last complete progress line"""
+    frame, size = 0, 0
+    if os.path.exists(progress_path):
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and line.endswith('\n'):
+                    frame, size = int(parts[0]), int(parts[1])
+    return frame, size
+
+def transcribe_job(audio_file, output_path, subtitle_formats):
+    """Transcribe one file in a pool worker, resuming from its progress file if there is one"""
+    progress_path = output_path + '.progress'
+    start_frame, output_size = read_progress(progress_path)
+    if not os.path.exists(output_path):
+        start_frame, output_size = 0, 0
+    started = time.time()
+
+    with MappedWav(audio_file) as wav, \
+            open(output_path, 'r+b' if start_frame else 'wb') as output, \
+            open(progress_path, 'a', encoding='utf-8') as progress:
+        # Drop anything written after the last recorded result
+        output.truncate(output_size)
+        output.seek(output_size)
+
+        rec = KaldiRecognizer(wosk_transcriber.worker_model, wav.rate)
+        rec.SetWords(True)
+        offset = start_frame / wav.rate
+        for frame, result in decode_frames(rec, wav, start_frame, wav.frames):
+            if result.get('text'):
+                output.write((json.dumps(offset_words(result, offset)) + '\n').encode('utf-8'))
+                output.flush()
+            progress.write(f"{frame} {output.tell()}\n")
+            progress.flush()
+
+    outputs = [output_path]
+    for fmt in subtitle_formats:
+        subtitle_path = os.path.splitext(output_path)[0] + '.' + fmt
+        writer = SubtitleWriter(subtitle_path, vtt=(fmt == 'vtt'))
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                writer.write(json.loads(line))
+        writer.close()
+        outputs.append(subtitle_path)
+
+    os.remove(progress_path)
+    return {"outputs": outputs, "seconds": round(time.time() - started, 2), "resumed_from": start_frame}
+
+def run_batch(source, model_path, out_dir, jobs=0, subtitle_formats=()):
+    base, recordings = find_recordings(source)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    files = manifest["files"]
+
+    pending = []
+    for audio_file in recordings:
+        stat = os.stat(audio_file)
+        entry = files.get(audio_file)
+        if entry and entry.get("status") == "done" and entry.get("size") == stat.st_size \
+                and entry.get("mtime") == stat.st_mtime:
+            continue
+        if entry and (entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime):
+            entry = None  # The recording changed; its partial output is worthless
+        output_path = os.path.join(out_dir, os.path.splitext(os.path.relpath(audio_file, base))[0] + '.jsonl')
+        if entry is None and os.path.exists(output_path + '.progress'):
+            os.remove(output_path + '.progress')
+        files[audio_file] = {"status": "pending", "size": stat.st_size, "mtime": stat.st_mtime,
+                             "outputs": [output_path]}
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        pending.append((audio_file, output_path))
+    save_manifest(manifest_path, manifest)
+
+    skipped = len(recordings) - len(pending)
+    print(json.dumps({"type": "batch", "files": len(recordings), "pending": len(pending), "skipped": skipped}),
+          flush=True)
+    if not pending:
+        return manifest
+
+    workers = min(jobs if jobs > 0 else (os.cpu_count() or 1), len(pending))
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_worker_model, initargs=(model_path,)) as pool:
+        futures = {}
+        for audio_file, output_path in pending:
+            futures[pool.submit(transcribe_job, audio_file, output_path, subtitle_formats)] = (audio_file, output_path)
+            files[audio_file]["status"] = "running"
+        save_manifest(manifest_path, manifest)
+
+        for future in as_completed(futures):
+            audio_file, output_path = futures[future]
+            entry = files[audio_file]
+            try:
+                entry.update(future.result())
+                entry["status"] = "done"
+                entry.pop("error", None)
+            except Exception as e:
+                failed += 1
+                entry["status"] = "failed"
+                entry["error"] = str(e)  # Its .progress file stays, so the next run continues from there
+            save_manifest(manifest_path, manifest)
+            print(json.dumps({"type": "file", "path": audio_file, "status": entry["status"],
+                              "error": entry.get("error")}), flush=True)
+
+    print(json.dumps({"type": "done", "transcribed": len(pending) - failed, "failed": failed,
+                      "skipped": skipped}), flush=True)
+    return manifest
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python wosk_batch.py <directory-or-glob> <model_path> <out_dir> "
+              "[--jobs N] [--srt] [--vtt]", file=sys.stderr)
+        sys.exit(1)
+    source, model_path, out_dir = sys.argv[1:4]
+    options = sys.argv[4:]
+    # --jobs N runs N worker processes, each with its own Model (default: one per core)
+    jobs = int(options[options.index('--jobs') + 1]) if '--jobs' in options else 0
+    formats = [fmt for fmt in ('srt', 'vtt') if f'--{fmt}' in options]
+    manifest = run_batch(source, model_path, out_dir, jobs, formats)
+    sys.exit(1 if any(entry["status"] == "failed" for entry in manifest["files"].values()) else 0)
@@ -1,25 +1,274 @@
+import os
 import sys
 import json
-import wave
+import mmap
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from vosk import Model, KaldiRecognizer
 
-def transcribe(audio_file, model_path):
-    wf = wave.open(audio_file, 'rb')
-    model = Model(model_path)
-    rec = KaldiRecognizer(model, wf.getframerate())
-    
-    results = []
-    while True:
-        data = wf.readframes(4000)
-        if len(data) == 0:
-            break
-        if rec.AcceptWaveform(data):
-            results.append(json.loads(rec.Result()))
-    
-    results.append(json.loads(rec.FinalResult()))
-    print(json.dumps(results))
+try:
+    from vosk import _ffi as vosk_ffi
+except ImportError:
+    vosk_ffi = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_vad import frame_energies
+from audio_resample import IngestConverter
+
+SEGMENT_SECONDS = 30      # Aim for segments about this long in parallel mode
+SPLIT_SEARCH_SECONDS = 5  # Look this far either side of each target for the quietest pause
+PAUSE_MS = 300            # Energy is averaged over this long, so cuts land in pauses, not between syllables
+SCAN_FRAME_MS = 10
+READ_FRAMES = 4000        # Frames handed to AcceptWaveform per call
+
+# ✅ MAPPED INPUT: the WAV data chunk is mmap'd and decoded from zero-copy slices
+
+class MappedWav:
+    """A PCM WAV file whose data chunk is exposed as a read-only memoryview"""
+
+    def __init__(self, audio_file):
+        self.file = open(audio_file, 'rb')
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = view = memoryview(self.mapping)
+        if view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+            self.close()
+            raise ValueError(f"{audio_file} is not a WAV file")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(view):
+            chunk_id = bytes(view[offset:offset + 4])
+            chunk_size = struct.unpack_from('<I', view, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack_from('<HHIIHH', view, body)
+            elif chunk_id == b'data':
+                # Streamed recordings may leave the size unset; trust the file length instead
+                end = min(body + chunk_size, len(view))
+                break
+            offset = body + chunk_size + (chunk_size & 1)
+        else:
+            self.close()
+            raise ValueError(f"{audio_file} has no data chunk")
+        if fmt is None or fmt[0] != 1:
+            self.close()
+            raise ValueError(f"{audio_file} is not PCM")
+
+        _, self.channels, self.rate, _, _, bits = fmt
+        if bits != 16:
+            # Vosk and the downmix path both read the samples as Int16
+            self.close()
+            raise ValueError(f"{audio_file} is {bits}-bit PCM; only 16-bit PCM is supported")
+        self.sampwidth = bits // 8
+        self.frame_bytes = self.sampwidth * self.channels
+        end -= (end - body) % self.frame_bytes
+        self.data = view[body:end]
+        self.frames = len(self.data) // self.frame_bytes
+
+    def close(self):
+        for view in (getattr(self, 'data', None), getattr(self, 'view', None)):
+            if view is not None:
+                view.release()
+        self.data = self.view = None
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass  # A caller still holds a slice; the mapping goes when that does
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def waveform_arg(view):
+    """Wrap a slice of the mapping for AcceptWaveform without copying it when possible"""
+    if vosk_ffi is not None:
+        return vosk_ffi.from_buffer(view)
+    return bytes(view)
+
+def decode_frames(rec, wav, start_frame, end_frame):
+    """Feed a frame range to the recognizer, yielding (frame the result ends at, result) as Vosk finalizes each result"""
+    step = READ_FRAMES * wav.frame_bytes
+    end = end_frame * wav.frame_bytes
+    # Vosk resamples by itself but needs mono; multi-channel files are downmixed at their own rate
+    downmix = IngestConverter(wav.rate, wav.channels, target_rate=wav.rate) if wav.channels > 1 else None
+    for offset in range(start_frame * wav.frame_bytes, end, step):
+        chunk_end = min(offset + step, end)
+        chunk = wav.data[offset:chunk_end]
+        if rec.AcceptWaveform(waveform_arg(chunk) if downmix is None else bytes(downmix.to_int16(chunk))):
+            result = json.loads(rec.Result())
+            yield result_end_frame(result, wav.rate, start_frame, offset // wav.frame_bytes,
+                                   chunk_end // wav.frame_bytes), result
+    yield end_frame, json.loads(rec.FinalResult())
+
+def result_end_frame(result, rate, start_frame, chunk_start, chunk_end):
+    """Where a finalized result's utterance ends: its last word, and never before the chunk that ended it.
+
+    Audio after the endpoint inside the same chunk already belongs to the next
+    utterance, so a resume must start here rather than at the chunk's end.
+    """
+    words = result.get('result')
+    if not words:
+        return chunk_start
+    return max(chunk_start, min(chunk_end, start_frame + int(words[-1]['end'] * rate)))
+
+def offset_words(result, seconds):
+    """Shift word times of a result decoded from part of a file to their position in the whole file"""
+    for word in result.get('result', []):
+        word['start'] = round(word['start'] + seconds, 3)
+        word['end'] = round(word['end'] + seconds, 3)
+    return result
+
+# ✅ STREAMING OUTPUT: every writer gets each result as soon as it exists
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, result):
+        self.stream.write(json.dumps(result) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+def format_timestamp(seconds, separator):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+class SubtitleWriter:
+    """One cue per result, timed by its first and last word; SRT by default, WebVTT with vtt=True"""
+
+    def __init__(self, path, vtt=False):
+        self.stream = open(path, 'w', encoding='utf-8')
+        self.vtt = vtt
+        self.cues = 0
+        if vtt:
+            self.stream.write("WEBVTT\n\n")
+
+    def write(self, result):
+        words = result.get('result')
+        if not words:
+            return
+        self.cues += 1
+        separator = '.' if self.vtt else ','
+        start = format_timestamp(words[0]['start'], separator)
+        end = format_timestamp(words[-1]['end'], separator)
+        if not self.vtt:
+            self.stream.write(f"{self.cues}\n")
+        self.stream.write(f"{start} --> {end}\n{result['text']}\n\n")
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+def transcribe(audio_file, model_path, jobs=1, writers=None):
+    writers = writers or [JsonLinesWriter(sys.stdout)]
+    try:
+        if jobs != 1 and transcribe_parallel(audio_file, model_path, jobs, writers):
+            return
+
+        model = Model(model_path)
+        with MappedWav(audio_file) as wav:
+            rec = KaldiRecognizer(model, wav.rate)
+            rec.SetWords(True)
+            for _, result in decode_frames(rec, wav, 0, wav.frames):
+                if result.get('text'):
+                    for writer in writers:
+                        writer.write(result)
+    finally:
+        for writer in writers:
+            writer.close()
+
+# ✅ PARALLEL MODE: split at pauses, decode segments in a process pool, stitch in order
+
+def find_split_points(wav):
+    """Frame offsets to cut the file at, chosen in the quietest pause near every SEGMENT_SECONDS"""
+    import numpy as np
+
+    if wav.frames < wav.rate * SEGMENT_SECONDS * 2:
+        return []
+    scan_frames = max(1, wav.rate * SCAN_FRAME_MS // 1000)
+
+    # One energy value per 10ms, scanned a block at a time straight from the mapping
+    samples = np.frombuffer(wav.data, dtype=np.int16)
+    block = scan_frames * wav.channels * 1000
+    energies = np.concatenate([frame_energies(samples[start:start + block], scan_frames * wav.channels)
+                               for start in range(0, len(samples), block)])
+    del samples  # Holds a pointer into the mapping
+
+    width = max(1, PAUSE_MS // SCAN_FRAME_MS)
+    smoothed = np.convolve(energies, np.ones(width) / width, mode='same')
+
+    per_second = 1000 // SCAN_FRAME_MS
+    search = SPLIT_SEARCH_SECONDS * per_second
+    splits = []
+    target = SEGMENT_SECONDS * per_second
+    while target + search < len(smoothed):
+        window = smoothed[target - search:target + search]
+        cut = target - search + int(np.argmin(window))
+        splits.append(cut * scan_frames)
+        target = cut + SEGMENT_SECONDS * per_second
+    return splits
+
+worker_model = None  # One Model per pool process, loaded by load_worker_model
+
+def load_worker_model(model_path):
+    global worker_model
+    worker_model = Model(model_path)
+
+def transcribe_segment(audio_file, start_frame, end_frame):
+    """Decode one segment in a worker; word times are shifted to the position in the whole file"""
+    with MappedWav(audio_file) as wav:
+        offset = start_frame / wav.rate
+        rec = KaldiRecognizer(worker_model, wav.rate)
+        rec.SetWords(True)
+
+        stitched = []
+        for _, result in decode_frames(rec, wav, start_frame, end_frame):
+            if not result.get('text'):
+                continue  # Every segment ends with a FinalResult; most cuts leave it empty
+            stitched.append(offset_words(result, offset))
+    return stitched
+
+def transcribe_parallel(audio_file, model_path, jobs, writers):
+    """Decode pause-aligned segments with one Model per worker; False when the file is too short to split"""
+    with MappedWav(audio_file) as wav:
+        splits = find_split_points(wav)
+        total_frames = wav.frames
+    if not splits:
+        return False
+    bounds = [0] + splits + [total_frames]
+
+    workers = min(jobs if jobs > 0 else (os.cpu_count() or 1), len(bounds) - 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_worker_model, initargs=(model_path,)) as pool:
+        # map() yields in segment order, so each segment is written as soon as those before it are
+        segments = pool.map(transcribe_segment, [audio_file] * (len(bounds) - 1), bounds[:-1], bounds[1:])
+        for segment_results in segments:
+            for result in segment_results:
+                for writer in writers:
+                    writer.write(result)
+    return True
 
 if __name__ == "__main__":
     audio_file = sys.argv[1]
     model_path = sys.argv[2]
-    transcribe(audio_file, model_path)
\ No newline at end of file
+    options = sys.argv[3:]
+
+    def option(flag):
+        return options[options.index(flag) + 1] if flag in options else None
+
+    # --jobs N decodes in parallel on N processes (0 = one per core)
+    jobs = int(option('--jobs') or 1)
+    # Results always stream to stdout as JSON Lines; --srt/--vtt also write subtitles as they go
+    writers = [JsonLinesWriter(sys.stdout)]
+    if option('--srt'):
+        writers.append(SubtitleWriter(option('--srt')))
+    if option('--vtt'):
+        writers.append(SubtitleWriter(option('--vtt'), vtt=True))
+    transcribe(audio_file, model_path, jobs, writers)
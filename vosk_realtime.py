@@ -1,7 +1,36 @@
 #!/usr/bin/env python3
 """
-COMPLETELY FIXED vosk_realtime.py - Handles audio data correctly
-This version properly validates and processes Int16 PCM audio data from JavaScript
+vosk_realtime.py - Streaming Vosk recognizer for the Electron app
+
+Loads a Vosk model once and decodes 16kHz Int16 PCM as it arrives, printing
+one JSON line per partial, final, flow-control or session message. Each
+stream runs on an asyncio engine: a reader thread pulls frames from the audio
+source, a decoder thread feeds them to the recognizer (coalescing whatever
+queued up while it was busy), and a single writer emits the results.
+
+Audio sources:
+  stdin (default)      length-prefixed v1 frames, or v2 batches once the
+                       sender has seen the hello line - sequence numbers,
+                       capture timestamps, stream ids and control messages
+  --shm-ring <path>    PCM in a memory-mapped SharedAudioRing; stdin only
+                       carries the writer's cursor as wake-ups, and
+                       control messages
+  --serve <socket>     a Unix domain socket server: every connection speaks
+                       the stdin protocol and gets its own recognizer, all on
+                       one model and one decoder pool (--workers N)
+
+Options:
+  --persistent                 keep the model across sessions, driven by
+                               START/STOP/RESET control messages
+  --coalesce-ms N              most audio merged into one decode while behind
+  --partial-interval-ms N      least time between two partials
+  --vad                        skip silent chunks with the energy gate
+                               (--vad-threshold-db N, --vad-hangover-ms N)
+  --whisper-finals <size>      revise each Vosk final with faster-whisper
+
+main.js builds these flags from the environment: MLA_SHARED_AUDIO_RING=1
+selects --shm-ring, MLA_WHISPER_FINALS=<size> passes --whisper-finals, and
+MLA_VOSK_VAD=1 (with MLA_VOSK_VAD_DB) turns on the gate.
 """
 
 import sys
@@ -10,10 +39,18 @@ import struct
 import os
 import logging
 import traceback
-import threading
-import queue
 import time
+import asyncio
+import itertools
 import platform
+import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_transport import (open_audio_source, protocol_hello, stream_label, FlowControl, FrameReader,
+                             ControlMessage, STREAM_MICROPHONE)
+from audio_resample import IngestConverter, ConvertedFrame
+from audio_vad import EnergyGate, GATE_CLOSED, GATE_SILENCE, THRESHOLD_DBFS, HANGOVER_MS
 
 # Enhanced logging setup
 logging.basicConfig(
@@ -69,70 +106,6 @@ def validate_audio_data(data, expected_length):
     except struct.error as e:
         return False, f"Invalid 16-bit PCM format: {e}"
 
-# ✅ ENHANCED: Platform-specific reading with better error handling
-def read_with_timeout(stream, size, timeout=3.0):
-    """Read from stream with timeout and enhanced error handling"""
-    current_platform = platform.system()
-    start_time = time.time()
-    data = b''
-    
-    try:
-        if current_platform == 'Windows':
-            # Windows: Use simple blocking reads with chunking
-            while len(data) < size and (time.time() - start_time) < timeout:
-                try:
-                    remaining = size - len(data)
-                    chunk_size = min(remaining, 8192)  # 8KB chunks
-                    chunk = stream.read(chunk_size)
-                    if not chunk:
-                        log_debug(f"Windows: No more data available after {len(data)} bytes")
-                        break
-                    data += chunk
-                    
-                    # Brief pause to prevent CPU spinning
-                    if len(data) < size:
-                        time.sleep(0.001)
-                        
-                except Exception as e:
-                    log_error(f"Windows read error after {len(data)} bytes: {e}")
-                    break
-                    
-        else:
-            # Unix/Linux/macOS: Use select for non-blocking reads
-            try:
-                import select
-                while len(data) < size and (time.time() - start_time) < timeout:
-                    ready, _, _ = select.select([stream], [], [], 0.1)
-                    if ready:
-                        remaining = size - len(data)
-                        chunk = stream.read(min(remaining, 8192))
-                        if not chunk:
-                            log_debug(f"Unix: No more data available after {len(data)} bytes")
-                            break
-                        data += chunk
-                    else:
-                        time.sleep(0.01)  # Brief pause when no data ready
-                        
-            except ImportError:
-                log_debug("select not available, using blocking read")
-                try:
-                    data = stream.read(size)
-                except Exception as e:
-                    log_error(f"Blocking read error: {e}")
-                    return b''
-            except Exception as e:
-                log_error(f"Unix read error: {e}")
-                return b''
-    
-    except Exception as e:
-        log_error(f"Unexpected read error: {e}")
-        return b''
-    
-    if len(data) != size:
-        log_debug(f"Read {len(data)} of {size} bytes requested (timeout: {timeout:.1f}s)")
-    
-    return data
-
 # ✅ VOSK SETUP with comprehensive error handling
 try:
     import vosk
@@ -155,6 +128,13 @@ try:
             log_error(f"Could not import any recognizer class: {e}")
             raise
 
+    # cffi handle used to pass frame buffers to Vosk without copying them into bytes
+    try:
+        from vosk import _ffi as vosk_ffi
+    except ImportError:
+        vosk_ffi = None
+        log_debug("vosk._ffi not available, frames will be copied before decoding")
+
     # Reduce Vosk logging noise
     try:
         SetLogLevel(-1)
@@ -172,12 +152,29 @@ except ImportError as e:
 
 # ✅ ENHANCED: Argument validation
 if len(sys.argv) < 2:
-    error_msg = "Usage: python vosk_realtime.py <model_path>"
+    error_msg = ("Usage: python vosk_realtime.py <model_path> [--persistent] "
+                 "[--coalesce-ms N] [--partial-interval-ms N] [--vad [--vad-threshold-db N] [--vad-hangover-ms N]] "
+                 "[--whisper-finals <model_size>] [--shm-ring <path> | --serve <socket_path> [--workers N]]")
     print(json.dumps({"type": "error", "error": error_msg}), flush=True)
     logging.error(error_msg)
     sys.exit(1)
 
 model_path = sys.argv[1]
+
+# Persistent mode: keep the model loaded across sessions and take START/STOP/RESET control messages
+persistent_mode = '--persistent' in sys.argv[2:]
+
+def option_value(flag):
+    """Return the value following a command-line flag, or None"""
+    options = sys.argv[2:]
+    if flag in options:
+        index = options.index(flag)
+        if index + 1 < len(options):
+            return options[index + 1]
+    return None
+
+# Server mode: one loaded model shared by many client streams on a Unix domain socket
+serve_path = option_value('--serve')
 log_info(f"Loading Vosk model from: {model_path}")
 
 if not os.path.exists(model_path):
@@ -192,13 +189,9 @@ if not os.path.isdir(model_path):
     logging.error(error_msg)
     sys.exit(1)
 
-# ✅ ENHANCED: Model and recognizer initialization
-try:
-    log_info("Loading Vosk model...")
-    model = Model(model_path)
-    log_info("Model loaded successfully")
-    
-    # Create recognizer with proper configuration
+# ✅ ENHANCED: Recognizer construction - cheap next to loading the model, so sessions can redo it
+def create_recognizer(model):
+    """Create a 16kHz recognizer on an already loaded model"""
     if recognizer_class.__name__ == 'KaldiRecognizer':
         # Old Vosk API
         rec = recognizer_class(model, 16000)
@@ -219,9 +212,22 @@ try:
         # New Vosk API
         rec = recognizer_class(model, 16000)
         log_info("Created Recognizer (new API) with 16kHz sample rate")
+    return rec
+
+# ✅ ENHANCED: Model and recognizer initialization
+try:
+    log_info("Loading Vosk model...")
+    model_load_start = time.perf_counter()
+    model = Model(model_path)
+    log_info(f"Model loaded successfully in {time.perf_counter() - model_load_start:.2f}s")
     
-    log_info("Vosk recognizer initialized and configured successfully")
-    print("VOSK_READY", flush=True)
+    if serve_path is None:
+        rec = create_recognizer(model)
+        
+        log_info("Vosk recognizer initialized and configured successfully")
+        # Advertise the wire protocols we read before the ready line so the sender can switch to v2
+        print(json.dumps(protocol_hello(sample_rate=16000, persistent=persistent_mode)), flush=True)
+        print("VOSK_READY", flush=True)
     
 except Exception as e:
     error_msg = f"Failed to initialize Vosk: {str(e)}"
@@ -230,334 +236,998 @@ except Exception as e:
     log_error(f"Initialization traceback: {traceback.format_exc()}")
     sys.exit(1)
 
-# ✅ ENHANCED: Audio processing with statistics tracking
+def waveform_arg(view):
+    """Wrap a frame view for AcceptWaveform without copying it when possible"""
+    if vosk_ffi is not None:
+        return vosk_ffi.from_buffer(view)
+    return bytes(view)
+
+# ✅ ASYNCIO ENGINE: reader, decoder, writer and reporter coroutines on one event loop
 current_platform = platform.system()
-audio_queue = queue.Queue(maxsize=50)  # Reasonable queue size for all platforms
-processing_active = True
-
-# Enhanced statistics tracking
-stats = {
-    'chunks_received': 0,
-    'chunks_processed': 0,
-    'chunks_dropped': 0,
-    'bytes_received': 0,
-    'successful_recognitions': 0,
-    'partial_results': 0,
-    'validation_errors': 0,
-    'processing_errors': 0,
-    'empty_results': 0
-}
-
-def audio_processor():
-    """Enhanced audio processor with comprehensive error handling and validation"""
-    global processing_active, stats
-    
-    log_info(f"Audio processor thread started ({current_platform} mode)")
-    
-    while processing_active:
-        try:
-            # Get audio data from queue
-            try:
-                audio_data = audio_queue.get(timeout=1.0)
-            except queue.Empty:
-                continue
-                
-            if audio_data is None:  # Shutdown signal
-                log_debug("Received shutdown signal")
-                break
-                
-            stats['chunks_processed'] += 1
-            
-            # ✅ CRITICAL: Validate audio data format
-            is_valid, validation_msg = validate_audio_data(audio_data, len(audio_data))
-            if not is_valid:
-                log_error(f"Audio validation failed for chunk #{stats['chunks_processed']}: {validation_msg}")
-                stats['validation_errors'] += 1
-                audio_queue.task_done()
-                continue
-            
-            # Enhanced debugging for first few chunks
-            if stats['chunks_processed'] <= 10:
-                log_debug(f"Processing chunk #{stats['chunks_processed']}: {validation_msg}")
-                
-                # Analyze audio content
-                try:
-                    sample_count = len(audio_data) // 2
-                    samples = struct.unpack(f'<{min(sample_count, 10)}h', audio_data[:20])
-                    max_sample = max(abs(s) for s in samples)
-                    avg_sample = sum(abs(s) for s in samples) / len(samples)
-                    
-                    log_debug(f"Audio analysis: max={max_sample}/32767, avg={avg_sample:.1f}")
-                    
-                    if max_sample == 0:
-                        log_debug("⚠️ SILENT AUDIO detected!")
-                    elif max_sample < 100:
-                        log_debug("⚠️ Very low audio level")
-                    else:
-                        log_debug("✅ Good audio level detected")
-                        
-                except Exception as e:
-                    log_debug(f"Could not analyze audio samples: {e}")
-            
-            # ✅ VOSK PROCESSING with enhanced error handling
+AUDIO_QUEUE_SIZE = 50  # Reasonable queue size for all platforms
+STATUS_INTERVAL = 30.0  # Seconds between periodic status reports
+COALESCE_TARGET_MS = 200  # Most audio merged into one AcceptWaveform call while behind
+BYTES_PER_MS = 32  # 16kHz mono Int16
+coalesce_ms = float(option_value('--coalesce-ms') or COALESCE_TARGET_MS)  # 0 disables coalescing
+PARTIAL_INTERVAL_MS = 150  # Least time between two partials; a held-back partial goes out when it ends
+partial_interval_ms = float(option_value('--partial-interval-ms') or PARTIAL_INTERVAL_MS)
+SILENCE_MARKER_MS = 500  # Zeros fed once the VAD gate closes, enough trailing silence for Vosk's endpointer
+MAX_UTTERANCE_SECONDS = 30  # Whisper's window; longer utterances keep their Vosk final
+
+def create_vad_gate():
+    """Energy gate for one stream when --vad is given; None decodes everything"""
+    if '--vad' not in sys.argv[2:]:
+        return None
+    try:
+        return EnergyGate(sample_rate=16000,
+                          threshold_dbfs=float(option_value('--vad-threshold-db') or THRESHOLD_DBFS),
+                          hangover_ms=float(option_value('--vad-hangover-ms') or HANGOVER_MS))
+    except ImportError:
+        log_error("NumPy is not installed - VAD gate disabled, decoding all audio")
+        return None
+
+def create_finalizer():
+    """Whisper re-decoder for finished utterances when --whisper-finals is given; None keeps Vosk finals"""
+    model_size = option_value('--whisper-finals')
+    if model_size is None:
+        return None
+    try:
+        import numpy  # noqa: F401 - needed to hand PCM to faster-whisper
+        import faster_whisper  # noqa: F401
+    except ImportError as e:
+        log_error(f"Whisper finals disabled, missing dependency: {e}")
+        return None
+    from whisper_finals import WhisperFinalizer
+    log_info(f"Whisper finals enabled with model '{model_size}' (loading in the background)")
+    return WhisperFinalizer(model_size, log_error=log_error)
+
+class VoskEngine:
+    """Stream frames from the audio source through the recognizer.
+
+    Each stage is its own coroutine: read_frames pulls frames off the source
+    on a reader thread, decode_frames runs AcceptWaveform on a dedicated decoder
+    thread, write_output is the only writer of stdout, and report_status logs
+    periodically. Shutdown is explicit - EOF queues a sentinel behind the
+    remaining audio, the decoder drains it, and only then is FinalResult taken
+    and the writer and reporter cancelled.
+
+    In persistent mode control messages travel through the audio queue, so they
+    apply exactly between the frames they were sent between. STOP and RESET
+    flush FinalResult() and reset the recognizer right away, which leaves START
+    with nothing to do but flip the session on.
+
+    Under VoskServer each connection gets its own engine writing to its socket
+    and sharing the server's decoder pool. An engine never has more than one
+    decode in flight, which keeps its recognizer single-threaded and lets the
+    pool's FIFO queue serve the connections round-robin.
+
+    When the decoder falls behind, frames already waiting in the queue are
+    merged into one buffer (up to coalesce_ms of audio) and decoded with a
+    single AcceptWaveform/PartialResult round trip. A caught-up decoder finds
+    the queue empty and keeps decoding each small frame on its own.
+
+    Partials go out at most once per partial_interval_ms and only when their
+    text changed. A partial held back by the throttle goes out when the
+    interval ends, even if no more audio arrives, or right before the final
+    that ends its utterance if that comes first.
+
+    With a VAD gate, pure-silence chunks are never decoded. When the gate
+    closes after speech a short block of zeros stands in for the pause, so
+    Vosk's endpointing still produces the final.
+
+    Every final carries an utterance id. With a WhisperFinalizer the audio Vosk
+    heard since the previous final is kept, and each final's audio is handed to
+    faster-whisper once the final is out; its text comes back as a second final
+    with the same id and "revision": true, which replaces Vosk's in place.
+
+    v2 frames carry a stream id (microphone "me", system audio "them"). The
+    engine reading the source decodes its own stream and starts a lane - another
+    VoskEngine with its own recognizer and decoder thread over the same Model -
+    the first time a frame arrives for any other id. Lanes share the reader,
+    flow control and output, get every control message, and tag their results
+    with their stream name, so both sides of a call decode concurrently in one
+    process.
+    """
+
+    def __init__(self, model, recognizer, frame_reader, persistent=False, decoder_pool=None, output=None,
+                 coalesce_ms=COALESCE_TARGET_MS, partial_interval_ms=PARTIAL_INTERVAL_MS, vad_gate=None,
+                 finalizer=None, stream_id=STREAM_MICROPHONE, parent=None):
+        self.model = model
+        self.rec = recognizer
+        self.frame_reader = frame_reader
+        self.persistent = persistent
+        self.output = output
+        self.active = True
+        self.session = 1
+        self.session_bytes = 0
+        self.coalesce_ms = coalesce_ms
+        self.coalesce_bytes = max(0, int(coalesce_ms * BYTES_PER_MS))
+        self.coalesce_buffer = bytearray(self.coalesce_bytes)
+        self.partial_interval_ms = partial_interval_ms
+        self.partial_interval = partial_interval_ms / 1000.0
+        self.last_partial_json = None   # Raw PartialResult(), so unchanged partials skip json.loads
+        self.emitted_partial = ''
+        self.pending_partial = None
+        self.last_partial_time = 0.0
+        self.partial_timer = None      # Trailing flush of a held-back partial
+        self.partial_info = None       # Frame timing of the audio that produced it
+        self.decoding = False          # Decoder-thread work in flight; it owns the partial state meanwhile
+        self.vad_gate = vad_gate
+        self.converter = IngestConverter(getattr(frame_reader, 'sample_rate', 16000),
+                                         getattr(frame_reader, 'channels', 1), frame_reader.sample_format)
+        self.silence_marker = bytes(SILENCE_MARKER_MS * BYTES_PER_MS)
+        self.finalizer = finalizer
+        # Utterance ids are numbered across all streams, so a revision always names one utterance
+        self.utterance_ids = parent.utterance_ids if parent is not None else itertools.count(1)
+        self.utterance = 0
+        self.utterance_audio = bytearray()
+        self.utterance_too_long = False
+        self.finished_utterances = deque()  # (id, pcm) from the decoder thread, waiting for Whisper
+        self.revision_tasks = set()
+        self.stream_id = stream_id
+        self.stream = stream_label(stream_id)
+        self.parent = parent
+        self.lanes = {}        # stream id -> VoskEngine, on the engine reading the source
+        self.lane_tasks = []
+        self.stream_active = True  # Session state as of the last control message read, for new lanes
+        self.flow_control = FlowControl(capacity=AUDIO_QUEUE_SIZE)
+        self.stats = {
+            'chunks_received': 0,
+            'chunks_processed': 0,
+            'chunks_dropped': 0,
+            'bytes_received': 0,
+            'successful_recognitions': 0,
+            'partial_results': 0,
+            'validation_errors': 0,
+            'processing_errors': 0,
+            'empty_results': 0,
+            'idle_chunks': 0,
+            'sessions': 1,
+            'decode_calls': 0,
+            'coalesced_chunks': 0,
+            'partials_suppressed': 0,
+            'revisions_sent': 0
+        }
+        self.loop = None
+        self.audio_queue = None
+        self.output_queue = None
+        self.flow_retry = None
+        self.reader_thread = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk-reader")
+                              if parent is None else None)
+        self.owns_decoder = decoder_pool is None
+        self.decoder_thread = decoder_pool or ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk-decoder")
+        # Socket writes can block on a slow client; they must not stall the loop other connections share
+        self.writer_thread = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk-writer")
+                              if output is not None and parent is None else None)
+
+    # --- output ---------------------------------------------------------------
+
+    def emit(self, output):
+        self.output_queue.put_nowait(output)
+
+    def emit_result(self, output, info=None):
+        """Queue a result or session message, tagged with the stream it belongs to"""
+        output["stream"] = self.stream
+        self.emit(self.add_frame_timing(output, info))
+
+    def add_frame_timing(self, output, info):
+        """Attach the v2 sequence number and capture-to-result latency to an output message"""
+        if info is not None:
+            output["seq"] = info.seq
+            latency_ms = self.frame_reader.capture_latency_ms(info)
+            if latency_ms is not None:
+                output["latency_ms"] = round(latency_ms, 1)
+        return output
+
+    def report_flow(self, force=False):
+        """Send the sender a credit update if one is due"""
+        if self.parent is not None:
+            self.parent.report_flow(force)  # One sender, one set of credits for all streams
+            return
+        # The fullest stream's queue limits what the sender may still write
+        queue_depth = max(lane.audio_queue.qsize() for lane in self.all_lanes())
+        message = self.flow_control.update(queue_depth, self.stats['chunks_received'],
+                                           self.stats['chunks_dropped'],
+                                           lost=getattr(self.frame_reader, 'lost_frames', 0), force=force)
+        if message is not None:
+            self.emit(message)
+        elif queue_depth == 0 and self.flow_retry is None:
+            # Drained while rate-limited: a sender waiting on credits must still hear about it
+            self.flow_retry = self.loop.call_later(self.flow_control.min_interval, self.retry_flow_report)
+
+    def retry_flow_report(self):
+        self.flow_retry = None
+        self.report_flow(force=True)
+
+    def send_line(self, line):
+        self.output.write(line.encode('utf-8') + b'\n')
+        self.output.flush()
+
+    async def write_output(self):
+        """Sole writer of stdout (or the connection), so result lines never interleave"""
+        while True:
+            output = await self.output_queue.get()
             try:
-                if rec.AcceptWaveform(audio_data):
-                    # Final result
-                    result_json = rec.Result()
-                    
-                    try:
-                        result = json.loads(result_json)
-                    except json.JSONDecodeError as e:
-                        log_error(f"JSON decode error in final result: {e}")
-                        log_error(f"Raw result: {result_json}")
-                        stats['processing_errors'] += 1
-                        audio_queue.task_done()
-                        continue
-                    
-                    text = result.get('text', '').strip()
-                    if text:
-                        output = {
-                            "type": "final", 
-                            "text": text,
-                            "confidence": result.get('conf', result.get('confidence', 0.0))
-                        }
-                        print(json.dumps(output), flush=True)
-                        stats['successful_recognitions'] += 1
-                        log_info(f"✅ FINAL result #{stats['successful_recognitions']}: '{text}' (confidence: {output['confidence']:.3f})")
-                    else:
-                        stats['empty_results'] += 1
-                        # Log empty final results occasionally
-                        if stats['empty_results'] % 50 == 1:
-                            log_debug(f"Empty final result #{stats['empty_results']} for chunk #{stats['chunks_processed']}")
-                        
+                if self.output is None:
+                    print(json.dumps(output), flush=True)
                 else:
-                    # Partial result
-                    partial_json = rec.PartialResult()
-                    
-                    try:
-                        partial = json.loads(partial_json)
-                    except json.JSONDecodeError as e:
-                        log_error(f"JSON decode error in partial result: {e}")
-                        stats['processing_errors'] += 1
-                        audio_queue.task_done()
-                        continue
-                    
-                    partial_text = partial.get('partial', '').strip()
-                    if partial_text:
-                        output = {
-                            "type": "partial", 
-                            "text": partial_text
-                        }
-                        print(json.dumps(output), flush=True)
-                        stats['partial_results'] += 1
-                        
-                        # Log partial results occasionally to avoid spam
-                        if stats['partial_results'] % 25 == 1:
-                            log_debug(f"📝 Partial #{stats['partial_results']}: '{partial_text[:50]}{'...' if len(partial_text) > 50 else ''}'")
-                    else:
-                        # Log processing status occasionally
-                        if stats['chunks_processed'] % 100 == 0:
-                            log_debug(f"Processed {stats['chunks_processed']} chunks, no current partial recognition")
-                
-            except Exception as vosk_error:
-                log_error(f"Vosk processing error for chunk #{stats['chunks_processed']}: {vosk_error}")
-                log_error(f"Vosk error traceback: {traceback.format_exc()}")
-                stats['processing_errors'] += 1
-                audio_queue.task_done()
-                continue
-                
-            # Mark task as done
-            audio_queue.task_done()
-            
-            # Periodic comprehensive status reporting
-            if stats['chunks_processed'] % 100 == 0:
-                log_info(f"📊 Processor status: {stats['chunks_processed']} processed, "
-                        f"{stats['successful_recognitions']} final, "
-                        f"{stats['partial_results']} partial, "
-                        f"{stats['validation_errors']} validation errors, "
-                        f"{stats['processing_errors']} processing errors, "
-                        f"queue: {audio_queue.qsize()}")
-                
-        except Exception as e:
-            log_error(f"Audio processor thread error: {e}")
-            log_error(f"Processor error traceback: {traceback.format_exc()}")
-            stats['processing_errors'] += 1
-            try:
-                audio_queue.task_done()
-            except:
-                pass
-            continue
-    
-    log_info(f"Audio processor thread ending. Final stats: {json.dumps(stats, indent=2)}")
+                    await self.loop.run_in_executor(self.writer_thread, self.send_line, json.dumps(output))
+            except Exception as e:
+                log_error(f"Output write error: {e}")
+            finally:
+                self.output_queue.task_done()
 
-# ✅ START PROCESSOR THREAD
-processor_thread = threading.Thread(target=audio_processor, daemon=True)
-processor_thread.start()
-log_info(f"Audio processor thread started for {current_platform}")
+    # --- reading --------------------------------------------------------------
 
-# ✅ ENHANCED: Main loop with comprehensive error handling
-log_info(f"Starting main audio reading loop on {current_platform}")
-log_info("Expecting Int16 PCM audio data from JavaScript")
+    async def read_frames(self):
+        """Pull frames from the source until EOF and queue them for decoding"""
+        stats = self.stats
+        while True:
+            try:
+                # Blocking read on the reader thread; returns None on EOF
+                frame = await self.loop.run_in_executor(self.reader_thread, self.frame_reader.next_frame)
+            except (OSError, ValueError) as e:
+                log_error(f"Audio source read error: {e}")
+                break
 
-try:
-    while True:
-        try:
-            # ✅ UNIVERSAL: Read length header (4 bytes)
-            length_bytes = read_with_timeout(sys.stdin.buffer, 4, timeout=3.0)
-            
-            if not length_bytes or len(length_bytes) == 0:
+            if frame is None:
                 log_info("EOF received, shutting down gracefully")
                 break
-                
-            if len(length_bytes) < 4:
-                log_error(f"Incomplete length header: got {len(length_bytes)} bytes")
-                continue
-            
-            try:
-                length = struct.unpack('<I', length_bytes)[0]
-            except struct.error as e:
-                log_error(f"Failed to unpack length header: {e}")
-                log_error(f"Raw header bytes: {length_bytes.hex()}")
-                continue
-            
-            # ✅ ENHANCED: Length validation with detailed reporting
-            min_length = 20   # At least 10 Int16 samples
-            max_length = 1000000  # 1MB max (500k samples)
-            
-            if length < min_length:
-                log_error(f"Audio chunk too small: {length} bytes (minimum: {min_length})")
-                continue
-                
-            if length > max_length:
-                log_error(f"Audio chunk too large: {length} bytes (maximum: {max_length})")
-                continue
-            
-            # ✅ UNIVERSAL: Read audio data
-            audio_data = read_with_timeout(sys.stdin.buffer, length, timeout=5.0)
-            
-            if not audio_data:
-                log_error("Failed to read audio data")
-                continue
-                
-            actual_length = len(audio_data)
-            if actual_length != length:
-                log_error(f"Length mismatch: expected {length}, got {actual_length}")
+
+            if isinstance(frame, ControlMessage):
+                # Never dropped, and ordered with the audio around it on every stream
+                command = self.control_command(frame.message)
+                if command in ('start', 'stop'):
+                    self.stream_active = command == 'start'
+                for lane in self.all_lanes():
+                    await lane.audio_queue.put(frame)
                 continue
-            
+
+            buffer, length, info = frame
+            audio_data = memoryview(buffer)[:length]
+
+            # Counted before conversion so flow-control credits match the frames the sender wrote
             stats['chunks_received'] += 1
-            stats['bytes_received'] += len(audio_data)
-            
+            stats['bytes_received'] += length
+
+            # Vosk decodes 16kHz mono Int16; anything else is downmixed and resampled here
+            if self.converter.needs_conversion(info):
+                try:
+                    converted = self.converter.to_int16(audio_data, info)
+                except ImportError:
+                    log_error("NumPy is required to convert non-16kHz/mono/Int16 frames; dropping frame")
+                    stats['validation_errors'] += 1
+                    converted = None
+                self.frame_reader.release(buffer)
+                if not converted:
+                    continue  # Dropped, or the resampler needs more input before its next output sample
+                buffer, length = converted, len(converted)
+                frame = (buffer, length, info)
+                audio_data = memoryview(buffer)
+
             # ✅ ENHANCED: Pre-queue validation
             is_valid, validation_msg = validate_audio_data(audio_data, length)
             if not is_valid:
                 log_error(f"Pre-queue validation failed for chunk #{stats['chunks_received']}: {validation_msg}")
                 stats['validation_errors'] += 1
+                self.release_frame(buffer)
                 continue
-            
+
+            # Each stream decodes on its own recognizer
+            lane = self
+            if info is not None and info.stream_id != self.stream_id:
+                lane = self.lanes.get(info.stream_id) or await self.add_lane(info.stream_id)
+
             # ✅ ENHANCED: Queue management with detailed reporting
             try:
-                audio_queue.put_nowait(audio_data)
-                
+                lane.audio_queue.put_nowait(frame)
+
                 # Enhanced logging for first chunks and periodically
                 if stats['chunks_received'] <= 10 or stats['chunks_received'] % 50 == 0:
-                    sample_count = len(audio_data) // 2
-                    log_info(f"✅ Queued chunk #{stats['chunks_received']}: {len(audio_data)} bytes, "
-                            f"{sample_count} samples, queue size: {audio_queue.qsize()}")
-                    
-            except queue.Full:
+                    log_info(f"✅ Queued chunk #{stats['chunks_received']}: {length} bytes, "
+                             f"{length // 2} samples, queue size: {lane.audio_queue.qsize()}")
+
+                self.report_flow()
+
+            except asyncio.QueueFull:
+                self.release_frame(buffer)
                 stats['chunks_dropped'] += 1
+                self.report_flow(force=True)
                 if stats['chunks_dropped'] % 10 == 1:
                     log_error(f"❌ Audio queue full! Dropped chunk #{stats['chunks_received']}. "
-                             f"Total drops: {stats['chunks_dropped']}")
+                              f"Total drops: {stats['chunks_dropped']}")
                     log_error(f"Queue might be backing up - processor may be too slow")
-                
-        except KeyboardInterrupt:
-            log_info("Keyboard interrupt received")
-            break
-        except EOFError:
-            log_info("EOF on stdin")
-            break
-        except Exception as e:
-            log_error(f"Main loop error: {e}")
-            log_error(f"Main loop traceback: {traceback.format_exc()}")
-            
-            # Platform-specific error handling
-            if current_platform == 'Windows':
-                if "WinError" in str(e) or "socket" in str(e).lower():
-                    log_error("Windows pipe error detected, stopping main loop")
+
+    def release_frame(self, buffer):
+        """Hand a frame's buffer back to the reader, unless the converter made it"""
+        if not isinstance(buffer, ConvertedFrame):
+            self.frame_reader.release(buffer)
+
+    # --- streams --------------------------------------------------------------
+
+    def all_lanes(self):
+        return [self, *self.lanes.values()]
+
+    async def add_lane(self, stream_id):
+        """Start decoding a stream id seen for the first time on a recognizer of its own"""
+        rec = await self.loop.run_in_executor(self.reader_thread, create_recognizer, self.model)
+        lane = VoskEngine(self.model, rec, self.frame_reader, persistent=self.persistent,
+                          decoder_pool=None if self.owns_decoder else self.decoder_thread,
+                          output=self.output, coalesce_ms=self.coalesce_ms,
+                          partial_interval_ms=self.partial_interval_ms,
+                          vad_gate=create_vad_gate() if self.vad_gate is not None else None,
+                          finalizer=self.finalizer, stream_id=stream_id, parent=self)
+        lane.loop = self.loop
+        lane.audio_queue = asyncio.Queue(maxsize=AUDIO_QUEUE_SIZE)
+        lane.output_queue = self.output_queue
+        lane.active = self.stream_active
+        self.lanes[stream_id] = lane
+        self.lane_tasks.append(asyncio.create_task(lane.decode_frames(), name=f"vosk-decoder-{lane.stream}"))
+        log_info(f"🎙️ Stream {stream_id} ('{lane.stream}') started on its own recognizer")
+        return lane
+
+    # --- decoding -------------------------------------------------------------
+
+    async def decode_frames(self):
+        """Feed queued frames to the recognizer on the decoder thread until the sentinel"""
+        log_info(f"Audio decoder started for '{self.stream}' ({current_platform} mode)")
+        held = []  # Control message or sentinel pulled while coalescing; handled next
+        while True:
+            item = held.pop() if held else await self.audio_queue.get()
+            if item is None:  # Shutdown signal, queued behind all remaining audio
+                log_debug("Received shutdown signal")
+                self.cancel_partial_flush()  # The closing final_result() sends any held partial
+                break
+
+            if isinstance(item, ControlMessage):
+                await self.handle_control(item.message)
+                continue
+
+            buffer, length, info = item
+            if not self.active:
+                # Between STOP and the next START audio is discarded, not decoded into a stale session
+                self.stats['idle_chunks'] += 1
+                self.release_frame(buffer)
+                self.report_flow()
+                continue
+
+            # Behind: take what is already queued, up to the target, for a single decode call
+            frames = [item]
+            pending_bytes = length
+            while pending_bytes < self.coalesce_bytes and not self.audio_queue.empty():
+                next_item = self.audio_queue.get_nowait()
+                if next_item is None or isinstance(next_item, ControlMessage):
+                    held.append(next_item)  # Sessions and shutdown must not be merged across
                     break
-            
-            # Continue processing for most errors
-            continue
+                frames.append(next_item)
+                pending_bytes += next_item[1]
 
-except Exception as fatal_error:
-    log_error(f"Fatal error in main loop: {fatal_error}")
-    log_error(f"Fatal error traceback: {traceback.format_exc()}")
+            try:
+                if len(frames) == 1:
+                    audio_data = memoryview(buffer)[:length]
+                else:
+                    audio_data = self.merge_frames(frames)
+                    info = frames[-1][2]  # Results describe the newest audio
+                self.decoding = True
+                outputs = await self.loop.run_in_executor(
+                    self.decoder_thread, self.decode_chunk, audio_data, len(frames))
+                for output in outputs:
+                    self.emit_result(output, info)
+                self.start_revisions()
+            except Exception as e:
+                log_error(f"Audio decoder error: {e}")
+                log_error(f"Decoder error traceback: {traceback.format_exc()}")
+                self.stats['processing_errors'] += 1
+            finally:
+                self.decoding = False
+                self.schedule_partial_flush(info)
+                for frame in frames:
+                    self.release_frame(frame[0])
+                self.report_flow()
 
-# ✅ ENHANCED: Graceful shutdown
-log_info("Starting graceful shutdown...")
+        log_info(f"Audio decoder for '{self.stream}' ending. Final stats: {json.dumps(self.stats, indent=2)}")
 
-# Stop processor thread
-processing_active = False
-try:
-    audio_queue.put_nowait(None)  # Shutdown signal
-except:
-    pass
+    def merge_frames(self, frames):
+        """Copy queued frames back to back into the reusable coalescing buffer"""
+        total = sum(length for _, length, _ in frames)
+        if len(self.coalesce_buffer) < total:
+            self.coalesce_buffer = bytearray(total)
+        view = memoryview(self.coalesce_buffer)
+        offset = 0
+        for buffer, length, _ in frames:
+            view[offset:offset + length] = memoryview(buffer)[:length]
+            offset += length
+        self.stats['coalesced_chunks'] += len(frames) - 1
+        return view[:total]
 
-# Wait for processor to finish current work
-try:
-    processor_thread.join(timeout=5.0)
-    log_info("Processor thread joined successfully")
-except:
-    log_info("Processor thread join timeout")
+    def decode_chunk(self, audio_data, frame_count=1):
+        """Validate one (possibly coalesced) frame and run it through Vosk; returns the messages to emit (decoder thread)"""
+        stats = self.stats
+        stats['chunks_processed'] += frame_count
+        stats['decode_calls'] += 1
+        self.session_bytes += len(audio_data)
 
-# ✅ ENHANCED: Get final result
-try:
-    log_debug("Getting final result from recognizer...")
-    final_json = rec.FinalResult()
-    if final_json:
+        # ✅ CRITICAL: Validate audio data format
+        is_valid, validation_msg = validate_audio_data(audio_data, len(audio_data))
+        if not is_valid:
+            log_error(f"Audio validation failed for chunk #{stats['chunks_processed']}: {validation_msg}")
+            stats['validation_errors'] += 1
+            return []
+
+        # Enhanced debugging for first few chunks
+        if stats['chunks_processed'] <= 10:
+            log_debug(f"Processing chunk #{stats['chunks_processed']}: {validation_msg}")
+
+            # Analyze audio content
+            try:
+                sample_count = len(audio_data) // 2
+                samples = struct.unpack(f'<{min(sample_count, 10)}h', audio_data[:20])
+                max_sample = max(abs(s) for s in samples)
+                avg_sample = sum(abs(s) for s in samples) / len(samples)
+
+                log_debug(f"Audio analysis: max={max_sample}/32767, avg={avg_sample:.1f}")
+
+                if max_sample == 0:
+                    log_debug("⚠️ SILENT AUDIO detected!")
+                elif max_sample < 100:
+                    log_debug("⚠️ Very low audio level")
+                else:
+                    log_debug("✅ Good audio level detected")
+
+            except Exception as e:
+                log_debug(f"Could not analyze audio samples: {e}")
+
+        if self.vad_gate is not None:
+            gate_state = self.vad_gate.update(audio_data)
+            if gate_state == GATE_SILENCE:
+                return []
+            if gate_state == GATE_CLOSED:
+                audio_data = self.silence_marker
+
+        if self.finalizer is not None:
+            self.record_utterance(audio_data)
+
+        # ✅ VOSK PROCESSING with enhanced error handling
         try:
-            final = json.loads(final_json)
-            final_text = final.get('text', '').strip()
-            if final_text:
-                output = {"type": "final", "text": final_text}
-                print(json.dumps(output), flush=True)
-                log_info(f"Final shutdown result: '{final_text}'")
-                stats['successful_recognitions'] += 1
+            if self.rec.AcceptWaveform(waveform_arg(audio_data)):
+                # Final result
+                result_json = self.rec.Result()
+
+                try:
+                    result = json.loads(result_json)
+                except json.JSONDecodeError as e:
+                    log_error(f"JSON decode error in final result: {e}")
+                    log_error(f"Raw result: {result_json}")
+                    stats['processing_errors'] += 1
+                    return []
+
+                text = result.get('text', '').strip()
+                if text:
+                    output = {
+                        "type": "final",
+                        "text": text,
+                        "confidence": result.get('conf', result.get('confidence', 0.0))
+                    }
+                    stats['successful_recognitions'] += 1
+                    log_info(f"✅ FINAL result #{stats['successful_recognitions']}: '{text}' (confidence: {output['confidence']:.3f})")
+                    outputs = self.flush_partial()
+                    outputs.append(self.finish_utterance(output))
+                    self.clear_partial()
+                    return outputs
+
+                self.clear_partial()
+                self.discard_utterance()
+                stats['empty_results'] += 1
+                # Log empty final results occasionally
+                if stats['empty_results'] % 50 == 1:
+                    log_debug(f"Empty final result #{stats['empty_results']} for chunk #{stats['chunks_processed']}")
+                return []
+
+            # Partial result - only parsed when the raw JSON changed
+            partial_json = self.rec.PartialResult()
+            if partial_json != self.last_partial_json:
+                self.last_partial_json = partial_json
+                try:
+                    partial = json.loads(partial_json)
+                except json.JSONDecodeError as e:
+                    log_error(f"JSON decode error in partial result: {e}")
+                    stats['processing_errors'] += 1
+                    return []
+
+                partial_text = partial.get('partial', '').strip()
+                self.pending_partial = partial_text if partial_text and partial_text != self.emitted_partial else None
+
+            if self.pending_partial is not None:
+                if time.monotonic() - self.last_partial_time >= self.partial_interval:
+                    return self.flush_partial()
+                stats['partials_suppressed'] += 1  # Throttled; goes out later or just before the final
+            elif self.emitted_partial:
+                stats['partials_suppressed'] += 1  # Unchanged since the last one sent
+
+            # Log processing status occasionally
+            if stats['chunks_processed'] % 100 == 0:
+                log_debug(f"Processed {stats['chunks_processed']} chunks, no new partial to send")
+            return []
+
+        except Exception as vosk_error:
+            log_error(f"Vosk processing error for chunk #{stats['chunks_processed']}: {vosk_error}")
+            log_error(f"Vosk error traceback: {traceback.format_exc()}")
+            stats['processing_errors'] += 1
+            return []
+
+    def flush_partial(self):
+        """Send the partial waiting on the throttle, if any; returns the messages to emit"""
+        partial_text = self.pending_partial
+        if partial_text is None:
+            return []
+        stats = self.stats
+        stats['partial_results'] += 1
+        self.emitted_partial = partial_text
+        self.pending_partial = None
+        self.last_partial_time = time.monotonic()
+
+        # Log partial results occasionally to avoid spam
+        if stats['partial_results'] % 25 == 1:
+            log_debug(f"📝 Partial #{stats['partial_results']}: '{partial_text[:50]}{'...' if len(partial_text) > 50 else ''}'")
+        return [{"type": "partial", "text": partial_text}]
+
+    def clear_partial(self):
+        """Forget partial state once an utterance has ended"""
+        self.last_partial_json = None
+        self.emitted_partial = ''
+        self.pending_partial = None
+
+    def schedule_partial_flush(self, info=None):
+        """Arm a timer for a partial the throttle held back, so it does not wait for the next decode"""
+        if self.pending_partial is None:
+            return
+        self.partial_info = info  # The newest audio behind the held partial
+        if self.partial_timer is not None:
+            return
+        delay = max(0.0, self.partial_interval - (time.monotonic() - self.last_partial_time))
+        self.partial_timer = self.loop.call_later(delay, self.flush_held_partial)
+
+    def flush_held_partial(self):
+        self.partial_timer = None
+        if self.decoding:
+            return  # The decode in flight sends the partial itself or re-arms the timer
+        for output in self.flush_partial():
+            self.emit_result(output, self.partial_info)
+
+    def cancel_partial_flush(self):
+        if self.partial_timer is not None:
+            self.partial_timer.cancel()
+            self.partial_timer = None
+
+    # --- whisper finals -------------------------------------------------------
+
+    def record_utterance(self, audio_data):
+        """Keep the audio of the utterance in progress for its Whisper final (decoder thread)"""
+        if self.utterance_too_long:
+            return
+        if len(self.utterance_audio) + len(audio_data) > MAX_UTTERANCE_SECONDS * 1000 * BYTES_PER_MS:
+            self.utterance_too_long = True
+            self.utterance_audio = bytearray()
+            return
+        self.utterance_audio += audio_data
+
+    def finish_utterance(self, output):
+        """Number a final and queue its audio for Whisper; returns the final (decoder thread)"""
+        self.utterance = next(self.utterance_ids)
+        output["utterance"] = self.utterance
+        if self.finalizer is not None:
+            output["source"] = "vosk"
+            if self.utterance_audio:
+                self.finished_utterances.append((self.utterance, self.utterance_audio))
+            elif self.utterance_too_long:
+                log_debug(f"Utterance {self.utterance} is over {MAX_UTTERANCE_SECONDS}s, keeping the Vosk final")
+            self.utterance_audio = bytearray()
+            self.utterance_too_long = False
+        return output
+
+    def discard_utterance(self):
+        """Forget recorded audio that ended without any text (decoder thread)"""
+        self.utterance_audio = bytearray()
+        self.utterance_too_long = False
+
+    def start_revisions(self):
+        """Hand finished utterances to Whisper; each revision is emitted by its own task"""
+        while self.finished_utterances:
+            utterance, pcm = self.finished_utterances.popleft()
+            future = self.finalizer.submit(pcm)
+            if future is None:
+                log_debug(f"Whisper final skipped for utterance {utterance}, keeping the Vosk final")
+                continue
+            task = self.loop.create_task(self.emit_revision(utterance, future))
+            self.revision_tasks.add(task)
+            task.add_done_callback(self.revision_tasks.discard)
+
+    async def emit_revision(self, utterance, future):
+        try:
+            text, whisper_ms = await asyncio.wrap_future(future)
+        except Exception as e:
+            log_error(f"Whisper final for utterance {utterance} failed: {e}")
+            return
+        if not text:
+            return  # Whisper heard nothing; the Vosk final stands
+        self.stats['revisions_sent'] += 1
+        log_info(f"✅ WHISPER final for utterance {utterance} in {whisper_ms:.0f}ms: '{text}'")
+        self.emit_result({
+            "type": "final",
+            "text": text,
+            "utterance": utterance,
+            "source": "whisper",
+            "revision": True,
+            "whisper_ms": round(whisper_ms, 1)
+        })
+
+    def final_result(self):
+        """Flush the recognizer at end of stream or session; returns the messages to emit (decoder thread)"""
+        try:
+            log_debug("Getting final result from recognizer...")
+            final_json = self.rec.FinalResult()
+            if final_json:
+                final = json.loads(final_json)
+                final_text = final.get('text', '').strip()
+                if final_text:
+                    log_info(f"Flushed final result: '{final_text}'")
+                    self.stats['successful_recognitions'] += 1
+                    outputs = self.flush_partial()
+                    outputs.append(self.finish_utterance({"type": "final", "text": final_text}))
+                    self.clear_partial()
+                    return outputs
+            self.discard_utterance()
         except json.JSONDecodeError as e:
             log_error(f"JSON decode error in final result: {e}")
+        except Exception as e:
+            log_error(f"Error getting final result: {e}")
+        return []
+
+    # --- sessions (persistent mode) -------------------------------------------
+
+    @staticmethod
+    def control_command(message):
+        return str(message.get('cmd', '')).lower() if isinstance(message, dict) else ''
+
+    async def handle_control(self, message):
+        """Apply a START/STOP/RESET control message in stream order"""
+        command = self.control_command(message)
+        if command not in ('start', 'stop', 'reset'):
+            log_error(f"Unknown control message: {message}")
+            return
+        if not self.persistent:
+            log_debug(f"Ignoring '{command}' control message (not in persistent mode)")
+            return
+
+        try:
+            self.decoding = True
+            outputs = await self.loop.run_in_executor(self.decoder_thread, self.apply_control, command)
+        except Exception as e:
+            log_error(f"Control '{command}' failed: {e}")
+            log_error(f"Control error traceback: {traceback.format_exc()}")
+            self.stats['processing_errors'] += 1
+            return
+        finally:
+            self.decoding = False
+        for output in outputs:
+            self.emit_result(output)
+        self.start_revisions()
+
+    def apply_control(self, command):
+        """Session transitions on the decoder thread; returns the messages to emit"""
+        started = time.perf_counter()
+        outputs = []
+
+        # START on a recognizer that already heard audio behaves like RESET first
+        heard_audio = self.session_bytes > 0
+        if command in ('stop', 'reset') or heard_audio:
+            outputs.extend(self.final_result())
+            self.reset_recognizer()
+
+        if command == 'start':
+            if heard_audio or not self.active:
+                self.session += 1
+                self.stats['sessions'] += 1
+            self.active = True
+        elif command == 'stop':
+            self.active = False
+
+        ready_ms = (time.perf_counter() - started) * 1000.0
+        event = {'start': 'started', 'stop': 'stopped', 'reset': 'reset'}[command]
+        log_info(f"🔁 Session {self.session} {event} for '{self.stream}' in {ready_ms:.1f}ms")
+        outputs.append({
+            "type": "session",
+            "event": event,
+            "session": self.session,
+            "ready_ms": round(ready_ms, 2)
+        })
+        return outputs
+
+    def reset_recognizer(self):
+        """Start a fresh recognizer on the loaded model - milliseconds, where reloading the model takes ~0.6s"""
+        self.rec = create_recognizer(self.model)
+        self.session_bytes = 0
+        self.clear_partial()
+        self.discard_utterance()
+        if self.vad_gate is not None:
+            self.vad_gate.reset()
+
+    # --- reporting ------------------------------------------------------------
+
+    async def report_status(self):
+        """Periodic comprehensive status reporting"""
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            stats = self.stats
+            log_info(f"📊 Processor status: {stats['chunks_processed']} processed, "
+                     f"{stats['successful_recognitions']} final, "
+                     f"{stats['partial_results']} partial, "
+                     f"{stats['validation_errors']} validation errors, "
+                     f"{stats['processing_errors']} processing errors, "
+                     f"queue: {self.audio_queue.qsize()}")
+            if self.vad_gate is not None:
+                log_info(f"📊 VAD gate: {json.dumps(self.vad_gate.summary())}")
+
+    # --- lifecycle ------------------------------------------------------------
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.audio_queue = asyncio.Queue(maxsize=AUDIO_QUEUE_SIZE)
+        self.output_queue = asyncio.Queue()
+
+        writer = asyncio.create_task(self.write_output(), name="vosk-writer")
+        reporter = asyncio.create_task(self.report_status(), name="vosk-reporter")
+        decoder = asyncio.create_task(self.decode_frames(), name="vosk-decoder")
+        try:
+            await self.read_frames()
+
+            # ✅ ENHANCED: Graceful shutdown - the sentinel waits behind any queued audio
+            log_info("Starting graceful shutdown...")
+            lanes = self.all_lanes()
+            for lane in lanes:
+                await lane.audio_queue.put(None)
+            await asyncio.gather(decoder, *self.lane_tasks)
+            log_info("Decoder drained successfully")
+
+            for lane in lanes:
+                for output in await self.loop.run_in_executor(lane.decoder_thread, lane.final_result):
+                    lane.emit_result(output)
+                lane.start_revisions()
+            # Utterances already with Whisper still get their final before the stream closes
+            await asyncio.gather(*(task for lane in lanes for task in list(lane.revision_tasks)))
+            await self.output_queue.join()
+        finally:
+            if self.flow_retry is not None:
+                self.flow_retry.cancel()
+            for lane in self.all_lanes():
+                lane.cancel_partial_flush()
+            tasks = (decoder, *self.lane_tasks, reporter, writer)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # The reader thread may still be blocked on stdin after an interrupt; don't wait for it
+            self.reader_thread.shutdown(wait=False)
+            for lane in self.all_lanes():
+                if lane.owns_decoder:
+                    lane.decoder_thread.shutdown(wait=True)
+            if self.writer_thread is not None:
+                self.writer_thread.shutdown(wait=False)
+
+    def log_summary(self):
+        """Comprehensive final statistics"""
+        stats = self.stats
+        frame_reader = self.frame_reader
+        log_info(f"🏁 Session complete on {current_platform}")
+        log_info(f"📊 Comprehensive Statistics:")
+        log_info(f"   📊 Platform: {current_platform}")
+        log_info(f"   📊 Chunks received: {stats['chunks_received']}")
+        log_info(f"   📊 Chunks processed: {stats['chunks_processed']}")
+        log_info(f"   📊 Chunks dropped: {stats['chunks_dropped']}")
+        log_info(f"   📊 Bytes received: {stats['bytes_received']:,}")
+        log_info(f"   📊 Final recognitions: {stats['successful_recognitions']}")
+        log_info(f"   📊 Partial results: {stats['partial_results']} sent, {stats['partials_suppressed']} suppressed")
+        log_info(f"   📊 Empty results: {stats['empty_results']}")
+        log_info(f"   📊 Validation errors: {stats['validation_errors']}")
+        log_info(f"   📊 Processing errors: {stats['processing_errors']}")
+        if self.audio_queue is not None:
+            log_info(f"   📊 Final queue size: {self.audio_queue.qsize()}")
+        log_info(f"   📊 Flow reports sent: {self.flow_control.reports_sent}")
+        log_info(f"   📊 Decode calls: {stats['decode_calls']}, chunks coalesced while behind: {stats['coalesced_chunks']}")
+        if self.vad_gate is not None:
+            vad = self.vad_gate.summary()
+            log_info(f"   📊 VAD gated: {vad['gated_ms'] / 1000:.1f}s of {vad['total_ms'] / 1000:.1f}s "
+                     f"({vad['gated_pct']}%) in {self.vad_gate.gated_chunks} chunks")
+        if self.lanes:
+            for lane in self.all_lanes():
+                lane_stats = lane.stats
+                log_info(f"   📊 Stream '{lane.stream}': {lane_stats['chunks_processed']} chunks decoded, "
+                         f"{lane_stats['successful_recognitions']} final, {lane_stats['partial_results']} partial")
+        if self.finalizer is not None:
+            whisper = self.finalizer.summary()
+            revisions_sent = sum(lane.stats['revisions_sent'] for lane in self.all_lanes())
+            if whisper['disabled']:
+                log_info(f"   📊 Whisper finals: disabled, the model failed to load ({self.finalizer.load_error}); "
+                         f"every utterance kept its Vosk final")
+            else:
+                log_info(f"   📊 Whisper finals: {revisions_sent} sent, {whisper['skipped']} skipped while busy, "
+                         f"{whisper['failed']} failed, {whisper['avg_ms']}ms average")
+        if self.persistent:
+            log_info(f"   📊 Sessions: {stats['sessions']}, idle chunks discarded: {stats['idle_chunks']}")
+        if hasattr(frame_reader, 'sequence_gaps'):
+            log_info(f"   📊 Wire protocol: v{frame_reader.protocol}, {frame_reader.batches_received} batches, "
+                     f"{frame_reader.sequence_gaps} sequence gaps, {frame_reader.resync_bytes} resync bytes")
+        if hasattr(frame_reader, 'overrun_bytes'):
+            log_info(f"   📊 Shared ring overrun bytes: {frame_reader.overrun_bytes:,}")
+
+        # Calculate success rates
+        if stats['chunks_received'] > 0:
+            process_rate = (stats['chunks_processed'] / stats['chunks_received']) * 100
+            log_info(f"   📊 Processing success rate: {process_rate:.1f}%")
+
+        if stats['chunks_processed'] > 0:
+            recognition_rate = (stats['successful_recognitions'] / stats['chunks_processed']) * 100
+            log_info(f"   📊 Recognition rate: {recognition_rate:.1f}%")
+
+        if stats['bytes_received'] > 0:
+            avg_chunk_size = stats['bytes_received'] / stats['chunks_received']
+            samples_per_chunk = avg_chunk_size / 2
+            log_info(f"   📊 Average chunk: {avg_chunk_size:.0f} bytes ({samples_per_chunk:.0f} samples)")
+
+        # Final session summary
+        logging.info(f"Session ended successfully: {json.dumps(stats)}")
+
+# ✅ SERVER MODE: many client streams, one model, a decoder pool sized to the cores
+class VoskServer:
+    """Serve concurrent audio streams over a Unix domain socket.
+
+    Clients speak the same framed protocol as stdin (v1 or v2) and read JSON
+    result lines back from the socket, starting with a hello. The Model is
+    loaded once; every connection gets its own recognizer and VoskEngine, and
+    all engines decode on one bounded pool so the machine is never
+    oversubscribed however many streams are connected.
+    """
+
+    def __init__(self, model, socket_path, workers=None, finalizer=None):
+        self.model = model
+        self.finalizer = finalizer  # One Whisper model for every connection's finals
+        self.socket_path = socket_path
+        self.workers = workers or os.cpu_count() or 1
+        self.decoder_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vosk-decoder")
+        self.connections = set()
+        self.connections_served = 0
+
+    async def serve_connection(self, conn):
+        self.connections_served += 1
+        connection_id = self.connections_served
+        loop = asyncio.get_running_loop()
+        reader_file = conn.makefile('rb')
+        writer_file = conn.makefile('wb')
+        engine = None
+        self.connections.add(conn)
+        log_info(f"🔌 Connection {connection_id} opened ({len(self.connections)} active)")
+        try:
+            frame_reader = FrameReader(reader_file, min_length=20, max_length=1000000,
+                                       deliver_control=persistent_mode)
+            frame_reader.name = f"connection {connection_id}"
+            rec = await loop.run_in_executor(self.decoder_pool, create_recognizer, self.model)
+            hello = protocol_hello(sample_rate=16000, persistent=persistent_mode, connection=connection_id)
+            # A fresh connection's socket buffer always has room for this one line
+            writer_file.write(json.dumps(hello).encode('utf-8') + b'\n')
+            writer_file.flush()
+
+            engine = VoskEngine(self.model, rec, frame_reader, persistent=persistent_mode,
+                                decoder_pool=self.decoder_pool, output=writer_file, coalesce_ms=coalesce_ms,
+                                partial_interval_ms=partial_interval_ms, vad_gate=create_vad_gate(),
+                                finalizer=self.finalizer)
+            await engine.run()
+        except Exception as e:
+            log_error(f"Connection {connection_id} error: {e}")
+            log_error(f"Connection error traceback: {traceback.format_exc()}")
+        finally:
+            self.connections.discard(conn)
+            try:
+                # Wakes a reader thread still blocked on this socket
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            for stream in (reader_file, writer_file, conn):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            if engine is not None:
+                engine.log_summary()
+            log_info(f"🔌 Connection {connection_id} closed ({len(self.connections)} active)")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket from a previous run
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        tasks = set()
+        try:
+            listener.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+            listener.listen()
+            listener.setblocking(False)
+            log_info(f"Serving on {self.socket_path} with {self.workers} decoder workers")
+            print(json.dumps({"type": "listening", "socket": self.socket_path, "workers": self.workers}), flush=True)
+            print("VOSK_READY", flush=True)
+
+            while True:
+                conn, _ = await loop.sock_accept(listener)
+                conn.setblocking(True)
+                task = asyncio.create_task(self.serve_connection(conn))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            listener.close()
+            for conn in list(self.connections):
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.decoder_pool.shutdown(wait=True)
+            if self.finalizer is not None:
+                self.finalizer.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+if serve_path is not None:
+    try:
+        workers = int(option_value('--workers') or 0) or None
+    except ValueError:
+        workers = None
+    server = VoskServer(model, serve_path, workers=workers, finalizer=create_finalizer())
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        log_info("Keyboard interrupt received")
+    except Exception as fatal_error:
+        error_msg = f"Vosk server failed: {fatal_error}"
+        print(json.dumps({"type": "error", "error": error_msg}), flush=True)
+        log_error(error_msg)
+        log_error(f"Fatal error traceback: {traceback.format_exc()}")
+    log_info(f"Vosk server stopped after {server.connections_served} connections")
+    sys.exit(0)
+
+# ✅ FRAME SOURCE: length-prefixed stdin frames, or the shared ring with stdin as wake-up channel
+try:
+    frame_reader = open_audio_source(sys.argv[2:], sys.stdin.buffer,
+                                     min_length=20,        # At least 10 Int16 samples
+                                     max_length=1000000,   # 1MB max (500k samples)
+                                     deliver_control=persistent_mode)
+except (OSError, ValueError) as e:
+    error_msg = f"Failed to open audio source: {str(e)}"
+    print(json.dumps({"type": "error", "error": error_msg}), flush=True)
+    logging.error(error_msg)
+    sys.exit(1)
+
+log_info(f"Audio source: {frame_reader.name}")
+
+# ✅ RUN THE ENGINE
+log_info(f"Starting asyncio audio engine on {current_platform}")
+log_info("Expecting Int16 PCM audio data from JavaScript")
+
+finalizer = create_finalizer()
+engine = VoskEngine(model, rec, frame_reader, persistent=persistent_mode, coalesce_ms=coalesce_ms,
+                    partial_interval_ms=partial_interval_ms, vad_gate=create_vad_gate(), finalizer=finalizer)
+try:
+    asyncio.run(engine.run())
+except KeyboardInterrupt:
+    log_info("Keyboard interrupt received")
+except Exception as fatal_error:
+    log_error(f"Fatal error in audio engine: {fatal_error}")
+    log_error(f"Fatal error traceback: {traceback.format_exc()}")
+
+try:
+    frame_reader.close()
 except Exception as e:
-    log_error(f"Error getting final result: {e}")
-
-# ✅ ENHANCED: Comprehensive final statistics
-log_info(f"🏁 Session complete on {current_platform}")
-log_info(f"📊 Comprehensive Statistics:")
-log_info(f"   📊 Platform: {current_platform}")
-log_info(f"   📊 Chunks received: {stats['chunks_received']}")
-log_info(f"   📊 Chunks processed: {stats['chunks_processed']}")
-log_info(f"   📊 Chunks dropped: {stats['chunks_dropped']}")
-log_info(f"   📊 Bytes received: {stats['bytes_received']:,}")
-log_info(f"   📊 Final recognitions: {stats['successful_recognitions']}")
-log_info(f"   📊 Partial results: {stats['partial_results']}")
-log_info(f"   📊 Empty results: {stats['empty_results']}")
-log_info(f"   📊 Validation errors: {stats['validation_errors']}")
-log_info(f"   📊 Processing errors: {stats['processing_errors']}")
-log_info(f"   📊 Final queue size: {audio_queue.qsize()}")
-
-# Calculate success rates
-if stats['chunks_received'] > 0:
-    process_rate = (stats['chunks_processed'] / stats['chunks_received']) * 100
-    log_info(f"   📊 Processing success rate: {process_rate:.1f}%")
-    
-if stats['chunks_processed'] > 0:
-    recognition_rate = (stats['successful_recognitions'] / stats['chunks_processed']) * 100
-    log_info(f"   📊 Recognition rate: {recognition_rate:.1f}%")
-
-if stats['bytes_received'] > 0:
-    avg_chunk_size = stats['bytes_received'] / stats['chunks_received']
-    samples_per_chunk = avg_chunk_size / 2
-    log_info(f"   📊 Average chunk: {avg_chunk_size:.0f} bytes ({samples_per_chunk:.0f} samples)")
-
-# Final session summary
-logging.info(f"Session ended successfully: {json.dumps(stats)}")
-log_info("Vosk session terminated cleanly")
\ No newline at end of file
+    log_debug(f"Error closing audio source: {e}")
+
+if finalizer is not None:
+    finalizer.close()
+
+engine.log_summary()
+log_info("Vosk session terminated cleanly")
@@ -0,0 +1,70 @@
+"""
+Batched catch-up transcription for backlogged Whisper audio
+
+After a CPU spike an engine can find several finished speech segments
+waiting. Decoding them one after another pays the encoder once per segment;
+faster-whisper's BatchedInferencePipeline encodes them as one batch and
+decodes them together, which wins back real time much faster. The engines
+switch to it only while such a backlog exists and go back to transcribing
+one window at a time once they have caught up.
+"""
+
+import inspect
+import logging
+from bisect import bisect_right
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_SEGMENTS = 3  # Finished segments waiting at once that count as a backlog
+BATCH_SIZE = 8        # Clips encoded per batch
+MAX_CLIP_SECONDS = 30  # Whisper's input window; longer clips cannot go through the batched pipeline
+
+# The clips are the segments themselves, so the pipeline's own VAD and chunking stay out of it
+BATCH_OWNED = ('vad_filter', 'vad_parameters', 'clip_timestamps', 'batch_size', 'chunk_length')
+
+
+def batching_supported():
+    """True when the installed faster-whisper has the batched pipeline (1.1 and later)"""
+    try:
+        from faster_whisper import BatchedInferencePipeline  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def batched_settings(pipeline, settings):
+    """The engine's settings the batched pipeline accepts"""
+    accepted = inspect.signature(pipeline.transcribe).parameters
+    return {key: value for key, value in settings.items() if key in accepted and key not in BATCH_OWNED}
+
+
+def transcribe_clips(model, clips, settings, sample_rate=16000, batch_size=BATCH_SIZE):
+    """Transcribe float32 clips with a loaded WhisperModel in one batched call.
+
+    Returns (text per clip, segments per clip, info). The pipeline only wraps
+    the model, so it is built per call and whichever model the quality
+    ladder picked is batched.
+    """
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline
+
+    pipeline = BatchedInferencePipeline(model=model)
+    if any(len(clip) > MAX_CLIP_SECONDS * sample_rate for clip in clips):
+        raise ValueError(f"clips longer than {MAX_CLIP_SECONDS}s cannot be batched")
+
+    ends = np.cumsum([len(clip) for clip in clips]).tolist()
+    starts = [0] + ends[:-1]
+    audio = np.concatenate(clips).astype(np.float32, copy=False)
+    clip_timestamps = [{"start": start, "end": end} for start, end in zip(starts, ends)]
+
+    segments, info = pipeline.transcribe(audio, vad_filter=False, clip_timestamps=clip_timestamps,
+                                         batch_size=batch_size, **batched_settings(pipeline, settings))
+
+    # Segment times are on the concatenated timeline; each belongs to the clip holding its midpoint
+    per_clip = [[] for _ in clips]
+    for segment in segments:
+        midpoint = (segment.start + segment.end) / 2 * sample_rate
+        index = min(bisect_right(ends, midpoint), len(clips) - 1)
+        per_clip[index].append(segment)
+    texts = [" ".join(s.text.strip() for s in found if s.text and s.text.strip()) for found in per_clip]
+    return texts, per_clip, info
@@ -0,0 +1,122 @@
+"""
+faster-whisper re-decoding of finished utterances for the hybrid Vosk engine
+
+Vosk keeps streaming partials and its own finals; each final's audio is also
+handed to a WhisperFinalizer, whose single background thread transcribes it
+with faster-whisper. The caller publishes that text as a revision of the same
+utterance, so the user sees Vosk's text at once and Whisper's shortly after.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = 4  # Utterances waiting for Whisper before new ones keep their Vosk final
+
+# Vosk's endpointer has already cut the utterance, so Whisper's own VAD would only cost time
+FINAL_SETTINGS = {
+    "language": "en",
+    "beam_size": 5,
+    "best_of": 1,
+    "temperature": 0.0,
+    "condition_on_previous_text": False,
+    "vad_filter": False,
+    "without_timestamps": True,
+    "no_speech_threshold": 0.6,
+}
+
+
+class WhisperFinalizer:
+    """Transcribe utterances with faster-whisper on one background thread.
+
+    The model loads on that same thread, so creating a finalizer never delays
+    the Vosk stream; utterances submitted while it loads simply wait. When
+    MAX_PENDING utterances are queued, submit() refuses new ones so Whisper
+    can never fall further and further behind the conversation.
+    """
+
+    def __init__(self, model_size='small', device='cpu', compute_type='int8', cpu_threads=2,
+                 max_pending=MAX_PENDING, log_error=None):
+        self.model_size = model_size
+        self.log_error = log_error or logger.error
+        self.model = None
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.stats = {'revisions': 0, 'skipped': 0, 'failed': 0, 'total_ms': 0.0}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-final")
+        self.load_future = self.executor.submit(self.load_model, model_size, device, compute_type, cpu_threads)
+        self.load_future.add_done_callback(self.loaded)
+
+    def load_model(self, model_size, device, compute_type, cpu_threads):
+        from faster_whisper import WhisperModel
+
+        started = time.perf_counter()
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=1, local_files_only=True)
+        logger.info(f"Whisper finals model '{model_size}' loaded in {time.perf_counter() - started:.1f}s")
+
+    def loaded(self, future):
+        error = future.exception()
+        if error is not None:
+            # local_files_only makes a model that was never downloaded the usual cause
+            self.log_error(f"❌ Whisper finals disabled: model '{self.model_size}' failed to load: {error}")
+
+    @property
+    def load_error(self):
+        """Why the model failed to load, or None while it loads or once it has"""
+        if not self.load_future.done():
+            return None
+        return self.load_future.exception()
+
+    @property
+    def failed_to_load(self):
+        return self.load_future.done() and self.load_future.exception() is not None
+
+    def submit(self, pcm):
+        """Queue Int16 PCM for a Whisper final; returns a Future of (text, ms), or None when skipped"""
+        if self.failed_to_load:
+            return None
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.stats['skipped'] += 1
+                return None
+            self.pending += 1
+        future = self.executor.submit(self.transcribe, bytes(pcm))
+        future.add_done_callback(self.finished)
+        return future
+
+    def finished(self, future):
+        with self.lock:
+            self.pending -= 1
+            if future.exception() is not None:
+                self.stats['failed'] += 1
+
+    def transcribe(self, pcm):
+        import numpy as np
+
+        if self.model is None:
+            raise RuntimeError(f"Whisper model '{self.model_size}' is not loaded")
+        started = time.perf_counter()
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(audio, **FINAL_SETTINGS)
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self.lock:
+            self.stats['revisions'] += 1
+            self.stats['total_ms'] += elapsed_ms
+        return text, elapsed_ms
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_ms'] = round(stats['total_ms'] / stats['revisions'], 1) if stats['revisions'] else 0.0
+        del stats['total_ms']
+        stats['disabled'] = self.failed_to_load
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,92 @@
+"""
+LocalAgreement streaming for the Whisper engines
+
+Cutting audio at fixed chunk boundaries splits words and leaves Whisper short
+fragments with no context. In streaming mode an engine instead re-decodes a
+window that grows as audio arrives, and a word is committed only once two
+consecutive hypotheses agree on it (LocalAgreement-2). The window is then
+trimmed to the end of the last committed word, so each decode covers only the
+audio that is not settled yet, and the committed text goes back in as the
+prompt so Whisper keeps the context the trimmed audio carried.
+"""
+
+import re
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PROMPT_WORDS = 40        # Most recent committed words passed back as initial_prompt
+MAX_OVERLAP_WORDS = 5    # Longest repeat of the committed tail looked for at the start of a hypothesis
+OVERLAP_SECONDS = 1.0    # Only hypotheses starting this close to the last commit can repeat it
+TIME_TOLERANCE = 0.1     # Seconds a new word may start before the last committed word ends
+MAX_WINDOW_SECONDS = 10  # A window that grows this long without agreement is committed as it is
+
+
+def normalize(word):
+    """Comparison form of a word: lower case, punctuation dropped"""
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+class LocalAgreement:
+    """Words committed from successive hypotheses over a growing window.
+
+    Words are dicts with 'word', 'start' and 'end', times in seconds on the
+    stream's own timeline. insert() takes the latest hypothesis and returns
+    the words it newly commits: the longest prefix it shares with the one
+    before. What follows that prefix stays tentative until the next insert().
+    """
+
+    def __init__(self, prompt_words=PROMPT_WORDS):
+        self.recent = deque(maxlen=prompt_words)  # Committed words kept for the prompt
+        self.tentative = []
+        self.committed_end = 0.0
+        self.stats = {'hypotheses': 0, 'committed': 0, 'forced': 0}
+
+    @property
+    def pending(self):
+        return bool(self.tentative)
+
+    def insert(self, words):
+        """Add a hypothesis; returns the words now agreed on"""
+        self.stats['hypotheses'] += 1
+        words = [w for w in words if w['start'] > self.committed_end - TIME_TOLERANCE]
+        words = self.drop_repeated(words)
+
+        agreed = 0
+        for previous, current in zip(self.tentative, words):
+            if normalize(previous['word']) != normalize(current['word']):
+                break
+            agreed += 1
+        self.tentative = words[agreed:]
+        return self.accept(words[:agreed])
+
+    def drop_repeated(self, words):
+        """Strip words at the start of a hypothesis that repeat the tail of the committed text"""
+        if not words or not self.recent or words[0]['start'] - self.committed_end > OVERLAP_SECONDS:
+            return words
+        tail = [normalize(w['word']) for w in list(self.recent)[-MAX_OVERLAP_WORDS:]]
+        for count in range(min(len(tail), len(words)), 0, -1):
+            if tail[-count:] == [normalize(w['word']) for w in words[:count]]:
+                return words[count:]
+        return words
+
+    def flush(self):
+        """Commit whatever is still tentative, at a pause or when the window got too long"""
+        words, self.tentative = self.tentative, []
+        self.stats['forced'] += len(words)
+        return self.accept(words)
+
+    def accept(self, words):
+        if words:
+            self.recent.extend(words)
+            self.committed_end = max(self.committed_end, words[-1]['end'])
+            self.stats['committed'] += len(words)
+        return words
+
+    def prompt(self):
+        """Recent committed text as context for the next decode, or None before anything is committed"""
+        return " ".join(w['word'] for w in self.recent) or None
+
+    def summary(self):
+        return dict(self.stats)
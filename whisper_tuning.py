@@ -0,0 +1,222 @@
+"""
+Startup calibration of cpu_threads and num_workers for the Whisper engines
+
+The engines used to hard-code their thread counts (4 for large-v3 and medium,
+2 for base and small) whatever the host, leaving most of a 16-core machine
+idle and starving the UI on a 4-core laptop. load_tuned_model() instead times
+a short fixed clip with a few thread/worker splits that leave a core free,
+keeps the fastest, and caches the winner per model, compute type, concurrency
+and machine fingerprint, so only the first start on a machine pays for it.
+Candidates are loaded one at a time and released before the next, so
+calibration never holds two copies of the model.
+
+MLA_WHISPER_TUNING=off keeps the engine's defaults; =recalibrate ignores the
+cache. MLA_WHISPER_TUNING_CACHE moves the cache file.
+"""
+
+import os
+import gc
+import json
+import time
+import hashlib
+import inspect
+import logging
+import platform
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TUNING_ENV = "MLA_WHISPER_TUNING"
+CACHE_ENV = "MLA_WHISPER_TUNING_CACHE"
+CACHE_VERSION = 1
+
+RESERVED_CORES = 1   # Left to the UI and the audio transport
+CLIP_SECONDS = 3.0   # Benchmark clip length
+BENCH_RUNS = 2       # Timed runs per candidate after one warm-up; the fastest counts
+BENCH_MAX_TOKENS = 32  # Keeps a hallucinating decode from turning the benchmark into a token-limit race
+
+
+def cache_path():
+    override = os.environ.get(CACHE_ENV)
+    if override:
+        return Path(override)
+    return Path.home() / ".cache" / "micro_learner" / "whisper_tuning.json"
+
+
+def cpu_model():
+    """Human-readable CPU name, from /proc/cpuinfo where there is one"""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.lower().startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def machine_fingerprint():
+    """Short hash of what decides the best split: OS, architecture, CPU model and core count"""
+    parts = [platform.system(), platform.machine(), cpu_model(), str(os.cpu_count() or 0)]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def usable_cores():
+    return max(1, (os.cpu_count() or 2) - RESERVED_CORES)
+
+
+def candidates(concurrency=1, cores=None):
+    """(cpu_threads, num_workers) splits to time.
+
+    With concurrent windows (the Best engine's pool) both one shared worker
+    and one worker per window are tried; the threads are split so the
+    workers together never use more than the usable cores.
+    """
+    cores = usable_cores() if cores is None else cores
+    splits = []
+    for workers in sorted({1, max(1, concurrency)}):
+        per_worker = max(1, cores // workers)
+        for threads in sorted({max(1, per_worker // 2), per_worker}):
+            splits.append((threads, workers))
+    return splits
+
+
+def benchmark_clip(sample_rate=16000, seconds=CLIP_SECONDS):
+    """Deterministic speech-like clip: a voiced harmonic stack with syllable-rate bursts over low noise"""
+    import numpy as np
+
+    t = np.arange(int(sample_rate * seconds), dtype=np.float32) / sample_rate
+    pitch = 140 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2
+    noise = np.random.default_rng(0).normal(0, 0.005, len(t))
+    return (0.1 * voiced * envelope + noise).astype(np.float32)
+
+
+def benchmark_settings(model, settings):
+    accepted = inspect.signature(model.transcribe).parameters
+    chosen = {key: value for key, value in (settings or {}).items()
+              if key in accepted and key not in ('vad_filter', 'vad_parameters', 'initial_prompt')}
+    chosen['vad_filter'] = False
+    if 'max_new_tokens' in accepted:
+        chosen['max_new_tokens'] = BENCH_MAX_TOKENS
+    return chosen
+
+
+def time_model(model, clip, concurrency, settings):
+    """Seconds for `concurrency` simultaneous transcriptions of the clip, best of BENCH_RUNS after a warm-up"""
+    settings = benchmark_settings(model, settings)
+
+    def run():
+        segments, _ = model.transcribe(clip, **settings)
+        list(segments)
+
+    def round_trip():
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    round_trip()
+    return min(round_trip() for _ in range(BENCH_RUNS))
+
+
+def load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {"version": CACHE_VERSION, "entries": {}}
+
+
+def save_cache(path, cache):
+    # Write-then-rename, so two engines starting together never leave a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def cache_key(model_size, compute_type, concurrency):
+    return f"{model_size}|{compute_type}|x{concurrency}|{machine_fingerprint()}"
+
+
+def load_tuned_model(model_size, device="cpu", compute_type="int8", concurrency=1, default=(4, 1),
+                     settings=None, log=None, **model_kwargs):
+    """Load a WhisperModel with the cpu_threads/num_workers calibrated for this machine.
+
+    Returns (model, tuning); tuning holds the split used and its source:
+    'cached', 'measured', or 'default' (GPU, calibration off, or a benchmark
+    that failed). `default` is the engine's old (cpu_threads, num_workers),
+    capped at the usable cores on CPU. Model load errors propagate unchanged.
+    """
+    from faster_whisper import WhisperModel
+
+    log = log or logger.info
+    mode = os.environ.get(TUNING_ENV, "").strip().lower()
+    threads, workers = default
+    if device == "cpu":
+        threads = max(1, min(threads, usable_cores() // workers))
+
+    def load(cpu_threads, num_workers):
+        return WhisperModel(model_size, device=device, compute_type=compute_type,
+                            cpu_threads=cpu_threads, num_workers=num_workers, **model_kwargs)
+
+    def tuning(cpu_threads, num_workers, source, **extra):
+        return dict({"cpu_threads": cpu_threads, "num_workers": num_workers, "source": source}, **extra)
+
+    if device != "cpu" or mode == "off":
+        return load(threads, workers), tuning(threads, workers, "default")
+
+    path = cache_path()
+    key = cache_key(model_size, compute_type, concurrency)
+    cache = load_cache(path)
+    cached = cache["entries"].get(key)
+    if cached and mode != "recalibrate":
+        return load(cached["cpu_threads"], cached["num_workers"]), tuning(cached["cpu_threads"], cached["num_workers"], "cached")
+
+    clip = benchmark_clip()
+    audio_seconds = len(clip) / 16000 * concurrency
+    splits = candidates(concurrency)
+    best = None  # (seconds, threads, workers)
+    kept = None  # The last candidate's model, kept only if it won; no two candidates are ever loaded together
+    timings = []
+    for index, (cpu_threads, num_workers) in enumerate(splits):
+        model = load(cpu_threads, num_workers)
+        try:
+            elapsed = time_model(model, clip, concurrency, settings)
+        except Exception as e:
+            log(f"⚠️ Tuning run with cpu_threads={cpu_threads}, num_workers={num_workers} failed: {e}")
+            elapsed = None
+        if elapsed is not None:
+            timings.append({"cpu_threads": cpu_threads, "num_workers": num_workers, "seconds": round(elapsed, 3)})
+            log(f"⏱️ cpu_threads={cpu_threads}, num_workers={num_workers}: {elapsed:.2f}s "
+                f"(real-time factor {elapsed / audio_seconds:.2f})")
+            if best is None or elapsed < best[0]:
+                best = (elapsed, cpu_threads, num_workers)
+                if index == len(splits) - 1:
+                    kept = model
+        del model
+        gc.collect()  # CTranslate2 frees the weights once the last reference is gone
+
+    if best is None:
+        return load(threads, workers), tuning(threads, workers, "default")
+
+    elapsed, cpu_threads, num_workers = best
+    model = kept if kept is not None else load(cpu_threads, num_workers)
+    cache["entries"][key] = {"cpu_threads": cpu_threads, "num_workers": num_workers, "seconds": round(elapsed, 3),
+                             "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "timings": timings}
+    try:
+        save_cache(path, cache)
+    except OSError as e:
+        log(f"⚠️ Could not save Whisper tuning to {path}: {e}")
+    return model, tuning(cpu_threads, num_workers, "measured", seconds=round(elapsed, 3))